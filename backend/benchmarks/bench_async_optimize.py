@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Throughput of the /optimize upstream phase: blocking vs async.
+
+`--concurrency` clients each send requests back to back until `--requests`
+have been served. "before" replays the old request path: each client is a
+thread that calls TomTom and then OpenWeather with blocking requests.
+"after" runs the async clients on one event loop with the shared keep-alive
+client and both upstream calls in flight at once. Both hit the local fake
+upstream, so only the request path is measured.
+
+    cd backend && python benchmarks/bench_async_optimize.py --requests 400 --concurrency 20 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstream import start_fake_upstream
+
+START = "19.0760,72.8777"
+END = "18.9220,72.8347"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    k = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def summarize(name, latencies, elapsed):
+    return {
+        "mode": name,
+        "requests": len(latencies),
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def run_blocking(total, concurrency):
+    from services.travel_time import get_travel_time
+    from services.weather import get_weather_by_coordinates
+
+    lat, lng = map(float, START.split(","))
+
+    def one_request(_):
+        t0 = time.perf_counter()
+        get_travel_time(START, END)
+        get_weather_by_coordinates(lat, lng)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one_request, range(total)))
+    return summarize("before: blocking, sequential upstream calls", latencies, time.perf_counter() - t0)
+
+
+async def run_async(total, concurrency):
+    from services.http_client import close_client
+    from services.travel_time import get_travel_time_async
+    from services.weather import get_weather_by_coordinates_async
+
+    lat, lng = map(float, START.split(","))
+
+    async def one_request():
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            get_travel_time_async(START, END),
+            get_weather_by_coordinates_async(lat, lng),
+        )
+        return time.perf_counter() - t0
+
+    latencies = []
+    remaining = iter(range(total))
+
+    async def client():
+        for _ in remaining:
+            latencies.append(await one_request())
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    await close_client()
+    return summarize("after: async, concurrent upstream calls", latencies, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    upstream = start_fake_upstream(latency_ms=args.latency_ms)
+    os.environ["TOMTOM_BASE_URL"] = upstream.url
+    os.environ["OPENWEATHER_BASE_URL"] = upstream.url
+    os.environ.setdefault("TOMTOM_API_KEY", "bench")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "off")  # measure the request path, not the quota
+
+    results = [run_blocking(args.requests, args.concurrency), asyncio.run(run_async(args.requests, args.concurrency))]
+    print(json.dumps({"upstream_latency_ms": args.latency_ms, "concurrency": args.concurrency, "results": results}, indent=2))
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
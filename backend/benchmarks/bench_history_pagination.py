@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+/history page latency at increasing depth: keyset cursor vs OFFSET.
+
+Seeds a scratch table (deliveries_bench, same shape and indexes as
+deliveries) with --rows rows via generate_series, then times one page at
+several depths using the same query builder as routers/history.py, next to
+the equivalent LIMIT/OFFSET query. Needs DATABASE_URL to point at Postgres;
+the production deliveries table is never touched.
+
+    cd backend && python benchmarks/bench_history_pagination.py --rows 5000000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_connection
+from routers.history import HISTORY_COLUMNS, HistoryFilters, fetch_history_page
+
+TABLE = "deliveries_bench"
+
+
+def seed(cur, rows):
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cur.execute(f"CREATE TABLE {TABLE} (LIKE deliveries INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        INSERT INTO {TABLE} (id, city, perishability, travel_time_sec, weather, final_score, created_at)
+        SELECT g,
+               (ARRAY['Mumbai','Pune','Delhi','Chennai','Bengaluru'])[1 + g % 5],
+               1 + g % 10,
+               300 + g % 3000,
+               (ARRAY['clear sky','light rain','haze'])[1 + g % 3],
+               (1 + g % 10) * (300 + g % 3000) / 60.0,
+               now() - (%s - g) * interval '1 second'
+        FROM generate_series(1, %s) AS g
+    """, (rows, rows))
+    cur.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+    cur.execute(f"CREATE INDEX ON {TABLE} (created_at, id)")
+    cur.execute(f"CREATE INDEX ON {TABLE} (city, created_at, id)")
+    cur.execute(f"ANALYZE {TABLE}")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch table for later runs")
+    parser.add_argument("--reuse", action="store_true", help="reuse an existing scratch table")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cur = conn.cursor()
+    if not args.reuse:
+        t0 = time.perf_counter()
+        seed(cur, args.rows)
+        conn.commit()
+        print(f"Seeded {args.rows} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    fields = list(HISTORY_COLUMNS)
+    results = []
+    for depth in [d for d in args.depths if d < args.rows]:
+        cur.execute(f"SELECT created_at, id FROM {TABLE} ORDER BY created_at DESC, id DESC OFFSET %s LIMIT 1", (depth,))
+        cursor = cur.fetchone() if depth else None
+        for label, filters in (("all", HistoryFilters()), ("city=Pune", HistoryFilters(city="Pune"))):
+            keyset_ms = timed(lambda: fetch_history_page(cur, filters, fields, args.page_size, cursor, table=TABLE), args.repeat)
+            where = "WHERE city = %s" if filters.city else ""
+            params = (filters.city,) if filters.city else ()
+            offset_ms = timed(lambda: (cur.execute(
+                f"SELECT {', '.join(fields)} FROM {TABLE} {where} ORDER BY created_at DESC, id DESC LIMIT %s OFFSET %s",
+                (*params, args.page_size, depth),
+            ), cur.fetchall()), args.repeat)
+            results.append({"depth": depth, "filter": label, "keyset_ms": keyset_ms, "offset_ms": offset_ms})
+
+    if not args.keep:
+        cur.execute(f"DROP TABLE {TABLE}")
+        conn.commit()
+    conn.close()
+    print(json.dumps({"rows": args.rows, "page_size": args.page_size, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
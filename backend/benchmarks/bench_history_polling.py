@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Polling load on /history/ with and without conditional GET and the page cache.
+
+Starts the app under uvicorn (as load_test.py does) once per mode, and
+--pollers clients then poll /history/?limit=50 like the frontend, each
+waiting --interval seconds between polls (0 = as fast as it can), while
+rows are inserted straight into Postgres at --insert-rate per second, as
+another worker would. Modes:
+
+  plain        HISTORY_CACHE_TTL=0, validators ignored: every poll runs the page query and renders JSON
+               (plus the version query, so slightly more work than before conditional GET existed)
+  conditional  HISTORY_CACHE_TTL=0, If-None-Match sent back: unchanged polls cost one version query
+  cached       HISTORY_CACHE_TTL (default 2s), validators ignored: pages rendered once per version
+  cached+304   both: most polls are answered without touching the database
+
+Reports throughput, latency percentiles, status codes, response bytes and
+the app's /stats/cache "history" counters per mode. Needs a real Postgres
+(--database-url); tables are created and --seed-rows rows inserted first.
+
+    cd backend && python benchmarks/bench_history_polling.py --database-url postgresql://postgres:x@127.0.0.1:5433/postgres \\
+        --seed-rows 1000000 --pollers 50 --seconds 15
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from bench_async_optimize import percentile
+from fake_upstream import _free_port
+from load_test import git_revision, prepare_database, start_app
+
+MODES = {
+    "plain": {"ttl": "0", "conditional": False},
+    "conditional": {"ttl": "0", "conditional": True},
+    "cached": {"ttl": None, "conditional": False},
+    "cached+304": {"ttl": None, "conditional": True},
+}
+
+
+def insert_rows(url, rate, stop):
+    """Insert one delivery every 1/rate seconds until `stop` is set; returns how many were inserted"""
+    import psycopg2
+    from db import _psycopg2_dsn
+
+    conn = psycopg2.connect(_psycopg2_dsn(url))
+    cur = conn.cursor()
+    inserted = 0
+    while not stop.wait(1 / rate):
+        cur.execute(
+            "INSERT INTO deliveries (city, perishability, travel_time_sec, weather, final_score) "
+            "VALUES ('Mumbai', 5, 900, 'clear sky', 75.0)"
+        )
+        conn.commit()
+        inserted += 1
+    conn.close()
+    return inserted
+
+
+async def poll(url, args, conditional):
+    latencies, statuses, received = [], Counter(), [0]
+    started = time.monotonic()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.seconds
+    limits = httpx.Limits(max_connections=args.pollers, max_keepalive_connections=args.pollers)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        async def poller():
+            etag = None
+            while time.monotonic() < deadline:
+                headers = {"If-None-Match": etag} if conditional and etag else {}
+                t0 = time.perf_counter()
+                try:
+                    response = await client.get("/history/", params={"limit": args.limit}, headers=headers)
+                    status = str(response.status_code)
+                    etag = response.headers.get("etag", etag)
+                    size = len(response.content)
+                except httpx.HTTPError as e:
+                    status, size = type(e).__name__, 0
+                if time.monotonic() >= measure_from:
+                    latencies.append(time.perf_counter() - t0)
+                    statuses[status] += 1
+                    received[0] += size
+                if args.interval:
+                    await asyncio.sleep(args.interval)
+
+        await asyncio.gather(*(poller() for _ in range(args.pollers)))
+        cache = (await client.get("/stats/cache")).json().get("history")
+
+    elapsed = time.monotonic() - measure_from
+    ms = lambda pct: round(percentile(latencies, pct) * 1000, 2) if latencies else None
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(50),
+        "p95_ms": ms(95),
+        "p99_ms": ms(99),
+        "statuses": dict(sorted(statuses.items())),
+        "response_kb_per_request": round(received[0] / len(latencies) / 1024, 2) if latencies else None,
+        "history_cache": cache,
+    }
+
+
+def run_mode(name, args, base_env):
+    mode = MODES[name]
+    env = {**base_env, "HISTORY_CACHE_TTL": mode["ttl"] or str(args.cache_ttl)}
+    app, url = start_app(_free_port(), args.workers, env)
+    stop = threading.Event()
+    inserted = []
+    writer = None
+    if args.insert_rate > 0:
+        writer = threading.Thread(target=lambda: inserted.append(insert_rows(args.database_url, args.insert_rate, stop)))
+        writer.start()
+    try:
+        result = asyncio.run(poll(url, args, mode["conditional"]))
+    finally:
+        stop.set()
+        if writer is not None:
+            writer.join()
+        app.terminate()
+        app.wait(timeout=15)
+    result["rows_inserted"] = inserted[0] if inserted else 0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="Postgres for the app; rows are inserted into deliveries")
+    parser.add_argument("--seed-rows", type=int, default=100_000)
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {', '.join(MODES)}")
+    parser.add_argument("--pollers", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0, help="seconds each poller waits between polls")
+    parser.add_argument("--limit", type=int, default=50, help="rows per page")
+    parser.add_argument("--insert-rate", type=float, default=2, help="deliveries inserted per second during the run")
+    parser.add_argument("--cache-ttl", type=float, default=2, help="HISTORY_CACHE_TTL for the cached modes")
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise SystemExit(f"Unknown modes: {unknown}")
+    if args.database_url.startswith("postgresql://"):
+        # The app's SQLAlchemy engine is psycopg2-based
+        args.database_url = "postgresql+psycopg2://" + args.database_url.split("://", 1)[1]
+    prepare_database(args.database_url, args.seed_rows)
+
+    base_env = {**os.environ, "DATABASE_URL": args.database_url, "DB_POOL_TIMEOUT": "2", "RATE_LIMIT_BACKEND": "off"}
+    report = {
+        "revision": git_revision(),
+        "config": {
+            "pollers": args.pollers,
+            "interval_sec": args.interval,
+            "limit": args.limit,
+            "insert_rate": args.insert_rate,
+            "cache_ttl_sec": args.cache_ttl,
+            "seconds": args.seconds,
+            "workers": args.workers,
+            "seed_rows": args.seed_rows,
+        },
+        "modes": {name: run_mode(name, args, base_env) for name in modes},
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cost of the metrics instrumentation on the request path.
+
+  primitives  ns per Counter.inc, Histogram.observe and upstream_call()
+  middleware  per-request latency of a trivial FastAPI app with and without
+              MetricsMiddleware, in process over httpx's ASGI transport, so
+              the difference is the middleware and nothing else
+  render      time to render /metrics after the run
+
+    cd backend && python benchmarks/bench_metrics_overhead.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+
+from bench_async_optimize import percentile
+from services.metrics import Counter, Histogram, MetricsMiddleware, registry, upstream_call
+
+
+def ns_per_call(fn, n):
+    started = time.perf_counter_ns()
+    for _ in range(n):
+        fn()
+    return round((time.perf_counter_ns() - started) / n, 1)
+
+
+def bench_primitives(n):
+    counter = Counter("bench_total", "bench", ("kind",)).labels("x")
+    histogram = Histogram("bench_seconds", "bench", ("kind",)).labels("x")
+
+    def timed_upstream():
+        with upstream_call("bench"):
+            pass
+
+    return {
+        "counter_inc_ns": ns_per_call(counter.inc, n),
+        "histogram_observe_ns": ns_per_call(lambda: histogram.observe(0.003), n),
+        "upstream_call_ns": ns_per_call(timed_upstream, n),
+    }
+
+
+def make_app(instrumented):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def bench_app(app, total):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(200):  # warm up
+            await client.get(f"/items/{i}")
+        for i in range(total):
+            t0 = time.perf_counter()
+            await client.get(f"/items/{i}")
+            latencies.append(time.perf_counter() - t0)
+    return {
+        "requests": total,
+        "mean_us": round(sum(latencies) / total * 1e6, 1),
+        "p50_us": round(percentile(latencies, 50) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 99) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    primitives = bench_primitives(args.iterations)
+    # Alternate runs so drift on a busy machine hits both sides
+    runs = {"plain": [], "instrumented": []}
+    for _ in range(2):
+        for name in runs:
+            runs[name].append(asyncio.run(bench_app(make_app(name == "instrumented"), args.requests // 2)))
+    middleware = {name: min(r, key=lambda x: x["p50_us"]) for name, r in runs.items()}
+
+    t0 = time.perf_counter()
+    text = registry.render()
+    render_ms = (time.perf_counter() - t0) * 1000
+
+    print(json.dumps({
+        "primitives": primitives,
+        "middleware": middleware,
+        "overhead_p50_us": round(middleware["instrumented"]["p50_us"] - middleware["plain"]["p50_us"], 1),
+        "overhead_mean_us": round(middleware["instrumented"]["mean_us"] - middleware["plain"]["mean_us"], 1),
+        "render": {"ms": round(render_ms, 2), "lines": text.count("\n")},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
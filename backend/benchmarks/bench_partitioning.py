@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Time-range query latency: plain deliveries table vs monthly partitions + BRIN.
+
+Seeds two scratch tables with the same --rows rows spread evenly over
+--months months (rows arrive in created_at order, like production):
+
+  plain        deliveries as it is without partitioning: a primary key plus the
+               B-tree indexes on (created_at, id) and (city, created_at, id)
+  partitioned  range-partitioned by month through services/partitions.py,
+               with the same B-tree indexes plus a BRIN index on created_at
+
+It then times, on both tables, aggregates over 1-hour, 1-day, 1-week and
+1-month windows at random offsets, a /history page filtered by a time
+window (routers/history.py's query builder), and retiring the oldest month
+(DELETE vs detach + drop of one partition). It also reports the table and
+index sizes. Needs DATABASE_URL to point at Postgres; the production
+deliveries table is never touched.
+
+    cd backend && python benchmarks/bench_partitioning.py --rows 5000000 --months 12
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_connection
+from routers.history import HISTORY_COLUMNS, HistoryFilters, fetch_history_page
+from services.partitions import add_months, ensure_partitions, list_partitions, month_start
+
+PLAIN = "deliveries_bench_plain"
+PARTITIONED = "deliveries_bench_part"
+COLUMNS = """
+    id integer NOT NULL, city varchar, perishability integer, travel_time_sec integer,
+    weather varchar, final_score double precision, created_at timestamp
+"""
+WINDOWS = {"1h": timedelta(hours=1), "1d": timedelta(days=1), "1w": timedelta(weeks=1), "1mo": timedelta(days=30)}
+
+
+def insert_rows(cur, table, rows, first, span_sec):
+    cur.execute(f"""
+        INSERT INTO {table} (id, city, perishability, travel_time_sec, weather, final_score, created_at)
+        SELECT g,
+               (ARRAY['Mumbai','Pune','Delhi','Chennai','Bengaluru'])[1 + g %% 5],
+               1 + g %% 10,
+               300 + g %% 3000,
+               (ARRAY['clear sky','light rain','haze'])[1 + g %% 3],
+               (1 + g %% 10) * (300 + g %% 3000) / 60.0,
+               %s::timestamp + (g * %s / %s) * interval '1 second'
+        FROM generate_series(1, %s) AS g
+    """, (first, span_sec, rows, rows))
+
+
+def seed(conn, rows, months):
+    cur = conn.cursor()
+    last = month_start(datetime.now())
+    first = add_months(last, -(months - 1))
+    span_sec = (add_months(last, 1) - first).total_seconds() - 1
+    for table in (PLAIN, PARTITIONED):
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+
+    cur.execute(f"CREATE TABLE {PLAIN} ({COLUMNS})")
+    insert_rows(cur, PLAIN, rows, first, span_sec)
+    cur.execute(f"ALTER TABLE {PLAIN} ADD PRIMARY KEY (id)")
+    cur.execute(f"CREATE INDEX ON {PLAIN} (created_at, id)")
+    cur.execute(f"CREATE INDEX ON {PLAIN} (city, created_at, id)")
+
+    cur.execute(f"CREATE TABLE {PARTITIONED} ({COLUMNS}) PARTITION BY RANGE (created_at)")
+    conn.commit()
+    ensure_partitions(conn, PARTITIONED, first=first, months_ahead=0)
+    insert_rows(cur, PARTITIONED, rows, first, span_sec)
+    cur.execute(f"ALTER TABLE {PARTITIONED} ADD UNIQUE (id, created_at)")
+    cur.execute(f"CREATE INDEX ON {PARTITIONED} (created_at, id)")
+    cur.execute(f"CREATE INDEX ON {PARTITIONED} (city, created_at, id)")
+    cur.execute(f"CREATE INDEX ON {PARTITIONED} USING brin (created_at)")
+
+    for table in (PLAIN, PARTITIONED):
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+    cur.close()
+    return first, add_months(last, 1)
+
+
+def timed(fn, starts):
+    """Median ms of fn(since) over the window starts"""
+    samples = []
+    for since in starts:
+        t0 = time.perf_counter()
+        fn(since)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(samples), 2)
+
+
+def sizes(cur, table):
+    """Heap and index bytes, summed over partitions for the partitioned table"""
+    cur.execute("""
+        SELECT COALESCE(sum(pg_table_size(relid)), 0), COALESCE(sum(pg_indexes_size(relid)), 0)
+        FROM pg_partition_tree(%s) WHERE isleaf
+    """, (table,))
+    heap, indexes = cur.fetchone()
+    return {"table_mb": round(heap / 2**20, 1), "indexes_mb": round(indexes / 2**20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=20, help="random windows per window size")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch tables")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    t0 = time.perf_counter()
+    first, end = seed(conn, args.rows, args.months)
+    print(f"Seeded {args.rows} rows into both tables in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    cur = conn.cursor()
+    rng = random.Random(1)
+    span = (end - first).total_seconds()
+    results = []
+    for label, window in WINDOWS.items():
+        starts = [first + timedelta(seconds=rng.random() * (span - window.total_seconds())) for _ in range(args.queries)]
+        row = {"window": label}
+        for name, table in (("plain", PLAIN), ("partitioned", PARTITIONED)):
+            def aggregate(since):
+                cur.execute(
+                    f"SELECT count(*), avg(travel_time_sec), avg(final_score) FROM {table} "
+                    f"WHERE created_at >= %s AND created_at < %s",
+                    (since, since + window),
+                )
+                cur.fetchall()
+
+            def history_page(since):
+                filters = HistoryFilters(since=since, until=since + window)
+                fetch_history_page(cur, filters, list(HISTORY_COLUMNS), args.page_size, table=table)
+
+            row[f"{name}_aggregate_ms"] = timed(aggregate, starts)
+            row[f"{name}_history_page_ms"] = timed(history_page, starts)
+        results.append(row)
+
+    retire = {}
+    t0 = time.perf_counter()
+    cur.execute(f"DELETE FROM {PLAIN} WHERE created_at < %s", (add_months(first, 1),))
+    conn.commit()
+    retire["plain_delete_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    name = list_partitions(cur, PARTITIONED)[0][1]
+    t0 = time.perf_counter()
+    cur.execute(f"ALTER TABLE {PARTITIONED} DETACH PARTITION {name}")
+    cur.execute(f"DROP TABLE {name}")
+    conn.commit()
+    retire["partitioned_drop_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    report = {
+        "rows": args.rows,
+        "months": args.months,
+        "sizes": {"plain": sizes(cur, PLAIN), "partitioned": sizes(cur, PARTITIONED)},
+        "results": results,
+        "retire_oldest_month": retire,
+    }
+    if not args.keep:
+        cur.execute(f"DROP TABLE {PLAIN}")
+        cur.execute(f"DROP TABLE {PARTITIONED}")
+        conn.commit()
+    conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
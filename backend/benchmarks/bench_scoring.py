@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Rows per second of the scoring engine (services/scoring.py).
+
+For each cost model and batch size, scores synthetic legs (perishability,
+travel time, OpenWeather description, temperature, distance) through
+score_batch, with and without classifying the weather descriptions in
+the same pass. A plain Python loop over score() is the baseline.
+
+    cd backend && python benchmarks/bench_scoring.py --sizes 1 1000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.scoring import MODELS, score, score_batch, weather_severity_batch
+
+DESCRIPTIONS = ["clear sky", "few clouds", "light rain", "haze", "thunderstorm", "mist", "moderate rain", "overcast clouds"]
+
+
+def make_legs(n, rng):
+    return {
+        "perishability": rng.integers(1, 11, n),
+        "travel_time_sec": rng.integers(120, 7200, n),
+        "weather": [DESCRIPTIONS[i] for i in rng.integers(0, len(DESCRIPTIONS), n)],
+        "temperature_c": rng.normal(28, 6, n),
+        "distance_m": rng.uniform(500, 60000, n),
+    }
+
+
+def rows_per_sec(fn, n, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(n / statistics.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--loop-rows", type=int, default=20_000, help="rows for the per-leg Python loop baseline")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    results = []
+    for n in args.sizes:
+        legs = make_legs(n, rng)
+        severity = weather_severity_batch(legs["weather"])
+        for name in MODELS:
+            row = {"model": name, "rows": n}
+            row["scores_rows_per_sec"] = rows_per_sec(lambda: score_batch(
+                legs["perishability"], legs["travel_time_sec"], severity, legs["temperature_c"], legs["distance_m"], model=name,
+            ), n, args.repeat)
+            row["with_weather_classification_rows_per_sec"] = rows_per_sec(lambda: score_batch(
+                legs["perishability"], legs["travel_time_sec"], weather_severity_batch(legs["weather"]),
+                legs["temperature_c"], legs["distance_m"], model=name,
+            ), n, args.repeat)
+            results.append(row)
+
+    n = args.loop_rows
+    legs = make_legs(n, rng)
+    severity = weather_severity_batch(legs["weather"]).tolist()
+    columns = [legs[k].tolist() for k in ("perishability", "travel_time_sec", "temperature_c", "distance_m")]
+    loop = rows_per_sec(lambda: [
+        score(p, t, s, c, d) for p, t, s, c, d in zip(columns[0], columns[1], severity, columns[2], columns[3])
+    ], n, 1)
+    print(json.dumps({"results": results, "python_loop_baseline": {"rows": n, "rows_per_sec": loop}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
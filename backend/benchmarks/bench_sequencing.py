@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Multi-stop sequencing on random instances.
+
+Builds a depot plus N drops around Mumbai with a haversine-based travel
+time matrix (no upstream calls), runs solve_sequence with the given time
+budget and reports wall time and how much local search improved on the
+construction heuristic.
+
+    cd backend && python benchmarks/bench_sequencing.py --stops 50 200 500 --budget-ms 800
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.geo import haversine_m
+from services.sequencing import solve_sequence
+
+
+def random_instance(n, seed):
+    rng = random.Random(seed)
+    points = [(19.07, 72.87)] + [(19.0 + rng.random() * 0.25, 72.8 + rng.random() * 0.2) for _ in range(n)]
+    matrix = [[int(haversine_m(*a, *b) / 8.33) + (0 if a == b else 60) for b in points] for a in points]
+    perishability = [rng.randint(1, 10) for _ in range(n)]
+    return matrix, perishability
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stops", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--budget-ms", type=float, default=800)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.stops:
+        matrix, perishability = random_instance(n, args.seed)
+        t0 = time.perf_counter()
+        result = solve_sequence(matrix, perishability, time_budget=args.budget_ms / 1000)
+        wall_ms = (time.perf_counter() - t0) * 1000
+        results.append({
+            "stops": n,
+            "wall_ms": round(wall_ms, 1),
+            "construction_objective": round(result.construction_objective),
+            "objective": round(result.objective),
+            "improvement_pct": round(100 * (1 - result.objective / result.construction_objective), 2),
+            "iterations": result.iterations,
+            "moves": result.moves,
+            "timed_out": result.timed_out,
+        })
+    print(json.dumps({"budget_ms": args.budget_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
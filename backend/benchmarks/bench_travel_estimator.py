@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Accuracy versus latency of the historical travel time estimator (services/travel_estimator.py).
+
+Replays delivery history in time order: the estimator is built from the
+first --train-frac of the legs, then every later leg is estimated at its
+own departure time and compared with the travel time that was observed.
+Reports, per confidence threshold, the share of lookups the estimator
+would answer and its error on them (median and p90 absolute percentage
+error, MAPE), the error per profile level, and the lookup latency, next
+to the average lookup latency if TomTom (--tomtom-ms) answers the rest.
+
+History comes from deliveries (--source db, the legs with an observed
+travel time and coordinates; needs DATABASE_URL) or is synthetic
+(--source synthetic): --lanes origin/destination lanes around Mumbai with
+Zipf-distributed popularity, weekday rush hours, quiet nights, ~300 m
+jitter of both endpoints and lognormal noise per trip.
+
+    cd backend && python benchmarks/bench_travel_estimator.py --source synthetic --trips 500000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.travel_estimator import OBSERVED_SOURCES, TravelTimeEstimator
+
+THRESHOLDS = (0.0, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def traffic_factor(weekday, hour):
+    if weekday < 5 and (8 <= hour < 11 or 17 <= hour < 21):
+        return 1.5
+    if hour < 6:
+        return 0.75
+    return 1.0
+
+
+def synthetic_history(trips, lanes, days, noise, rng):
+    """(start_lat, start_lng, end_lat, end_lng, travel_time_sec, created_at) columns, oldest first"""
+    origins = rng.normal([19.07, 72.87], 0.08, (lanes, 2))
+    destinations = rng.normal([19.07, 72.87], 0.12, (lanes, 2))
+    pace = rng.uniform(0.09, 0.16, lanes)  # seconds per metre, ~22-40 km/h
+    popularity = 1 / np.arange(1, lanes + 1)
+    lane = rng.choice(lanes, trips, p=popularity / popularity.sum())
+    jitter = rng.normal(0, 0.0027, (trips, 4))  # ~300 m
+    start = origins[lane] + jitter[:, :2]
+    end = destinations[lane] + jitter[:, 2:]
+    offsets = np.sort(rng.uniform(0, days * 86400, trips))
+    first = datetime(2026, 1, 5)
+    created_at = [first + timedelta(seconds=float(s)) for s in offsets]
+    factor = np.array([traffic_factor(t.weekday(), t.hour) for t in created_at])
+    lat1, lng1, lat2, lng2 = (np.radians(c) for c in (start[:, 0], start[:, 1], end[:, 0], end[:, 1]))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    distance = 2 * 6371000.0 * np.arcsin(np.sqrt(a))
+    travel = 120 + distance * pace[lane] * factor * rng.lognormal(0, noise, trips)
+    return start[:, 0], start[:, 1], end[:, 0], end[:, 1], np.round(travel), created_at
+
+
+def db_history(limit):
+    from db import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT start_lat, start_lng, end_lat, end_lng, travel_time_sec, created_at FROM deliveries
+        WHERE travel_time_source IN %s AND start_lat IS NOT NULL AND end_lat IS NOT NULL
+          AND travel_time_sec > 0 AND created_at IS NOT NULL
+        ORDER BY created_at DESC LIMIT %s
+    """, (OBSERVED_SOURCES, limit))
+    rows = cur.fetchall()[::-1]
+    conn.close()
+    if not rows:
+        raise SystemExit("No deliveries with coordinates and an observed travel time")
+    columns = list(zip(*rows))
+    return (*(np.array(c, dtype=np.float64) for c in columns[:5]), list(columns[5]))
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("synthetic", "db"), default="synthetic")
+    parser.add_argument("--trips", type=int, default=200_000, help="synthetic legs, or newest deliveries for --source db")
+    parser.add_argument("--lanes", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=56)
+    parser.add_argument("--noise", type=float, default=0.12, help="lognormal sigma of synthetic trip times")
+    parser.add_argument("--train-frac", type=float, default=0.8)
+    parser.add_argument("--replay", type=int, default=50_000, help="held-out legs to estimate")
+    parser.add_argument("--cell-deg", type=float, default=None, help="grid cell size (default TRAVEL_ESTIMATOR_CELL_DEG)")
+    parser.add_argument("--tomtom-ms", type=float, default=250, help="assumed TomTom latency for lookups not answered")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    if args.source == "synthetic":
+        history = synthetic_history(args.trips, args.lanes, args.days, args.noise, rng)
+    else:
+        history = db_history(args.trips)
+    *coords, travel, created_at = history
+    n = len(travel)
+    split = int(n * args.train_frac)
+
+    estimator = TravelTimeEstimator(**({"cell_deg": args.cell_deg} if args.cell_deg else {}))
+    how = [t.weekday() * 24 + t.hour for t in created_at[:split]]
+    t0 = time.perf_counter()
+    estimator.build(*(c[:split] for c in coords), travel[:split], how)
+    build_sec = time.perf_counter() - t0
+
+    replay = range(split, min(n, split + args.replay))
+    columns = [c.tolist() for c in coords]
+    latencies, confidences, errors, levels = [], [], [], []
+    for i in replay:
+        t0 = time.perf_counter()
+        estimate = estimator.estimate(columns[0][i], columns[1][i], columns[2][i], columns[3][i], created_at[i])
+        latencies.append(time.perf_counter() - t0)
+        if estimate is not None:
+            confidences.append(estimate.confidence)
+            errors.append(abs(estimate.travel_time_sec - travel[i]) / travel[i] * 100)
+            levels.append(estimate.level)
+    confidences, errors = np.array(confidences), np.array(errors)
+
+    by_threshold = []
+    for threshold in THRESHOLDS:
+        answered = errors[confidences >= threshold]
+        coverage = len(answered) / len(replay)
+        by_threshold.append({
+            "min_confidence": threshold,
+            "answered_pct": round(coverage * 100, 1),
+            "median_abs_error_pct": round(percentile(answered, 50), 1) if len(answered) else None,
+            "p90_abs_error_pct": round(percentile(answered, 90), 1) if len(answered) else None,
+            "mape_pct": round(float(answered.mean()), 1) if len(answered) else None,
+            # Estimator for the answered share, TomTom for the rest
+            "mean_lookup_ms": round(coverage * statistics.mean(latencies) * 1000 + (1 - coverage) * args.tomtom_ms, 2),
+        })
+    by_level = {}
+    for level in sorted(set(levels)):
+        mask = np.array([lv == level for lv in levels])
+        by_level[level] = {
+            "lookups": int(mask.sum()),
+            "mean_confidence": round(float(confidences[mask].mean()), 3),
+            "median_abs_error_pct": round(percentile(errors[mask], 50), 1),
+        }
+
+    micros = np.array(latencies) * 1e6
+    report = {
+        "source": args.source,
+        "history_rows": n,
+        "train_rows": split,
+        "replayed": len(replay),
+        "build_sec": round(build_sec, 2),
+        "profiles": estimator.stats()["profiles"],
+        "cell_pairs": estimator.stats()["pairs"],
+        "lookup_us": {"p50": round(percentile(micros, 50), 1), "p99": round(percentile(micros, 99), 1)},
+        "tomtom_ms_assumed": args.tomtom_ms,
+        "no_estimate_pct": round((1 - len(errors) / len(replay)) * 100, 1),
+        "by_threshold": by_threshold,
+        "by_level": by_level,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Memory ceiling check for the streaming /history/export path.
+
+Seeds a scratch table (deliveries_bench) with --rows rows, streams it
+through iter_export (NDJSON and CSV, optionally gzipped) and records the
+peak Python heap with tracemalloc. Exits non-zero if the peak goes over
+--ceiling-mb, so it can gate changes to the export code. Run it at two
+very different sizes to see that the peak does not grow with the table.
+Needs DATABASE_URL to point at Postgres.
+
+    cd backend && python benchmarks/export_memory_ceiling.py --rows 2000000 --ceiling-mb 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import get_connection
+from routers.history import HISTORY_COLUMNS, HistoryFilters, _gzip_chunks, iter_export
+from bench_history_pagination import TABLE, seed
+
+
+def measure(conn, fmt, gzip, fetch_size):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    chunks = iter_export(conn, HistoryFilters(), list(HISTORY_COLUMNS), fmt, fetch_size, table=TABLE)
+    if gzip:
+        chunks = _gzip_chunks(chunks)
+    total_bytes = 0
+    for chunk in chunks:
+        total_bytes += len(chunk)  # the response body is discarded, as a socket write would
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "format": fmt,
+        "gzip": gzip,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": None,
+        "peak_heap_mb": round(peak / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--fetch-size", type=int, default=2000)
+    parser.add_argument("--ceiling-mb", type=float, default=32)
+    parser.add_argument("--reuse", action="store_true", help="reuse an existing scratch table")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    cur = conn.cursor()
+    if not args.reuse:
+        seed(cur, args.rows)
+        conn.commit()
+    cur.execute(f"SELECT count(*) FROM {TABLE}")
+    rows = cur.fetchone()[0]
+    cur.close()
+
+    results = []
+    for fmt, gzip in (("ndjson", False), ("csv", False), ("ndjson", True)):
+        result = measure(conn, fmt, gzip, args.fetch_size)
+        result["rows_per_sec"] = round(rows / result["seconds"]) if result["seconds"] else None
+        results.append(result)
+    conn.close()
+
+    worst = max(r["peak_heap_mb"] for r in results)
+    print(json.dumps({"rows": rows, "fetch_size": args.fetch_size, "ceiling_mb": args.ceiling_mb, "results": results}, indent=2))
+    if worst > args.ceiling_mb:
+        print(f"❌ Peak heap {worst} MB exceeds the {args.ceiling_mb} MB ceiling")
+        sys.exit(1)
+    print(f"✅ Peak heap {worst} MB within the {args.ceiling_mb} MB ceiling")
+
+
+if __name__ == "__main__":
+    main()
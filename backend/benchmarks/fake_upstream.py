@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the TomTom and OpenWeather APIs.
+
+Answers the endpoints RouteMonk calls with deterministic, distance-based
+payloads after a configurable delay, so benchmarks can run without API keys
+or network access:
+
+    python benchmarks/fake_upstream.py --port 9100 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+CONDITIONS = ("clear sky", "few clouds", "light rain", "clear sky", "thunderstorm", "mist")
+
+
+def fake_travel_time(lat1, lng1, lat2, lng2):
+    # ~30 km/h average city speed plus a fixed two minutes of overhead
+    return int(haversine_m(lat1, lng1, lat2, lng2) / 8.33) + 120
+
+
+class TokenBucket:
+    def __init__(self, qps):
+        self.qps = qps
+        self.tokens = qps
+        self.updated_at = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.qps, self.tokens + (now - self.updated_at) * self.qps)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def create_app(latency_ms=100, max_matrix_cells=200, tomtom_qps=0, openweather_qps=0, error_rate=0.0):
+    app = FastAPI(title="Fake upstream")
+    stats = {"requests": 0, "throttled": 0, "errors": 0, "by_provider": {"tomtom": 0, "openweather": 0}}
+    # Injected outage: every upstream call waits latency_ms and, if status is set, fails with it;
+    # independently, a random error_rate fraction of calls answers 500
+    faults = {"latency_ms": latency_ms, "status": None, "error_rate": error_rate}
+    # Like the real APIs, answer 429 when a provider's QPS limit is exceeded
+    limits = {
+        name: TokenBucket(qps)
+        for name, qps in (("tomtom", tomtom_qps), ("openweather", openweather_qps)) if qps
+    }
+
+    @app.middleware("http")
+    async def simulate_upstream(request: Request, call_next):
+        if request.url.path.startswith("/__"):
+            return await call_next(request)
+        stats["requests"] += 1
+        provider = "openweather" if request.url.path.startswith("/data") else "tomtom"
+        stats["by_provider"][provider] += 1
+        if provider in limits and not limits[provider].take():
+            stats["throttled"] += 1
+            return JSONResponse({"error": "Too Many Requests"}, status_code=429)
+        await asyncio.sleep(faults["latency_ms"] / 1000)
+        if faults["status"]:
+            return JSONResponse({"error": "injected fault"}, status_code=faults["status"])
+        if faults["error_rate"] and random.random() < faults["error_rate"]:
+            stats["errors"] += 1
+            return JSONResponse({"error": "injected error"}, status_code=500)
+        return await call_next(request)
+
+    @app.get("/__stats")
+    async def get_stats():
+        return stats
+
+    @app.put("/__faults")
+    async def set_faults(request: Request):
+        faults.update(await request.json())
+        return faults
+
+    @app.get("/routing/1/calculateRoute/{locations}/json")
+    async def calculate_route(locations: str):
+        start, end = locations.split(":")
+        lat1, lng1 = map(float, start.split(","))
+        lat2, lng2 = map(float, end.split(","))
+        # Straight-line geometry with a point roughly every 100 m, like a real polyline
+        steps = max(1, int(haversine_m(lat1, lng1, lat2, lng2) / 100))
+        points = [
+            {"latitude": round(lat1 + (lat2 - lat1) * i / steps, 5), "longitude": round(lng1 + (lng2 - lng1) * i / steps, 5)}
+            for i in range(steps + 1)
+        ]
+        return {
+            "routes": [{
+                "summary": {
+                    "travelTimeInSeconds": fake_travel_time(lat1, lng1, lat2, lng2),
+                    "lengthInMeters": int(haversine_m(lat1, lng1, lat2, lng2)),
+                },
+                "legs": [{"points": points}],
+            }]
+        }
+
+    @app.post("/routing/matrix/2")
+    async def matrix(request: Request):
+        body = await request.json()
+        origins = [(o["point"]["latitude"], o["point"]["longitude"]) for o in body["origins"]]
+        destinations = [(d["point"]["latitude"], d["point"]["longitude"]) for d in body["destinations"]]
+        if len(origins) * len(destinations) > max_matrix_cells:
+            return JSONResponse({"detailedError": {"code": "BadRequest"}}, status_code=400)
+        cells = []
+        for i, (lat1, lng1) in enumerate(origins):
+            for j, (lat2, lng2) in enumerate(destinations):
+                cells.append({
+                    "originIndex": i,
+                    "destinationIndex": j,
+                    "routeSummary": {
+                        "travelTimeInSeconds": fake_travel_time(lat1, lng1, lat2, lng2),
+                        "lengthInMeters": int(haversine_m(lat1, lng1, lat2, lng2)),
+                    },
+                })
+        return {"data": cells, "statistics": {"totalCount": len(cells), "successes": len(cells), "failures": 0}}
+
+    @app.get("/data/2.5/weather")
+    async def weather(q: str = None, lat: float = None, lon: float = None):
+        if q is not None:
+            name, temp = q, 25.0
+            description = "clear sky"
+        else:
+            name = f"Cell {round(lat, 1)},{round(lon, 1)}"
+            temp = round(30 - abs(lat) / 3, 1)
+            # Varies from one ~10 km square to the next, so corridor sampling has something to find
+            description = CONDITIONS[int(abs(lat) * 10 + abs(lon) * 10) % len(CONDITIONS)]
+        return {
+            "name": name,
+            "weather": [{"description": description}],
+            "main": {"temp": temp},
+        }
+
+    return app
+
+
+class FakeUpstream:
+    """Handle for a fake upstream running in a child process"""
+
+    def __init__(self, process, port):
+        self.process = process
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+
+    def stats(self):
+        return httpx.get(f"{self.url}/__stats").json()
+
+    def set_faults(self, latency_ms, status=None, error_rate=0.0):
+        """Change the latency of every call, and make them fail with `status` (None = healthy)
+        or a random `error_rate` fraction of them fail with 500"""
+        return httpx.put(
+            f"{self.url}/__faults", json={"latency_ms": latency_ms, "status": status, "error_rate": error_rate}
+        ).json()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_upstream(port=0, latency_ms=100, extra_args=()):
+    """Start the fake server in its own process (so it never competes with the
+    code under test for the GIL) and wait until it answers"""
+    port = port or _free_port()
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--port", str(port), "--latency-ms", str(latency_ms), *extra_args],
+        stdout=subprocess.DEVNULL,
+    )
+    upstream = FakeUpstream(process, port)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            upstream.stats()
+            return upstream
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    upstream.stop()
+    raise RuntimeError("Fake upstream did not start")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fake TomTom/OpenWeather upstream")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--max-matrix-cells", type=int, default=200, help="reject larger matrix requests like TomTom does")
+    parser.add_argument("--tomtom-qps", type=float, default=0, help="answer 429 above this rate (0 = unlimited)")
+    parser.add_argument("--openweather-qps", type=float, default=0, help="answer 429 above this rate (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of calls answered with 500")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(
+        create_app(
+            latency_ms=args.latency_ms,
+            max_matrix_cells=args.max_matrix_cells,
+            tomtom_qps=args.tomtom_qps,
+            openweather_qps=args.openweather_qps,
+            error_rate=args.error_rate,
+        ),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+        backlog=4096,
+    )
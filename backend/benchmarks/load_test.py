@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Load test of the whole app against local stand-ins for its dependencies.
+
+Starts the fake TomTom/OpenWeather upstream (fake_upstream.py) with
+`--latency-ms` and `--error-rate`, and the FastAPI app under uvicorn, both
+as child processes. `--concurrency` clients then drive /optimize/ and
+/history/ in the `--mix` proportions for `--seconds` (after `--warmup`).
+The report is JSON, with throughput, p50/p95/p99, status codes and errors
+per endpoint. Save a run with `--output` and pass it as `--baseline` on
+the next commit to get the relative change.
+
+The database is a real Postgres given by `--database-url`, for example a
+throwaway `docker run --rm -e POSTGRES_PASSWORD=x -p 5433:5432 postgres:16`.
+Tables are created with create_tables.py and `--seed-rows` history rows are
+inserted first. The raw SQL paths are Postgres-specific (named cursors,
+execute_values), so there is no SQLite stand-in. Without `--database-url`
+the app gets an unreachable database. /optimize/ still runs end to end and
+counts its failed inserts as db_errors, and /history/ is left out of the mix.
+
+Extra app settings go through `--env`, e.g. `--env DELIVERY_WRITE_MODE=behind`.
+
+    cd backend && python benchmarks/load_test.py --concurrency 50 --seconds 20 \\
+        --database-url postgresql://postgres:x@127.0.0.1:5433/postgres --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from bench_async_optimize import percentile
+from fake_upstream import _free_port, start_fake_upstream
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UNREACHABLE_DATABASE_URL = "postgresql+psycopg2://routemonk@127.0.0.1:1/routemonk"
+CITIES = ("Mumbai", "Pune", "Delhi", "Chennai", "Bengaluru")
+
+
+def random_routes(count, seed):
+    """Origin/destination pairs around Mumbai; a fixed set so repeated routes hit the caches"""
+    rng = random.Random(seed)
+    point = lambda: f"{18.9 + rng.random() * 0.3:.4f},{72.8 + rng.random() * 0.2:.4f}"
+    return [(point(), point()) for _ in range(count)]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("optimize", "history"):
+            raise SystemExit(f"Unknown endpoint in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_revision():
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=BACKEND_DIR) != 0
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_database(url, seed_rows):
+    subprocess.run([sys.executable, "create_tables.py"], cwd=BACKEND_DIR, env={**os.environ, "DATABASE_URL": url},
+                   check=True, stdout=subprocess.DEVNULL)
+    if not seed_rows:
+        return
+    import psycopg2
+    from db import _psycopg2_dsn
+
+    conn = psycopg2.connect(_psycopg2_dsn(url))
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO deliveries (city, perishability, travel_time_sec, weather, final_score, created_at)
+        SELECT (%s::text[])[1 + g %% 5], 1 + g %% 10, 300 + g %% 3000,
+               (ARRAY['clear sky','light rain','haze'])[1 + g %% 3],
+               (1 + g %% 10) * (300 + g %% 3000) / 60.0,
+               now() - g * interval '1 second'
+        FROM generate_series(1, %s) AS g
+    """, (list(CITIES), seed_rows))
+    conn.commit()
+    conn.close()
+
+
+def start_app(port, workers, env):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode} during startup")
+        try:
+            httpx.get(f"{url}/", timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.sources = Counter()
+
+    def summary(self, elapsed):
+        latencies = self.latencies
+        ms = lambda pct: round(percentile(latencies, pct) * 1000, 1) if latencies else None
+        return {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": ms(50),
+            "p95_ms": ms(95),
+            "p99_ms": ms(99),
+            "max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+            "statuses": dict(sorted(self.statuses.items())),
+            "errors": dict(sorted(self.errors.items())),
+            **({"sources": dict(sorted(self.sources.items()))} if self.sources else {}),
+        }
+
+
+async def optimize_request(client, rng, routes, recorder):
+    start, end = rng.choice(routes)
+    response = await client.post("/optimize/", json={"perishability": rng.randint(1, 10), "start": start, "end": end})
+    if response.status_code == 200:
+        body = response.json()
+        if "error" in body:
+            recorder.errors["db_error" if body["error"].startswith("Database") else "app_error"] += 1
+        for kind, source in body.get("sources", {}).items():
+            recorder.sources[f"{kind}:{source}"] += 1
+    return response
+
+
+async def history_request(client, rng, routes, recorder):
+    params = {"limit": 50}
+    if rng.random() < 0.5:
+        params["city"] = rng.choice(CITIES)
+    return await client.get("/history/", params=params)
+
+
+REQUESTS = {"optimize": optimize_request, "history": history_request}
+
+
+async def drive(url, args, mix, routes):
+    recorders = {name: Recorder() for name in mix}
+    names, weights = list(mix), list(mix.values())
+    started = time.monotonic()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.seconds
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        async def worker(seed):
+            rng = random.Random(seed)
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                recorder = recorders[name] if time.monotonic() >= measure_from else Recorder()
+                t0 = time.perf_counter()
+                try:
+                    response = await REQUESTS[name](client, rng, routes, recorder)
+                    recorder.statuses[str(response.status_code)] += 1
+                    if response.status_code >= 400:
+                        recorder.errors[f"http_{response.status_code}"] += 1
+                except httpx.HTTPError as e:
+                    recorder.errors[type(e).__name__] += 1
+                recorder.latencies.append(time.perf_counter() - t0)
+
+        await asyncio.gather(*(worker(args.seed + i) for i in range(args.concurrency)))
+
+    elapsed = time.monotonic() - measure_from
+    return {name: recorder.summary(elapsed) for name, recorder in recorders.items()}
+
+
+def compare(results, baseline):
+    """Relative change per endpoint against a previous report: + means more throughput or more latency"""
+    change = {}
+    for name, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        change[name] = {
+            key: f"{(current[key] - before[key]) / before[key] * 100:+.1f}%"
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+            if current.get(key) is not None and before.get(key)
+        }
+        change[name]["baseline_revision"] = baseline.get("revision")
+    return change
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument("--mix", default="optimize=4,history=1", help="endpoint weights")
+    parser.add_argument("--routes", type=int, default=200, help="distinct origin/destination pairs")
+    parser.add_argument("--latency-ms", type=float, default=100, help="fake upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of upstream calls answering 500")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--database-url", default=None, help="Postgres for the app; the deliveries table is written to")
+    parser.add_argument("--seed-rows", type=int, default=0, help="history rows to insert before the run")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app setting")
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout per request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="report from a previous run to compare against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.database_url and args.database_url.startswith("postgresql://"):
+        # The app's SQLAlchemy engine is psycopg2-based
+        args.database_url = "postgresql+psycopg2://" + args.database_url.split("://", 1)[1]
+    notes = []
+    if not args.database_url and "history" in mix:
+        del mix["history"]
+        notes.append("no --database-url: /history/ left out, /optimize/ inserts fail and count as db_error")
+    if not mix:
+        raise SystemExit("Nothing to run")
+    if args.database_url:
+        prepare_database(args.database_url, args.seed_rows)
+
+    upstream = start_fake_upstream(
+        latency_ms=args.latency_ms, extra_args=["--error-rate", str(args.error_rate)]
+    )
+    env = {
+        **os.environ,
+        "DATABASE_URL": args.database_url or UNREACHABLE_DATABASE_URL,
+        "TOMTOM_BASE_URL": upstream.url,
+        "OPENWEATHER_BASE_URL": upstream.url,
+        "TOMTOM_API_KEY": "load-test",
+        "OPENWEATHER_API_KEY": "load-test",
+        # Measure the app, not our own upstream quotas or a weather cache left by the last run
+        "RATE_LIMIT_BACKEND": "off",
+        "WEATHER_CACHE_BACKEND": "memory",
+        "DB_POOL_TIMEOUT": "2",
+    }
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        env[key] = value
+
+    app = None
+    try:
+        app, url = start_app(_free_port(), args.workers, env)
+        before = upstream.stats()
+        endpoints = asyncio.run(drive(url, args, mix, random_routes(args.routes, args.seed)))
+        after = upstream.stats()
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait(timeout=15)
+        upstream.stop()
+
+    report = {
+        "revision": git_revision(),
+        "config": {
+            "concurrency": args.concurrency,
+            "seconds": args.seconds,
+            "mix": mix,
+            "routes": args.routes,
+            "latency_ms": args.latency_ms,
+            "error_rate": args.error_rate,
+            "workers": args.workers,
+            "database": "postgres" if args.database_url else "unreachable",
+            "seed_rows": args.seed_rows,
+            "env": args.env,
+        },
+        "endpoints": endpoints,
+        "upstream": {
+            "calls": {p: after["by_provider"][p] - before["by_provider"][p] for p in after["by_provider"]},
+            "errors": after["errors"] - before["errors"],
+        },
+        "notes": notes,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["change"] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
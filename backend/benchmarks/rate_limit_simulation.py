@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Rate limiter simulation against a fake TomTom that enforces a QPS limit.
+
+`--workers` processes (standing in for uvicorn workers) each run
+interactive clients (one lookup every `--interactive-interval-ms`) and
+batch clients (back to back) for `--seconds`. Every lookup is a new
+origin/destination pair, so nothing is served from cache or as stale.
+
+  unlimited  RATE_LIMIT_BACKEND=off: calls go out as fast as they arrive and
+             the upstream answers 429, which ends up as the fallback value
+  limited    RATE_LIMIT_BACKEND=sqlite, shared by all workers: no 429s,
+             interactive lookups are served ahead of batch lookups
+  quota      a daily budget of `--quota` calls: the upstream never sees more,
+             later lookups fail fast
+
+Exits with status 1 if the limited or quota run breaks its guarantee.
+
+    cd backend && python benchmarks/rate_limit_simulation.py --workers 2 --upstream-qps 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async_optimize import percentile
+from fake_upstream import start_fake_upstream
+
+
+def random_point(rng):
+    return f"{19 + rng.random() * 0.3:.5f},{72.8 + rng.random() * 0.2:.5f}"
+
+
+async def worker(args):
+    from services.http_client import close_client
+    from services.rate_limit import upstream_priority
+    from services.travel_time import get_travel_time_result_async
+
+    rng = random.Random(os.getpid())
+    deadline = time.monotonic() + args.seconds
+    lanes = {"interactive": {"latencies": [], "sources": Counter()}, "batch": {"latencies": [], "sources": Counter()}}
+
+    async def lookup(lane):
+        t0 = time.perf_counter()
+        _, source = await get_travel_time_result_async(random_point(rng), random_point(rng), use_cache=False)
+        lanes[lane]["latencies"].append(time.perf_counter() - t0)
+        lanes[lane]["sources"][source] += 1
+
+    async def interactive_client():
+        while time.monotonic() < deadline:
+            await asyncio.gather(lookup("interactive"), asyncio.sleep(args.interactive_interval_ms / 1000))
+
+    async def batch_client():
+        upstream_priority.set("batch")
+        while time.monotonic() < deadline:
+            await lookup("batch")
+
+    await asyncio.gather(
+        *(interactive_client() for _ in range(args.interactive_clients)),
+        *(batch_client() for _ in range(args.batch_clients)),
+    )
+    await close_client()
+    return {lane: {"latencies": v["latencies"], "sources": dict(v["sources"])} for lane, v in lanes.items()}
+
+
+def run_scenario(name, upstream, args, env):
+    before = upstream.stats()
+    workers = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--worker", *sys.argv[1:]],
+            env={**os.environ, **env},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        for _ in range(args.workers)
+    ]
+    results = [json.loads(w.communicate()[0]) for w in workers]
+    after = upstream.stats()
+
+    summary = {"scenario": name, "upstream_calls": after["by_provider"]["tomtom"] - before["by_provider"]["tomtom"],
+               "upstream_429s": after["throttled"] - before["throttled"]}
+    for lane in ("interactive", "batch"):
+        latencies = [x for r in results for x in r[lane]["latencies"]]
+        sources = Counter()
+        for r in results:
+            sources.update(r[lane]["sources"])
+        summary[lane] = {
+            "lookups": len(latencies),
+            "sources": dict(sources),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--upstream-qps", type=float, default=10)
+    parser.add_argument("--headroom", type=float, default=0.9, help="client QPS as a fraction of the upstream limit")
+    parser.add_argument("--interactive-clients", type=int, default=2)
+    parser.add_argument("--interactive-interval-ms", type=float, default=500)
+    parser.add_argument("--batch-clients", type=int, default=10)
+    parser.add_argument("--quota", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(worker(args))))
+        return
+
+    upstream = start_fake_upstream(latency_ms=args.latency_ms, extra_args=["--tomtom-qps", str(args.upstream_qps)])
+    common = {
+        "TOMTOM_BASE_URL": upstream.url,
+        "TOMTOM_API_KEY": "bench",
+        "WEATHER_CACHE_BACKEND": "off",
+        "TOMTOM_QPS": str(args.upstream_qps * args.headroom),
+        "TOMTOM_BURST": str(max(1.0, args.upstream_qps / 2)),
+        "TOMTOM_DAILY_QUOTA": "0",
+        "RATE_LIMIT_MAX_WAIT_BATCH": str(args.seconds),
+        # A 429 must not open the circuit and hide the comparison
+        "UPSTREAM_FAILURE_THRESHOLD": "1000000",
+    }
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            results.append(run_scenario("unlimited", upstream, args, {**common, "RATE_LIMIT_BACKEND": "off"}))
+            limited = {**common, "RATE_LIMIT_BACKEND": "sqlite", "RATE_LIMIT_PATH": os.path.join(tmp, "limited.sqlite3")}
+            results.append(run_scenario("limited", upstream, args, limited))
+            quota = {**limited, "RATE_LIMIT_PATH": os.path.join(tmp, "quota.sqlite3"), "TOMTOM_DAILY_QUOTA": str(args.quota)}
+            results.append(run_scenario("quota", upstream, args, quota))
+    finally:
+        upstream.stop()
+
+    failures = []
+    if results[1]["upstream_429s"]:
+        failures.append(f"limited run got {results[1]['upstream_429s']} upstream 429s")
+    if results[2]["upstream_calls"] > args.quota:
+        failures.append(f"quota run sent {results[2]['upstream_calls']} calls for a budget of {args.quota}")
+    print(json.dumps({"upstream_qps": args.upstream_qps, "workers": args.workers, "results": results, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
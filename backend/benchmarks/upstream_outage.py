@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Behaviour of the travel-time and weather lookups through an upstream outage.
+
+Four phases against the local fake upstream, each sending `--requests`
+lookups with `--concurrency` clients and use_cache=False (so every call
+would go upstream):
+
+  healthy   normal latency; values are "live" and become last known good
+  outage    every call is slow (`--outage-latency-ms`) and returns 503;
+            the circuits open and callers get "stale" values immediately
+  recovering upstream healthy again, UPSTREAM_RESET_TIMEOUT later: values
+            are still served stale while background refreshes probe
+  recovered a second later the circuits are closed and values are "live"
+
+    cd backend && python benchmarks/upstream_outage.py --outage-latency-ms 3000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_async_optimize import percentile
+from fake_upstream import start_fake_upstream
+
+# Starts ~5 km apart, so each one is its own weather cell
+PAIRS = [(f"{19 + i * 0.05:.3f},72.877", f"{18.9 + i * 0.05:.3f},72.834") for i in range(20)]
+
+
+async def run_phase(name, total, concurrency):
+    from services.travel_time import get_travel_time_result_async, tomtom_breaker
+    from services.weather import get_weather_by_coordinates_result_async, openweather_breaker
+
+    latencies, sources = [], Counter()
+    remaining = iter(range(total))
+
+    async def client():
+        for i in remaining:
+            start, end = PAIRS[i % len(PAIRS)]
+            lat, lng = map(float, start.split(","))
+            t0 = time.perf_counter()
+            (_, travel_source), (_, weather_source) = await asyncio.gather(
+                get_travel_time_result_async(start, end, use_cache=False),
+                get_weather_by_coordinates_result_async(lat, lng, use_cache=False),
+            )
+            latencies.append(time.perf_counter() - t0)
+            sources[f"travel_time:{travel_source}"] += 1
+            sources[f"weather:{weather_source}"] += 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return {
+        "phase": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "sources": dict(sorted(sources.items())),
+        "circuits": {"tomtom": tomtom_breaker.stats()["state"], "openweather": openweather_breaker.stats()["state"]},
+    }
+
+
+async def run(upstream, args):
+    from services.http_client import close_client
+
+    results = [await run_phase("healthy", args.requests, args.concurrency)]
+    upstream.set_faults(args.outage_latency_ms, status=503)
+    results.append(await run_phase("outage", args.requests, args.concurrency))
+    upstream.set_faults(args.latency_ms)
+    await asyncio.sleep(float(os.environ["UPSTREAM_RESET_TIMEOUT"]))
+    results.append(await run_phase("recovering", args.requests, args.concurrency))
+    await asyncio.sleep(1)
+    results.append(await run_phase("recovered", args.requests, args.concurrency))
+    await close_client()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--outage-latency-ms", type=float, default=3000)
+    parser.add_argument("--reset-timeout", type=float, default=2, help="UPSTREAM_RESET_TIMEOUT for the run")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstream(latency_ms=args.latency_ms)
+    os.environ["TOMTOM_BASE_URL"] = upstream.url
+    os.environ["OPENWEATHER_BASE_URL"] = upstream.url
+    os.environ.setdefault("TOMTOM_API_KEY", "bench")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "off")  # measure the request path, not the quota
+    os.environ["UPSTREAM_RESET_TIMEOUT"] = str(args.reset_timeout)
+    os.environ.setdefault("WEATHER_CACHE_BACKEND", "memory")
+
+    try:
+        results = asyncio.run(run(upstream, args))
+    finally:
+        upstream.stop()
+    print(json.dumps({"outage_latency_ms": args.outage_latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
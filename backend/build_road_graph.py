@@ -0,0 +1,103 @@
+import argparse
+import csv
+import json
+import os
+import numpy as np
+from services.road_graph import grid_key
+
+DEFAULT_SPEED_KPH = 30.0
+
+
+def read_nodes(path):
+    osm_ids, lat, lon = [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            osm_ids.append(int(row.get("osmid") or row["id"]))
+            lat.append(float(row.get("y") or row["lat"]))
+            lon.append(float(row.get("x") or row["lon"]))
+    return np.array(osm_ids, dtype=np.int64), np.array(lat), np.array(lon)
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ("1", "true", "yes")
+
+
+def read_edges(path, index):
+    """Edge list in seconds; two-way roads produce one edge per direction"""
+    src, dst, seconds = [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            u, v = index.get(int(row["u"])), index.get(int(row["v"]))
+            if u is None or v is None:
+                continue
+            if row.get("travel_time"):
+                t = float(row["travel_time"])
+            else:
+                speed = float(row.get("speed_kph") or DEFAULT_SPEED_KPH)
+                t = float(row["length"]) / (speed / 3.6)
+            src.append(u)
+            dst.append(v)
+            seconds.append(t)
+            if not _truthy(row.get("oneway", "")):
+                src.append(v)
+                dst.append(u)
+                seconds.append(t)
+    return np.array(src, dtype=np.int32), np.array(dst, dtype=np.int32), np.array(seconds, dtype=np.float32)
+
+
+def to_csr(n, src, dst, weights):
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(indptr, src + 1, 1)
+    return np.cumsum(indptr), dst[order].astype(np.int32), weights[order].astype(np.float32)
+
+
+def build_grid(lat, lon, cell_deg):
+    keys = grid_key(np.floor(lat / cell_deg).astype(np.int64), np.floor(lon / cell_deg).astype(np.int64))
+    order = np.argsort(keys, kind="stable")
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    indptr = np.append(starts, len(order)).astype(np.int64)
+    return unique_keys.astype(np.int64), indptr, order.astype(np.int32)
+
+
+def build_road_graph(nodes_csv, edges_csv, out_dir, cell_deg=0.01):
+    osm_ids, lat, lon = read_nodes(nodes_csv)
+    index = {osm_id: i for i, osm_id in enumerate(osm_ids.tolist())}
+    src, dst, seconds = read_edges(edges_csv, index)
+    n = len(osm_ids)
+
+    lengths = np.hypot((lat[src] - lat[dst]) * 111000, (lon[src] - lon[dst]) * 111000 * np.cos(np.radians(lat[src])))
+    # Fastest observed straight-line speed, so distance / max_speed never overestimates
+    max_speed = float(np.max(lengths / np.maximum(seconds, 1e-3))) if len(seconds) else 1.0
+    max_speed = max(max_speed * 1.05, 130 / 3.6)
+
+    arrays = {"node_lat": lat, "node_lon": lon, "osm_ids": osm_ids}
+    arrays["fwd_indptr"], arrays["fwd_indices"], arrays["fwd_weights"] = to_csr(n, src, dst, seconds)
+    arrays["rev_indptr"], arrays["rev_indices"], arrays["rev_weights"] = to_csr(n, dst, src, seconds)
+    arrays["grid_keys"], arrays["grid_indptr"], arrays["grid_nodes"] = build_grid(lat, lon, cell_deg)
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), values)
+    meta = {"nodes": n, "edges": int(len(src)), "cell_deg": cell_deg, "max_speed_mps": max_speed}
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Preprocess an OSM-derived road network (nodes/edges CSV, e.g. exported with osmnx) "
+                    "into the memory-mappable CSR arrays used by services/road_graph.py"
+    )
+    parser.add_argument("nodes_csv", help="columns: osmid (or id), y (or lat), x (or lon)")
+    parser.add_argument("edges_csv", help="columns: u, v, length [m], and speed_kph or travel_time [s]; optional oneway")
+    parser.add_argument("out_dir", help="directory to write; point ROAD_GRAPH_PATH at it")
+    parser.add_argument("--cell-deg", type=float, default=0.01, help="grid cell size for nearest-node lookups")
+    args = parser.parse_args()
+
+    try:
+        meta = build_road_graph(args.nodes_csv, args.edges_csv, args.out_dir, args.cell_deg)
+        print(f"✓ Road graph written to {args.out_dir}: {meta['nodes']} nodes, {meta['edges']} directed edges")
+    except Exception as e:
+        print(f"❌ Error building road graph: {e}")
@@ -1,20 +1,50 @@
-from db import Base, engine
-import psycopg2
-import os
+import argparse
+from db import Base, Delivery, engine, get_connection
 from dotenv import load_dotenv
+from services.history_cache import GENERATION_TRIGGER
+from services.partitions import DELIVERY_PARTITIONS_AHEAD, ensure_partitions, is_partitioned, partition_deliveries
 
 load_dotenv()
 
-def create_tables():
+# Changes create_all() cannot apply to a deliveries table that already exists
+MIGRATIONS = [
+    "ALTER TABLE deliveries ALTER COLUMN created_at SET DEFAULT now();",
+    "ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS start_lat double precision, "
+    "ADD COLUMN IF NOT EXISTS start_lng double precision, ADD COLUMN IF NOT EXISTS end_lat double precision, "
+    "ADD COLUMN IF NOT EXISTS end_lng double precision, ADD COLUMN IF NOT EXISTS travel_time_source varchar;",
+]
+
+def create_tables(partitioned=False, months_ahead=DELIVERY_PARTITIONS_AHEAD):
     try:
         # Create tables using SQLAlchemy
         Base.metadata.create_all(bind=engine)
         print("✓ Tables created successfully using SQLAlchemy")
-        
-        # Verify table exists
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        conn = psycopg2.connect(DATABASE_URL)
+
+        # Indexes added after the table was first created
+        for index in Delivery.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+        print(f"✓ Indexes on deliveries: {sorted(index.name for index in Delivery.__table__.indexes)}")
+
+        conn = get_connection()
         cur = conn.cursor()
+        for statement in MIGRATIONS:
+            cur.execute(statement)
+        conn.commit()
+        print(f"✓ Applied {len(MIGRATIONS)} migration(s)")
+
+        if partitioned and partition_deliveries(conn, months_ahead):
+            print("✓ deliveries converted to monthly range partitions on created_at")
+        if is_partitioned(cur):
+            created = ensure_partitions(conn, months_ahead=months_ahead)
+            print(f"✓ Partitions created: {created or 'none needed'}")
+
+        # After partitioning, so the trigger is on the table deliveries ends up as
+        for statement in GENERATION_TRIGGER:
+            cur.execute(statement)
+        conn.commit()
+        print("✓ Rewrites of deliveries bump data_generations")
+
+        # Verify table exists
         cur.execute("""
             SELECT table_name 
             FROM information_schema.tables 
@@ -28,4 +58,10 @@ def create_tables():
         print(f"❌ Error creating tables: {e}")
 
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Create the RouteMonk tables and indexes")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="partition deliveries by month on created_at (existing rows are moved over)")
+    parser.add_argument("--months-ahead", type=int, default=DELIVERY_PARTITIONS_AHEAD,
+                        help="monthly partitions to create ahead of the current one")
+    args = parser.parse_args()
+    create_tables(args.partitioned, args.months_ahead)
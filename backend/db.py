@@ -1,36 +1,279 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import psycopg2
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, MetaData
+from sqlalchemy import create_engine, event, func, BigInteger, Column, Index, Integer, String, Float, DateTime, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from services.metrics import DB_ACQUIRE
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DB_TIMEZONE = os.getenv("DB_TIMEZONE", "Asia/Kolkata")
+
+# Pool sizing / lifetime (shared by the SQLAlchemy engine and the raw psycopg2 pool)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))        # seconds to wait for a free connection
+DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "1800"))      # max age of a physical connection
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))  # ping connections idle longer than this
 
 # SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_MAX,
+    max_overflow=0,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=int(DB_POOL_RECYCLE),
+    pool_pre_ping=True,
+)
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _psycopg2_dsn(url):
+    """psycopg2 does not understand SQLAlchemy driver suffixes like postgresql+psycopg2://"""
+    if url and url.startswith("postgresql+"):
+        return "postgresql://" + url.split("://", 1)[1]
+    return url
+
+
+def _set_timezone(conn):
+    cur = conn.cursor()
+    cur.execute("SET timezone = %s;", (DB_TIMEZONE,))
+    cur.close()
+    conn.commit()
+
+
+@event.listens_for(engine, "connect")
+def _on_engine_connect(dbapi_conn, connection_record):
+    # Runs once per physical connection, not per checkout
+    _set_timezone(dbapi_conn)
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool for the raw SQL paths.
+
+    The session timezone is set once when a physical connection is opened.
+    Connections older than `recycle` seconds are replaced, and connections
+    that sat idle longer than `ping_after` seconds are checked with SELECT 1
+    before being handed out.
+    """
+
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, recycle=DB_POOL_RECYCLE, ping_after=DB_POOL_PING_AFTER):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created = {}    # id(conn) -> created_at
+        self._in_use = 0
+        self._waiting = 0
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "failed_pings": 0,
+            "max_in_use": 0,
+        }
+
+    def _open(self):
+        conn = psycopg2.connect(self.dsn)
+        _set_timezone(conn)
+        now = time.monotonic()
+        with self._lock:
+            self._created[id(conn)] = now
+            self._stats["connections_opened"] += 1
+        return conn, now
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created.pop(id(conn), None)
+            self._stats["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if conn.closed or now - created_at > self.recycle:
+            return False
+        if now - last_used > self.ping_after:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1;")
+                cur.close()
+                conn.rollback()
+            except Exception:
+                with self._lock:
+                    self._stats["failed_pings"] += 1
+                return False
+        return True
+
+    def warm(self):
+        """Open `minconn` connections up front so the first requests skip the handshake"""
+        while True:
+            with self._lock:
+                if len(self._created) >= self.minconn:
+                    return
+            conn, created_at = self._open()
+            with self._lock:
+                self._idle.append((conn, created_at, created_at))
+
+    def getconn(self):
+        with DB_ACQUIRE.time():
+            return self._getconn()
+
+    def _getconn(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waiting += 1
+                self._stats["waits"] += 1
+            acquired = self._slots.acquire(timeout=self.timeout)
+            with self._lock:
+                self._waiting -= 1
+                if not acquired:
+                    self._stats["timeouts"] += 1
+            if not acquired:
+                raise TimeoutError(f"Timed out after {self.timeout}s waiting for a database connection")
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    entry = self._idle.popleft() if self._idle else None
+                if entry is None:
+                    conn, _ = self._open()
+                elif self._healthy(*entry):
+                    conn = entry[0]
+                else:
+                    self._discard(entry[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], self._in_use)
+        return conn
+
+    def putconn(self, conn, broken=False):
+        try:
+            if not broken and not conn.closed:
+                try:
+                    # Never hand a connection with an open transaction to the next caller
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            with self._lock:
+                created_at = self._created.get(id(conn))
+            if broken or conn.closed or created_at is None:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, created_at, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "open": len(self._created),
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "saturation": self._in_use / self.maxconn if self.maxconn else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide pool, created lazily on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                url = os.getenv("DATABASE_URL")
+                if not url:
+                    raise ValueError("DATABASE_URL environment variable not set")
+                _pool = ConnectionPool(_psycopg2_dsn(url))
+    return _pool
+
+
+def pool_stats():
+    """Saturation metrics for the raw psycopg2 pool and the SQLAlchemy engine pool"""
+    return {
+        "psycopg2": _pool.stats() if _pool is not None else None,
+        "sqlalchemy": engine.pool.status(),
+    }
+
+
+def close_pool():
+    if _pool is not None:
+        _pool.closeall()
+
+
+def get_db():
+    """FastAPI dependency: yields a pooled connection and returns it afterwards"""
+    with get_pool().connection() as conn:
+        yield conn
+
+
 # Legacy psycopg2 connection for raw SQL (keep for compatibility)
 def get_connection():
     """Get database connection with IST timezone set"""
     DATABASE_URL = os.getenv("DATABASE_URL")
-    
+
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable not set")
-    
+
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        
+        conn = psycopg2.connect(_psycopg2_dsn(DATABASE_URL))
+
         # Set session timezone to IST for all operations
-        cur = conn.cursor()
-        cur.execute("SET timezone = 'Asia/Kolkata';")
-        conn.commit()
-        
+        _set_timezone(conn)
+
         return conn
     except Exception as e:
         print(f"Database connection error: {e}")
@@ -39,11 +282,65 @@ def get_connection():
 # Database model
 class Delivery(Base):
     __tablename__ = "deliveries"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     city = Column(String, index=True)
     perishability = Column(Integer)
     travel_time_sec = Column(Integer)
     weather = Column(String)
     final_score = Column(Float)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    # Leg endpoints and where travel_time_sec came from (live, cached, stale, estimate,
+    # local, fallback); services/travel_estimator.py learns from the live ones
+    start_lat = Column(Float)
+    start_lng = Column(Float)
+    end_lat = Column(Float)
+    end_lng = Column(Float)
+    travel_time_source = Column(String)
+    # server_default covers the raw SQL inserts, which never pass created_at
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+
+    __table_args__ = (
+        # Keyset pagination on (created_at, id), optionally narrowed by city
+        Index("ix_deliveries_created_at_id", "created_at", "id"),
+        Index("ix_deliveries_city_created_at_id", "city", "created_at", "id"),
+        # Rows arrive in created_at order, so a BRIN index (a few pages per
+        # million rows) is enough to skip everything outside a time range
+        Index("ix_deliveries_created_at_brin", "created_at", postgresql_using="brin"),
+    )
+
+
+class DeliveryRollup(Base):
+    """Per city, hour and weather totals of deliveries, kept up to date by services/rollups.py"""
+    __tablename__ = "delivery_rollups"
+
+    city = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # created_at truncated to the hour
+    weather = Column(String, primary_key=True)
+    deliveries = Column(BigInteger, nullable=False)
+    # Sums and counts of non-NULL values, so averages over any set of buckets stay exact
+    travel_time_sec_sum = Column(BigInteger, nullable=False)
+    travel_time_sec_count = Column(BigInteger, nullable=False)
+    final_score_sum = Column(Float, nullable=False)
+    final_score_count = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_delivery_rollups_bucket", "bucket"),
+    )
+
+
+class DataGeneration(Base):
+    """Bumped whenever stored rows are rewritten rather than added (see services/history_cache.py)"""
+    __tablename__ = "data_generations"
+
+    name = Column(String, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    bumped_at = Column(DateTime)
+
+
+class RollupState(Base):
+    """How far each rollup has read deliveries, by id"""
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)
+    refreshed_at = Column(DateTime)
@@ -1,8 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import history, optimize
+from routers import analytics, history, jobs, metrics, optimize, stats
+from db import close_pool, get_pool
+from services.delivery_writer import DELIVERY_WRITE_MODE, delivery_writer
+from services.http_client import close_client
+from services.jobs import job_manager
+from services.metrics import METRICS_ENABLED, MetricsMiddleware
+from services.partitions import partition_maintainer
+from services.prefetch import prefetcher
+from services.road_graph import get_road_graph
+from services.rollups import rollup_refresher
+from services.travel_estimator import estimator_refresher
+from services.travel_time import ROUTING_MODE
+import logging
 
-app = FastAPI(title="RouteMonk Backend")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the minimum number of pooled connections before serving traffic
+    try:
+        get_pool().warm()
+    except Exception as e:
+        logging.error(f"Database pool warm-up failed: {e}")
+    if ROUTING_MODE != "tomtom":
+        get_road_graph()  # mmap the offline graph up front instead of on the first request
+    if DELIVERY_WRITE_MODE == "behind":
+        await delivery_writer.start()
+    await partition_maintainer.start()
+    await rollup_refresher.start()
+    # Builds the travel time profiles from history, then keeps them fresh
+    await estimator_refresher.start()
+    await job_manager.start()
+    # Optional (PREFETCH_INTERVAL): keeps the hot corridors and start cells warm
+    await prefetcher.start()
+    yield
+    await prefetcher.stop()
+    # Running jobs go back to the queue for the next start (unless they already saved deliveries)
+    await job_manager.stop()
+    await estimator_refresher.stop()
+    await rollup_refresher.stop()
+    await partition_maintainer.stop()
+    # Drain queued deliveries while the pool is still open
+    await delivery_writer.stop()
+    await close_client()
+    close_pool()
+
+
+app = FastAPI(title="RouteMonk Backend", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,9 +57,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    # Added last so it wraps everything, CORS included
+    app.add_middleware(MetricsMiddleware)
+
 # Register routers
+app.include_router(analytics.router)
 app.include_router(history.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
 app.include_router(optimize.router)
+app.include_router(stats.router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,48 @@
+import argparse
+from dotenv import load_dotenv
+from db import get_connection
+from services.partitions import (
+    DELIVERY_ARCHIVE_DIR,
+    DELIVERY_PARTITIONS_AHEAD,
+    DELIVERY_RETENTION_MONTHS,
+    drop_expired_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+)
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Create upcoming monthly deliveries partitions and drop (optionally archive) expired ones; safe to run from cron"
+    )
+    parser.add_argument("--months-ahead", type=int, default=DELIVERY_PARTITIONS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=DELIVERY_RETENTION_MONTHS,
+                        help="whole months to keep (0 = keep everything)")
+    parser.add_argument("--archive-dir", default=DELIVERY_ARCHIVE_DIR, help="write each partition here as CSV before dropping it")
+    parser.add_argument("--dry-run", action="store_true", help="only list the partitions that would be dropped")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        if not is_partitioned(cur):
+            print("❌ deliveries is not partitioned; run create_tables.py --partitioned first")
+            raise SystemExit(1)
+        if not args.dry_run:
+            created = ensure_partitions(conn, months_ahead=args.months_ahead)
+            print(f"✓ Partitions created: {created or 'none needed'}")
+        dropped = drop_expired_partitions(conn, args.retention_months, args.archive_dir, dry_run=args.dry_run)
+        verb = "Would drop" if args.dry_run else "Dropped"
+        print(f"✓ {verb} {len(dropped)} partition(s): {[d['partition'] for d in dropped]}")
+        for d in dropped:
+            if d["archive"]:
+                print(f"  archived {d['partition']} to {d['archive']}")
+        print(f"✓ Partitions: {[name for _, name in list_partitions(cur)]}")
+        cur.close()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
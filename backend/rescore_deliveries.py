@@ -0,0 +1,42 @@
+import argparse
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from db import get_connection
+from services.rescore import rescore
+from services.rollups import refold_rollups
+from services.scoring import get_model
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute final_score of stored deliveries after a cost model change")
+    parser.add_argument("--model", default=None, help="cost model name (default: SCORING_MODEL)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only rows with created_at >= since")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only rows with created_at < until")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--dry-run", action="store_true", help="report how scores would change without writing")
+    parser.add_argument("--no-rollups", action="store_true", help="skip refolding the rescored range of the /analytics rollups")
+    args = parser.parse_args()
+
+    model = get_model(args.model)
+    conn = get_connection()
+    try:
+        started = time.perf_counter()
+        stats = rescore(conn, model, args.batch_size, args.since, args.until, args.dry_run)
+        elapsed = time.perf_counter() - started
+        verb = "Would change" if args.dry_run else "Changed"
+        print(f"✓ Scored {stats['rows']} deliveries with {model.name} in {elapsed:.1f}s "
+              f"({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)")
+        print(f"✓ {verb} {stats['changed']} scores (mean change {stats['mean_change']:.2f}, max {stats['max_change']:.2f})")
+        if stats["changed"] and not args.dry_run and not args.no_rollups:
+            result = refold_rollups(conn, args.since, args.until)
+            print(f"✓ Refolded {result['buckets']} rollup buckets through delivery id {result['last_id']}")
+    except Exception as e:
+        print(f"❌ Rescoring failed: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import time
+from dotenv import load_dotenv
+from db import get_connection
+from services.rollups import ROLLUP_BATCH_SIZE, rebuild_rollups, refresh_rollups
+
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or catch up the hourly delivery rollups used by /analytics")
+    parser.add_argument("--rebuild", action="store_true", help="drop all buckets and re-read the whole deliveries table; loses the buckets of partitions already dropped by retention")
+    parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE, help="delivery ids per transaction")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        started = time.perf_counter()
+        if args.rebuild:
+            result = rebuild_rollups(conn, args.batch_size)
+        else:
+            result = refresh_rollups(conn, args.batch_size)
+        print(f"✓ Folded {result['rows']} deliveries into delivery_rollups "
+              f"(through id {result['last_id']}) in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"❌ Rollup failed: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
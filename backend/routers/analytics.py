@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from db import get_db
+from services.rollups import query_rollups, refresh_rollups, rollup_status
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+ANALYTICS_BUCKETS_MAX = 5000
+
+@router.get("/")
+def get_analytics(
+    granularity: Literal["hour", "day"] = "hour",
+    city: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="bucket >= since"),
+    until: Optional[datetime] = Query(None, description="bucket < until"),
+    limit: int = Query(168, ge=1, le=ANALYTICS_BUCKETS_MAX, description="city/bucket pairs, newest first"),
+    refresh: bool = Query(False, description="fold in deliveries added since the last background refresh first"),
+    conn=Depends(get_db),
+):
+    """Per city and hour (or day): deliveries, average travel time, average score and weather mix.
+
+    Served from the delivery_rollups table, which is updated incrementally
+    from deliveries, so the cost depends on the number of buckets returned.
+    """
+    if refresh:
+        refresh_rollups(conn)
+    cur = conn.cursor()
+    buckets = query_rollups(cur, granularity, city, since, until, limit)
+    status = rollup_status(cur)
+    cur.close()
+    return {"granularity": granularity, "buckets": buckets, "rollup": status}
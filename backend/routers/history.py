@@ -1,13 +1,264 @@
-from fastapi import APIRouter
-from db import get_connection
+import base64
+import csv
+import io
+import json
+import os
+import zlib
+from dataclasses import astuple, dataclass
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from db import get_pool
+from services.history_cache import history_cache, last_modified, modified_at, read_version
 
 router = APIRouter(prefix="/history", tags=["History"])
 
+HISTORY_COLUMNS = ("id", "city", "perishability", "travel_time_sec", "weather", "final_score", "created_at")
+HISTORY_PAGE_MAX = 500
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+@dataclass
+class HistoryFilters:
+    city: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    min_perishability: Optional[int] = None
+    max_perishability: Optional[int] = None
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+
+def history_filters(
+    city: Optional[str] = None,
+    since: Optional[datetime] = Query(None, description="created_at >= since"),
+    until: Optional[datetime] = Query(None, description="created_at < until"),
+    min_perishability: Optional[int] = None,
+    max_perishability: Optional[int] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+):
+    """Filters shared by every endpoint that reads deliveries"""
+    return HistoryFilters(city, since, until, min_perishability, max_perishability, min_score, max_score)
+
+def filter_sql(filters: HistoryFilters):
+    """WHERE clauses and parameters for the given filters"""
+    clauses, params = [], []
+    for column, op, value in (
+        ("city", "=", filters.city),
+        ("created_at", ">=", filters.since),
+        ("created_at", "<", filters.until),
+        ("perishability", ">=", filters.min_perishability),
+        ("perishability", "<=", filters.max_perishability),
+        ("final_score", ">=", filters.min_score),
+        ("final_score", "<=", filters.max_score),
+    ):
+        if value is not None:
+            clauses.append(f"{column} {op} %s")
+            params.append(value)
+    return clauses, params
+
+def parse_fields(fields: Optional[str]):
+    if not fields:
+        return list(HISTORY_COLUMNS)
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in HISTORY_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {unknown}. Allowed: {list(HISTORY_COLUMNS)}")
+    return selected
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def fetch_history_page(cur, filters: HistoryFilters, fields, limit, cursor=None, table="deliveries"):
+    """One page of deliveries, newest first, by keyset on (created_at, id).
+
+    Rows are read in two phases so both stay index scans: rows with a
+    created_at in (created_at, id) order, then legacy rows whose created_at
+    is NULL in id order. Returns (rows as dicts, next cursor or None).
+    """
+    clauses, params = filter_sql(filters)
+    select = ", ".join(dict.fromkeys(["created_at", "id", *fields]))
+    after_created_at, after_id = cursor if cursor else (None, None)
+    rows = []
+
+    if cursor is None or after_created_at is not None:
+        where = list(clauses)
+        where_params = list(params)
+        if cursor is not None:
+            where.append("(created_at, id) < (%s, %s)")
+            where_params += [after_created_at, after_id]
+        else:
+            where.append("created_at IS NOT NULL")
+        cur.execute(
+            f"SELECT {select} FROM {table} WHERE {' AND '.join(where)} "
+            f"ORDER BY created_at DESC, id DESC LIMIT %s",
+            (*where_params, limit + 1),
+        )
+        rows = cur.fetchall()
+
+    # Undated legacy rows can never match a date range
+    if len(rows) <= limit and filters.since is None and filters.until is None:
+        where = list(clauses) + ["created_at IS NULL"]
+        where_params = list(params)
+        if after_created_at is None and after_id is not None:
+            where.append("id < %s")
+            where_params.append(after_id)
+        cur.execute(
+            f"SELECT {select} FROM {table} WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT %s",
+            (*where_params, limit + 1 - len(rows)),
+        )
+        rows += cur.fetchall()
+
+    names = [d[0] for d in cur.description] if rows else []
+    page = [dict(zip(names, row)) for row in rows[:limit]]
+    next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"]) if len(rows) > limit else None
+    return [{f: row[f] for f in fields} for row in page], next_cursor
+
+def _read_version():
+    with get_pool().connection() as conn:
+        return read_version(conn)
+
+def _etag_matches(header, etag):
+    # Weak comparison (RFC 9110 8.8.3.2): the W/ prefix is ignored
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def _not_modified(request: Request, etag, created_at):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is sent
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or created_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+    return modified_at(created_at) <= since
+
 @router.get("/")
-def get_history():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM deliveries ORDER BY created_at DESC;")
-    rows = cur.fetchall()
-    conn.close()
-    return {"history": rows}
+def get_history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description=f"comma-separated subset of {', '.join(HISTORY_COLUMNS)}"),
+    filters: HistoryFilters = Depends(history_filters),
+):
+    """Deliveries newest first, one keyset page at a time.
+
+    The ETag and Last-Modified come from the deliveries version (max id,
+    last change and the generation that rescores, deletes and dropped
+    partitions bump), not from the payload, so a poll that sends them back
+    gets 304 Not Modified until something is inserted or rewritten.
+    Rendered pages are kept per process until then (services/history_cache.py).
+    """
+    selected = parse_fields(fields)
+    after = decode_cursor(cursor) if cursor else None
+    version = history_cache.version(_read_version)
+    key = repr((limit, after, tuple(selected), astuple(filters)))
+    etag = f'W/"{version[0] or 0}-{version[2]}-{zlib.crc32(key.encode()):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if version[1] is not None:
+        headers["Last-Modified"] = last_modified(version[1])
+    if _not_modified(request, etag, version[1]):
+        history_cache.not_modified()
+        return Response(status_code=304, headers=headers)
+
+    body = history_cache.get(key, version)
+    if body is None:
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
+            rows, next_cursor = fetch_history_page(cur, filters, selected, limit, after)
+            cur.close()
+        # Rendered as JSONResponse would, once per version instead of once per poll
+        body = json.dumps(
+            jsonable_encoder({"history": rows, "next_cursor": next_cursor}), ensure_ascii=False, separators=(",", ":"),
+        ).encode("utf-8")
+        history_cache.set(key, version, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def iter_export(conn, filters: HistoryFilters, fields, fmt="ndjson", fetch_size=EXPORT_FETCH_SIZE, table="deliveries"):
+    """Yield the filtered rows as NDJSON or CSV text chunks, one chunk per fetched batch.
+
+    Uses a server-side (named) cursor, so only `fetch_size` rows are held in
+    memory at a time no matter how large the table is.
+    """
+    clauses, params = filter_sql(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = conn.cursor(name="history_export")
+    cur.itersize = fetch_size
+    try:
+        cur.execute(f"SELECT {', '.join(fields)} FROM {table} {where} ORDER BY id", params)
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            if fmt == "csv":
+                writer.writerows(rows)
+                chunk = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                chunk = "".join(json.dumps(dict(zip(fields, row)), default=_json_default) + "\n" for row in rows)
+            yield chunk
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        cur.close()
+        conn.rollback()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _stream_export(filters, fields, fmt, fetch_size, gzip):
+    # The connection is checked out when streaming starts and returned when it
+    # ends, including when the client disconnects halfway
+    with get_pool().connection() as conn:
+        chunks = iter_export(conn, filters, fields, fmt, fetch_size)
+        if gzip:
+            yield from _gzip_chunks(chunks)
+        else:
+            for chunk in chunks:
+                yield chunk.encode()
+
+@router.get("/export")
+def export_history(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    fetch_size: int = Query(EXPORT_FETCH_SIZE, ge=100, le=50000),
+    fields: Optional[str] = Query(None, description=f"comma-separated subset of {', '.join(HISTORY_COLUMNS)}"),
+    filters: HistoryFilters = Depends(history_filters),
+):
+    """Stream every matching delivery (same filters as /history/) with constant memory"""
+    selected = parse_fields(fields)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="deliveries.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_stream_export(filters, selected, format, fetch_size, gzip), media_type=media_type, headers=headers)
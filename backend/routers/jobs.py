@@ -0,0 +1,121 @@
+import os
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from routers.optimize import BATCH_CONCURRENCY, MultiStopRequest, OptimizeRequest
+from services.jobs import JOB_POLL_INTERVAL, JOB_RESULT_TTL, JobQueueFull, job_manager
+from services.scoring import get_model
+
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "100000"))
+JOB_RESULT_PAGE_MAX = 10000
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+class BatchJobRequest(BaseModel):
+    items: List[OptimizeRequest] = Field(..., min_length=1, max_length=JOB_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1, le=100)
+
+class RescoreJobRequest(BaseModel):
+    model: Optional[str] = None  # cost model name (default: SCORING_MODEL)
+    since: Optional[datetime] = None  # only rows with created_at >= since
+    until: Optional[datetime] = None  # only rows with created_at < until
+    batch_size: int = Field(50000, ge=100, le=1000000)
+    dry_run: bool = False
+    rebuild_rollups: bool = True  # refold the rescored range of the /analytics rollups
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+def _view(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": _timestamp(job["created_at"]),
+        "started_at": _timestamp(job["started_at"]),
+        "finished_at": _timestamp(job["finished_at"]),
+        "expires_at": _timestamp(job["finished_at"] + JOB_RESULT_TTL if job["finished_at"] else None),
+        "links": {"status": f"/jobs/{job['id']}", "result": f"/jobs/{job['id']}/result"},
+    }
+
+async def _submit(kind, payload):
+    try:
+        return _view(await job_manager.submit(kind, payload))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}", headers={"Retry-After": "30"})
+
+def _get(job_id):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@router.post("/batch", status_code=202)
+async def submit_batch_job(request: BatchJobRequest):
+    """Queue a /optimize/batch-style job for up to JOB_MAX_ITEMS shipments; poll /jobs/{id} for progress"""
+    # Off the event loop: dumping up to JOB_MAX_ITEMS shipments takes a while
+    payload = await run_in_threadpool(request.model_dump, mode="json", include={"items"})
+    payload["concurrency"] = request.concurrency or BATCH_CONCURRENCY
+    return await _submit("batch", payload)
+
+@router.post("/multi", status_code=202)
+async def submit_multi_job(request: MultiStopRequest):
+    """Queue a /optimize/multi route; sequencing runs in the job process pool"""
+    return await _submit("multi", request.model_dump(mode="json"))
+
+@router.post("/rescore", status_code=202)
+async def submit_rescore_job(request: RescoreJobRequest):
+    """Queue a rescoring of stored deliveries (see rescore_deliveries.py)"""
+    try:
+        get_model(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _submit("rescore", request.model_dump(mode="json"))
+
+@router.get("/")
+def list_jobs(
+    status: Optional[Literal["queued", "running", "succeeded", "failed", "cancelled"]] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Recent jobs, newest first"""
+    return {"jobs": [_view(job) for job in job_manager.store.list(status, limit)]}
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    """Status and progress ({stage, done, total}) of a job"""
+    return _view(_get(job_id))
+
+@router.get("/{job_id}/result")
+def get_job_result(
+    job_id: str,
+    response: Response,
+    offset: int = Query(0, ge=0, description="first entry of \"results\" to return"),
+    limit: int = Query(1000, ge=1, le=JOB_RESULT_PAGE_MAX),
+):
+    """The result of a finished job; batch "results" are paged with offset/limit.
+
+    Answers 202 with the job status while it is queued or running.
+    """
+    job = _get(job_id)
+    if job["status"] in ("queued", "running"):
+        response.status_code = 202
+        response.headers["Retry-After"] = str(max(1, round(JOB_POLL_INTERVAL)))
+        return _view(job)
+    result = job_manager.store.result(job_id, offset, limit)
+    body = {**_view(job), "result": result}
+    if result is not None and "results_total" in result:
+        next_offset = offset + limit
+        body["next_offset"] = next_offset if next_offset < result["results_total"] else None
+    return body
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a job: queued jobs at once, running ones at their worker's next heartbeat"""
+    await run_in_threadpool(_get, job_id)
+    return _view(await job_manager.cancel(job_id))
@@ -0,0 +1,76 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from db import pool_stats
+from services.delivery_writer import delivery_writer
+from services.metrics import registry
+from services.rate_limit import openweather_limiter, tomtom_limiter
+from services.travel_time import tomtom_breaker, travel_time_cache, travel_time_flights
+from services.weather import openweather_breaker, weather_flights
+from services.weather_cache import weather_cache
+
+router = APIRouter(tags=["Stats"])
+
+STATES = ("closed", "half_open", "open")
+
+
+@registry.collector
+def collect_pool():
+    stats = pool_stats()["psycopg2"]
+    if stats is None:
+        return []
+    return [
+        ("routemonk_db_pool_connections", "gauge", "psycopg2 pool connections by state",
+         {(("state", state),): stats[state] for state in ("open", "in_use", "idle", "waiting")}),
+        ("routemonk_db_pool_events_total", "counter", "psycopg2 pool checkouts, waits, timeouts and reconnects",
+         {(("event", event),): stats[event] for event in
+          ("checkouts", "waits", "timeouts", "failed_pings", "connections_opened", "connections_closed")}),
+    ]
+
+
+@registry.collector
+def collect_caches():
+    caches = {"travel_time": travel_time_cache.stats()}
+    if weather_cache is not None:
+        caches["weather"] = weather_cache.stats()
+    return [
+        ("routemonk_cache_hits_total", "counter", "Cache hits", {(("cache", n),): s["hits"] for n, s in caches.items()}),
+        ("routemonk_cache_misses_total", "counter", "Cache misses", {(("cache", n),): s["misses"] for n, s in caches.items()}),
+        ("routemonk_cache_entries", "gauge", "Entries held", {(("cache", n),): s.get("size") for n, s in caches.items()}),
+    ]
+
+
+@registry.collector
+def collect_upstreams():
+    breakers = {"tomtom": tomtom_breaker.stats(), "openweather": openweather_breaker.stats()}
+    limiters = {name: l.stats() for name, l in (("tomtom", tomtom_limiter), ("openweather", openweather_limiter)) if l}
+    flights = {"travel_time": travel_time_flights.stats(), "weather": weather_flights.stats()}
+    return [
+        ("routemonk_upstream_circuit_state", "gauge", "1 for the current circuit state of each upstream",
+         {(("upstream", n), ("state", state)): int(s["state"] == state) for n, s in breakers.items() for state in STATES}),
+        ("routemonk_upstream_timeout_seconds", "gauge", "Current adaptive upstream timeout",
+         {(("upstream", n),): s["timeout_sec"] for n, s in breakers.items()}),
+        ("routemonk_upstream_rejected_total", "counter", "Calls rejected by an open circuit",
+         {(("upstream", n),): s["rejected"] for n, s in breakers.items()}),
+        ("routemonk_rate_limit_queued", "gauge", "Calls waiting for a rate limit token",
+         {(("upstream", n), ("lane", lane)): q for n, s in limiters.items() for lane, q in s["queued"].items()}),
+        ("routemonk_rate_limit_used_today", "gauge", "Upstream calls counted against today's quota",
+         {(("upstream", n),): s.get("used_today") for n, s in limiters.items()}),
+        ("routemonk_singleflight_coalesced_total", "counter", "Lookups that joined an identical in-flight call",
+         {(("kind", n),): s["coalesced"] for n, s in flights.items()}),
+    ]
+
+
+@registry.collector
+def collect_writer():
+    stats = delivery_writer.stats()
+    return [
+        ("routemonk_delivery_queue_depth", "gauge", "Deliveries waiting in the write-behind queue", {(): stats["queued"]}),
+        ("routemonk_delivery_rows_total", "counter", "Write-behind rows by outcome",
+         {(("outcome", o),): stats[o] for o in ("flushed", "spilled", "replayed", "rejected")}),
+    ]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of request, upstream, database and cache metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
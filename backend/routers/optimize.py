@@ -1,10 +1,30 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from services.travel_time import get_travel_time
-from services.weather import get_weather_by_coordinates  # Use the new coordinate-based function
-from db import get_connection
+import json
+import os
+import time
+from contextlib import aclosing
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from services.corridor import CORRIDOR_MAX_SAMPLES, get_corridor_weather_async
+from services.delivery_writer import delivery_row, record_deliveries
+from services.geo import geohash, haversine_m, parse_point
+from services.metrics import SCORING
+from services.planning import iter_scored_items, plan_route, score_items
+from services.rate_limit import upstream_priority
+from services.scoring import get_model, score as score_leg, weather_severity
+from services.travel_time import get_travel_time_result_async
+from services.weather import get_weather_by_coordinates_result_async  # Use the new coordinate-based function
+from services.weather_cache import WEATHER_CACHE_PRECISION
+from db import get_pool
+import asyncio
 import logging
 
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))  # upstream calls in flight per batch
+MULTI_MAX_STOPS = int(os.getenv("MULTI_MAX_STOPS", "1000"))
+MULTI_TIME_BUDGET_MS = int(os.getenv("MULTI_TIME_BUDGET_MS", "800"))
+
 router = APIRouter(prefix="/optimize", tags=["Optimization"])
 
 # Define the request model for JSON input
@@ -12,9 +32,44 @@ class OptimizeRequest(BaseModel):
     perishability: int
     start: str  # "lat,lng" format
     end: str    # "lat,lng" format
+    bypass_cache: bool = False  # force fresh upstream lookups for this request
+    wait_for_commit: Optional[bool] = None  # write-behind mode: wait until the row is committed or spilled
+    # Sample weather at this many points along the route and score by the worst of them
+    weather_samples: Optional[int] = Field(None, ge=2, le=CORRIDOR_MAX_SAMPLES)
+
+class BatchOptimizeRequest(BaseModel):
+    items: List[OptimizeRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1, le=100)
+    wait_for_commit: Optional[bool] = None
+
+class Drop(BaseModel):
+    location: str  # "lat,lng" format
+    perishability: int
+    id: Optional[str] = None
+    window_start_sec: Optional[int] = None  # earliest service time, seconds after departure
+    window_end_sec: Optional[int] = None    # latest service time, seconds after departure
+
+class MultiStopRequest(BaseModel):
+    depot: str  # "lat,lng" format
+    drops: List[Drop] = Field(..., min_length=1, max_length=MULTI_MAX_STOPS)
+    time_budget_ms: int = Field(MULTI_TIME_BUDGET_MS, ge=10, le=30000)
+
+def _leg_points(start: str, end: str):
+    try:
+        return parse_point(start), parse_point(end)
+    except ValueError:
+        return None, None
+
+def _leg_distance_m(start: str, end: str):
+    start_point, end_point = _leg_points(start, end)
+    return haversine_m(*start_point, *end_point) if start_point else None
+
+async def _invalid_coordinates_weather(start: str, error: Exception):
+    logging.error(f"Invalid coordinate format: {start} - {error}")
+    return {"weather": "unknown", "location": "invalid coordinates", "temperature": None}, "fallback"
 
 @router.post("/")
-def optimize_route(request: OptimizeRequest):
+async def optimize_route(request: OptimizeRequest, pool=Depends(get_pool)):
     # Extract data from the request model
     perishability = request.perishability
     start = request.start
@@ -25,44 +80,68 @@ def optimize_route(request: OptimizeRequest):
     score = None
     
     try:
-        # Travel time (TomTom API)
-        travel_time = get_travel_time(start, end)
-        logging.info(f"Travel time result: {travel_time} (type: {type(travel_time)})")
-
         # Get weather from START coordinates (you could also use END or midpoint)
         try:
             start_lat, start_lng = map(float, start.split(','))
-            weather_info = get_weather_by_coordinates(start_lat, start_lng)
-            logging.info(f"Weather result: {weather_info}")
+            weather_call = get_weather_by_coordinates_result_async(start_lat, start_lng, use_cache=not request.bypass_cache)
         except ValueError as coord_error:
-            logging.error(f"Invalid coordinate format: {start} - {coord_error}")
-            weather_info = {"weather": "unknown", "location": "invalid coordinates", "temperature": None}
+            weather_call = _invalid_coordinates_weather(start, coord_error)
+
+        # Travel time (TomTom API) and weather (OpenWeather API) run concurrently,
+        # so the request waits for the slower of the two instead of their sum
+        # Each value comes back with its source: live, cached, stale, local or fallback
+        (travel_time, travel_source), (weather_info, weather_source) = await asyncio.gather(
+            get_travel_time_result_async(start, end, use_cache=not request.bypass_cache),
+            weather_call,
+        )
+        logging.info(f"Travel time result: {travel_time} (type: {type(travel_time)})")
+        logging.info(f"Weather result: {weather_info}")
 
         # Extract weather and location
         weather = weather_info.get("weather", "unknown")
         location = weather_info.get("location", "Unknown Location")
         temperature = weather_info.get("temperature")
 
-        # Simple scoring
-        score = perishability * (travel_time / 60)  # demo scoring
+        corridor = None
+        if request.weather_samples and weather_source != "fallback":
+            # The start point's weather is already known; the rest of the corridor is one concurrent round
+            shape, samples = await get_corridor_weather_async(
+                start, end, request.weather_samples,
+                known={geohash(start_lat, start_lng, WEATHER_CACHE_PRECISION): (weather_info, weather_source)},
+                use_cache=not request.bypass_cache,
+            )
+            worst = max(samples, key=lambda sample: sample["severity"])
+            corridor = {
+                "geometry": shape,
+                "samples": samples,
+                "worst_weather": worst["weather"],
+                "weather_factor": 1 + get_model().weather_weight * worst["severity"],
+            }
+
+        # Score with the configured cost model: weather severity (the worst on the corridor
+        # if sampled), temperature at the start and straight-line distance of the leg
+        with SCORING.labels("single").time():
+            score = score_leg(
+                perishability,
+                travel_time,
+                worst["severity"] if corridor else weather_severity(weather),
+                temperature,
+                _leg_distance_m(start, end),
+            )
         logging.info(f"Calculated score: {score}")
 
         # Save to DB with better error handling
+        # The connection is only checked out for the insert itself, not the upstream calls
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            
-            # Log the data being inserted
             logging.info(f"Inserting: location={location}, perishability={perishability}, travel_time={travel_time}, weather={weather}, score={score}")
-            
-            cur.execute(
-                "INSERT INTO deliveries (city, perishability, travel_time_sec, weather, final_score) VALUES (%s,%s,%s,%s,%s)",
-                (location, perishability, travel_time, weather, score)
+            db_status = await record_deliveries(
+                pool,
+                [delivery_row(location, perishability, travel_time, weather, score,
+                              *_leg_points(start, end), travel_source)],
+                wait=request.wait_for_commit,
             )
-            conn.commit()
-            conn.close()
             
-            logging.info("✅ Database insert successful")
+            logging.info(f"✅ Database insert {db_status}")
             
         except Exception as db_error:
             logging.error(f"❌ Database insert failed: {db_error}")
@@ -84,7 +163,11 @@ def optimize_route(request: OptimizeRequest):
             "coordinates": {
                 "start": start,
                 "end": end
-            }
+            },
+            "sources": {"travel_time": travel_source, "weather": weather_source},
+            "score_model": get_model().name,
+            **({"corridor": corridor} if corridor else {}),
+            "db_status": db_status
         }
         
     except Exception as e:
@@ -96,4 +179,94 @@ def optimize_route(request: OptimizeRequest):
             "weather": weather_info.get("weather") if weather_info else "unknown",
             "temperature": weather_info.get("temperature") if weather_info else None,
             "final_score": score
-        }
\ No newline at end of file
+        }
+
+@router.post("/batch")
+async def optimize_batch(request: BatchOptimizeRequest, pool=Depends(get_pool)):
+    """Score many shipments in one call.
+
+    Identical origin/destination pairs and start cells are looked up once,
+    upstream calls run with bounded concurrency, scoring is a single
+    vectorized pass and all rows go to the database in one INSERT. Items
+    that fail carry their own "error" instead of failing the batch.
+    """
+    # Upstream calls for batches queue behind interactive /optimize calls
+    upstream_priority.set("batch")
+    results, rows, stats = await score_items(request.items, request.concurrency or BATCH_CONCURRENCY)
+    response = {"results": results, "stats": stats}
+
+    if rows:
+        try:
+            response["db_status"] = await record_deliveries(pool, rows, wait=request.wait_for_commit)
+            logging.info(f"✅ Batch insert of {len(rows)} deliveries {response['db_status']}")
+        except Exception as db_error:
+            logging.error(f"❌ Batch database insert failed: {db_error}")
+            response["error"] = f"Database insert failed: {str(db_error)}"
+
+    return response
+
+
+def _stream_event(sse, event, data):
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+@router.post("/stream")
+async def optimize_stream(
+    request: BatchOptimizeRequest,
+    format: Optional[Literal["ndjson", "sse"]] = None,
+    accept: Optional[str] = Header(None),
+    pool=Depends(get_pool),
+):
+    """Score many shipments and stream each result as soon as it is ready.
+
+    Emits a "start" event, one "result" event per item (in completion
+    order, with its "index", travel time, weather, score and db_status) and
+    a final "done" event, as NDJSON lines or as Server-Sent Events
+    (?format=sse or Accept: text/event-stream). Closing the connection
+    cancels the lookups still in flight.
+    """
+    sse = format == "sse" or (format is None and "text/event-stream" in (accept or ""))
+    concurrency = request.concurrency or BATCH_CONCURRENCY
+
+    async def events():
+        started = time.perf_counter()
+        counts = {"items": len(request.items), "errors": 0, "saved": 0}
+        yield _stream_event(sse, "start", {"items": len(request.items), "score_model": get_model().name})
+        async with aclosing(iter_scored_items(request.items, concurrency)) as results:
+            async for result, row in results:
+                if row is None:
+                    counts["errors"] += 1
+                else:
+                    try:
+                        result["db_status"] = await record_deliveries(pool, [row], wait=request.wait_for_commit)
+                        counts["saved"] += 1
+                    except Exception as db_error:
+                        logging.error(f"❌ Database insert failed: {db_error}")
+                        result["db_status"] = "failed"
+                        result["error"] = f"Database insert failed: {str(db_error)}"
+                result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                yield _stream_event(sse, "result", result)
+        yield _stream_event(sse, "done", {**counts, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/multi")
+async def optimize_multi(request: MultiStopRequest):
+    """Order a depot plus N drops into one route.
+
+    Travel times come from one chunked TomTom matrix request; sequencing
+    favours perishable drops and respects time windows, within the
+    requested time budget.
+    """
+    try:
+        # Sequencing is CPU-bound, so it runs in a thread, off the event loop
+        return await plan_route(request.depot, request.drops, request.time_budget_ms)
+    except ValueError as coord_error:
+        return {"error": f"Invalid coordinate format: {coord_error}"}
@@ -0,0 +1,72 @@
+from fastapi import APIRouter
+from db import pool_stats
+from services.delivery_writer import delivery_writer
+from services.history_cache import history_cache
+from services.jobs import job_manager
+from services.partitions import partition_maintainer
+from services.prefetch import prefetcher
+from services.rate_limit import openweather_limiter, tomtom_limiter
+from services.rollups import rollup_refresher
+from services.travel_estimator import estimator_refresher
+from services.travel_time import tomtom_breaker, travel_time_cache, travel_time_flights
+from services.weather import openweather_breaker, weather_flights
+from services.weather_cache import weather_cache
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+@router.get("/db")
+def get_db_stats():
+    """Connection pool saturation (in use / max, waits, timeouts, recycled connections)"""
+    return pool_stats()
+
+@router.get("/cache")
+def get_cache_stats():
+    """Hit/miss/eviction counters for the upstream caches and the /history page cache"""
+    return {
+        "travel_time": travel_time_cache.stats(),
+        "weather": weather_cache.stats() if weather_cache is not None else None,
+        "history": history_cache.stats(),
+    }
+
+@router.get("/writer")
+def get_writer_stats():
+    """Write-behind queue depth, flush/spill counters"""
+    return delivery_writer.stats()
+
+@router.get("/partitions")
+def get_partition_stats():
+    """Background partition maintenance: partitions created and dropped, failures"""
+    return partition_maintainer.stats()
+
+@router.get("/rollups")
+def get_rollup_stats():
+    """Background rollup refreshes: count, rows folded in, failures"""
+    return rollup_refresher.stats()
+
+@router.get("/singleflight")
+def get_singleflight_stats():
+    """How many concurrent upstream lookups were coalesced, overall and for the hottest keys"""
+    return {"travel_time": travel_time_flights.stats(), "weather": weather_flights.stats()}
+
+@router.get("/upstreams")
+def get_upstream_stats():
+    """Circuit breaker state, adaptive timeout, rate limit queues and daily quota use per upstream"""
+    return {
+        "tomtom": {**tomtom_breaker.stats(), "rate_limit": tomtom_limiter.stats() if tomtom_limiter else None},
+        "openweather": {**openweather_breaker.stats(), "rate_limit": openweather_limiter.stats() if openweather_limiter else None},
+    }
+
+@router.get("/jobs")
+def get_job_stats():
+    """Background jobs: counts by status, jobs running in this worker and their progress"""
+    return job_manager.stats()
+
+@router.get("/estimator")
+def get_estimator_stats():
+    """Travel time estimator: rows and cell pairs in the profiles, lookups answered, rebuilds"""
+    return estimator_refresher.stats()
+
+@router.get("/prefetch")
+def get_prefetch_stats():
+    """Cache warm-ups: last run's lookups and upstream calls, and how many on-demand lookups warmed entries answered"""
+    return prefetcher.stats()
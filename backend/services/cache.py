@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded in-process cache with per-entry TTL and LRU eviction.
+
+    Entries expire `ttl` seconds after they were stored; once `maxsize`
+    entries are held, the least recently used one is evicted. All
+    operations are O(1) and thread-safe.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=10000, ttl=300.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def ttl_left(self, key):
+        """Seconds until `key` expires, or None if it is not cached; not counted as a lookup"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            return None
+        left = entry[0] - self._clock()
+        return left if left > 0 else None
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class WarmKeys:
+    """Cache keys filled ahead of demand (services/prefetch.py), and how many later lookups they answered.
+
+    `record` is called for every on-demand lookup; a cache hit on a key that
+    was warmed counts as a warm hit, and a warmed key counts as used once it
+    has answered at least one lookup.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self._keys = TTLCache(maxsize=maxsize, ttl=ttl)  # key -> [hits]
+        self._lock = threading.Lock()
+        self.warmed = 0
+        self.used = 0
+        self.lookups = 0
+        self.cache_hits = 0
+        self.warm_hits = 0
+
+    def add(self, key):
+        if key is None:
+            return
+        self._keys.set(key, [0])
+        with self._lock:
+            self.warmed += 1
+
+    def record(self, key, hit):
+        """Count one on-demand lookup of `key`; `hit` when the cache answered it"""
+        entry = self._keys.get(key) if hit and key is not None else None
+        with self._lock:
+            self.lookups += 1
+            self.cache_hits += hit
+            if entry is not None:
+                self.warm_hits += 1
+                self.used += entry[0] == 0
+                entry[0] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "warmed": self.warmed,
+                "warmed_and_used": self.used,
+                "lookups": self.lookups,
+                "cache_hits": self.cache_hits,
+                "warm_hits": self.warm_hits,
+                # Share of all lookups, and of cache hits, answered by a prefetched entry
+                "warm_hit_ratio": self.warm_hits / self.lookups if self.lookups else 0.0,
+                "warm_share_of_hits": self.warm_hits / self.cache_hits if self.cache_hits else 0.0,
+                "used_ratio": self.used / self.warmed if self.warmed else 0.0,
+            }
@@ -0,0 +1,52 @@
+import asyncio
+import os
+from dotenv import load_dotenv
+from services.geo import geohash, parse_point, sample_polyline
+from services.scoring import weather_severity
+from services.travel_time import get_route_geometry
+from services.weather import get_weather_by_coordinates_result_async
+from services.weather_cache import WEATHER_CACHE_PRECISION
+
+load_dotenv()
+
+CORRIDOR_MAX_SAMPLES = int(os.getenv("CORRIDOR_MAX_SAMPLES", "20"))
+
+
+async def get_corridor_weather_async(start: str, end: str, samples: int, known=None, use_cache: bool = True):
+    """Weather at `samples` points spaced evenly by distance along the route from start to end.
+
+    Uses the geometry cached by the last TomTom travel time lookup for the
+    pair (so look the travel time up first) and the straight line when
+    there is none. Points in the same weather cell share one lookup, and all
+    lookups run concurrently. `known` maps geohash cells to (weather info,
+    source) results the caller already has, e.g. for the start point.
+
+    Returns (geometry, samples): geometry is "route" or "straight_line",
+    and each sample carries its distance along the route, weather and source.
+    """
+    geometry = get_route_geometry(start, end)
+    shape = "route" if geometry else "straight_line"
+    points = sample_polyline(geometry or [parse_point(start), parse_point(end)], samples)
+
+    cells = {}
+    for lat, lng, _ in points:
+        cells.setdefault(geohash(lat, lng, WEATHER_CACHE_PRECISION), (lat, lng))
+    results = dict(known or {})
+    pending = [cell for cell in cells if cell not in results]
+    fetched = await asyncio.gather(
+        *(get_weather_by_coordinates_result_async(*cells[cell], use_cache=use_cache) for cell in pending)
+    )
+    results.update(zip(pending, fetched))
+
+    corridor = []
+    for lat, lng, distance in points:
+        info, source = results[geohash(lat, lng, WEATHER_CACHE_PRECISION)]
+        corridor.append({
+            "distance_m": round(distance),
+            "location": f"{lat:.5f},{lng:.5f}",
+            "weather": info.get("weather", "unknown"),
+            "temperature": info.get("temperature"),
+            "severity": weather_severity(info.get("weather")),
+            "source": source,
+        })
+    return shape, corridor
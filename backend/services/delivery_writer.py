@@ -0,0 +1,290 @@
+import asyncio
+import glob
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+import logging
+from psycopg2.extras import execute_values
+from starlette.concurrency import run_in_threadpool
+from db import DB_TIMEZONE, get_pool
+from services.history_cache import history_cache
+from services.metrics import DB_INSERT, rows_bucket
+
+load_dotenv()
+
+# "sync": every request inserts and commits before responding (default).
+# "behind": rows are queued in memory and flushed in batches by a background task.
+DELIVERY_WRITE_MODE = os.getenv("DELIVERY_WRITE_MODE", "sync")
+DELIVERY_QUEUE_MAX = int(os.getenv("DELIVERY_QUEUE_MAX", "10000"))
+DELIVERY_FLUSH_SIZE = int(os.getenv("DELIVERY_FLUSH_SIZE", "500"))
+DELIVERY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_FLUSH_INTERVAL", "0.5"))  # seconds
+DELIVERY_ENQUEUE_TIMEOUT = float(os.getenv("DELIVERY_ENQUEUE_TIMEOUT", "1"))  # backpressure wait before failing
+DELIVERY_SPILL_PATH = os.getenv("DELIVERY_SPILL_PATH", os.path.join(tempfile.gettempdir(), "routemonk_deliveries_spill.ndjson"))
+
+DELIVERY_COLUMNS = (
+    "city", "perishability", "travel_time_sec", "weather", "final_score",
+    "start_lat", "start_lng", "end_lat", "end_lng", "travel_time_source",
+)
+
+
+class DeliveryQueueFull(Exception):
+    pass
+
+
+class DeliveryWriteFailed(Exception):
+    """Rows could be neither inserted nor spilled, so they are lost"""
+
+
+def delivery_row(city, perishability, travel_time, weather, score, start_point=None, end_point=None, travel_source=None):
+    """A row in DELIVERY_COLUMNS order; points are (lat, lng) or None"""
+    start_lat, start_lng = start_point or (None, None)
+    end_lat, end_lng = end_point or (None, None)
+    return (city, perishability, travel_time, weather, score, start_lat, start_lng, end_lat, end_lng, travel_source)
+
+
+def insert_deliveries(pool, rows, columns=DELIVERY_COLUMNS):
+    """Insert rows with one multi-row INSERT and one commit"""
+    with pool.connection() as conn, DB_INSERT.labels(rows_bucket(len(rows))).time():
+        cur = conn.cursor()
+        execute_values(
+            cur,
+            f"INSERT INTO deliveries ({', '.join(columns)}) VALUES %s",
+            rows,
+            page_size=500,
+        )
+        conn.commit()
+        cur.close()
+    history_cache.invalidate()
+
+
+class DeliveryWriter:
+    """Bounded in-memory queue of delivery rows flushed by a background task.
+
+    A flush happens when DELIVERY_FLUSH_SIZE rows are waiting or
+    DELIVERY_FLUSH_INTERVAL seconds after the first one arrived. If the
+    insert fails the batch is appended to DELIVERY_SPILL_PATH, and the file
+    is replayed after the next successful flush; replays a dead process left
+    half done are put back into it on start. If the spill fails too,
+    waiters get DeliveryWriteFailed and the writer carries on with the next
+    batch. Rows carry their own created_at so late or replayed inserts keep
+    the original time.
+    """
+
+    columns = DELIVERY_COLUMNS + ("created_at",)
+
+    def __init__(self, maxsize=DELIVERY_QUEUE_MAX, flush_size=DELIVERY_FLUSH_SIZE,
+                 flush_interval=DELIVERY_FLUSH_INTERVAL, spill_path=DELIVERY_SPILL_PATH):
+        self.maxsize = maxsize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self._queue = None
+        self._room = None
+        self._task = None
+        self._stats = {"enqueued": 0, "flushed": 0, "flushes": 0, "spilled": 0, "replayed": 0, "rejected": 0, "lost": 0}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._room = asyncio.Event()
+        try:
+            await run_in_threadpool(self._recover_claims)
+        except Exception as e:
+            logging.error(f"❌ Recovering interrupted delivery replays failed: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the background task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def enqueue(self, rows, wait=False):
+        """Queue rows; with wait=True, return only after they are committed or spilled.
+
+        Rows are queued all together or not at all: raises DeliveryQueueFull,
+        with nothing queued, if there is no room for every row within
+        DELIVERY_ENQUEUE_TIMEOUT, and with wait=True DeliveryWriteFailed if
+        the rows could be neither inserted nor spilled.
+        """
+        now = datetime.now(ZoneInfo(DB_TIMEZONE)).replace(tzinfo=None)
+        try:
+            await self._reserve(len(rows))
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += len(rows)
+            raise DeliveryQueueFull(f"Delivery queue full ({self.maxsize} rows, {len(rows)} to queue)")
+        # No await between the room check and the puts, so nothing can take the room in between
+        future = asyncio.get_running_loop().create_future() if wait else None
+        for i, row in enumerate(rows):
+            self._queue.put_nowait((tuple(row) + (now,), future if i == len(rows) - 1 else None))
+        self._stats["enqueued"] += len(rows)
+        if future is None:
+            return "queued"
+        return await future
+
+    async def _reserve(self, count):
+        """Wait until `count` rows fit in the queue; TimeoutError after DELIVERY_ENQUEUE_TIMEOUT"""
+        if count > self.maxsize:
+            raise asyncio.TimeoutError
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + DELIVERY_ENQUEUE_TIMEOUT
+        while self.maxsize - self._queue.qsize() < count:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            self._room.clear()
+            await asyncio.wait_for(self._room.wait(), remaining)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            self._room.set()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                self._room.set()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Never let one bad batch end the writer; later enqueues would fill the queue
+                logging.error(f"❌ Delivery flush of {len(batch)} rows failed unexpectedly: {e}")
+                self._fail(batch, DeliveryWriteFailed(str(e)))
+
+    async def _flush(self, batch):
+        rows = [row for row, _ in batch]
+        try:
+            await run_in_threadpool(insert_deliveries, get_pool(), rows, self.columns)
+            status = "committed"
+            self._stats["flushed"] += len(rows)
+            self._stats["flushes"] += 1
+        except Exception as e:
+            logging.error(f"❌ Delivery flush of {len(rows)} rows failed, spilling to {self.spill_path}: {e}")
+            try:
+                await run_in_threadpool(self._spill, rows)
+            except Exception as spill_error:
+                self._stats["lost"] += len(rows)
+                logging.error(f"❌ Spilling {len(rows)} deliveries to {self.spill_path} failed, rows lost: {spill_error}")
+                self._fail(batch, DeliveryWriteFailed(f"Insert failed ({e}) and spill failed ({spill_error})"))
+                return
+            status = "spilled"
+        if status == "committed":
+            # The database is reachable again, so catch up on earlier spills
+            try:
+                await run_in_threadpool(self._replay_spill)
+            except Exception as e:
+                logging.error(f"❌ Replaying spilled deliveries failed: {e}")
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(status)
+
+    def _fail(self, batch, error):
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def _write_spill(self, rows):
+        with open(self.spill_path, "a") as f:
+            for row in rows:
+                f.write(json.dumps([*row[:-1], row[-1].isoformat()]) + "\n")
+
+    def _spill(self, rows):
+        self._write_spill(rows)
+        self._stats["spilled"] += len(rows)
+
+    def _replay_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        # Claim the file first so concurrent workers never replay the same rows twice
+        claimed = f"{self.spill_path}.replay-{os.getpid()}"
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return
+        with open(claimed) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        # Rows spilled before the coordinate columns existed are padded with NULLs
+        rows = [(*row[:-1], *[None] * (len(self.columns) - len(row)), datetime.fromisoformat(row[-1])) for row in rows]
+        try:
+            for start in range(0, len(rows), self.flush_size):
+                insert_deliveries(get_pool(), rows[start:start + self.flush_size], self.columns)
+        except Exception:
+            # Put the claimed rows back; already inserted chunks are skipped. If that fails too
+            # the claimed file stays, and the next start puts it back (see _recover_claims)
+            self._write_spill(rows[start:])
+            os.remove(claimed)
+            raise
+        os.remove(claimed)
+        self._stats["replayed"] += len(rows)
+        logging.info(f"✅ Replayed {len(rows)} spilled deliveries")
+
+    def _recover_claims(self):
+        """Return replays claimed by processes that died mid-replay to the spill file"""
+        for path in glob.glob(f"{glob.escape(self.spill_path)}.replay-*"):
+            pid = path.rsplit("-", 1)[-1]
+            if not pid.isdigit() or _process_alive(int(pid)):
+                continue
+            # Claim it again under this pid, so only one starting worker recovers it
+            claimed = f"{self.spill_path}.replay-{os.getpid()}"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed) as f, open(self.spill_path, "a") as spill:
+                spill.writelines(line for line in f if line.strip())
+            os.remove(claimed)
+            logging.info(f"✅ Returned interrupted replay {path} to {self.spill_path}")
+
+    def stats(self):
+        return {
+            **self._stats,
+            "mode": DELIVERY_WRITE_MODE,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "spill_file": os.path.exists(self.spill_path),
+        }
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+delivery_writer = DeliveryWriter()
+
+
+async def record_deliveries(pool, rows, wait=None):
+    """Persist delivery rows according to DELIVERY_WRITE_MODE.
+
+    Returns "committed", "queued" or "spilled". In write-behind mode the
+    call returns as soon as the rows are queued unless `wait` is True.
+    """
+    if DELIVERY_WRITE_MODE == "behind":
+        return await delivery_writer.enqueue(rows, wait=bool(wait))
+    await run_in_threadpool(insert_deliveries, pool, rows)
+    return "committed"
@@ -0,0 +1,98 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def parse_point(point: str):
+    """'lat,lng' -> (lat, lng); raises ValueError on malformed input"""
+    lat, lng = map(float, point.split(","))
+    return lat, lng
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def haversine_batch_m(lat1, lng1, lat2, lng2):
+    """haversine_m over arrays of coordinates; a NaN coordinate gives a NaN distance"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(column, dtype=np.float64)) for column in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def geohash(lat: float, lng: float, precision: int = 5) -> str:
+    """Standard base32 geohash. Precision 5 is a ~4.9 x 4.9 km cell, 6 is ~1.2 x 0.6 km"""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                ch = (ch << 1) | 1
+                lng_lo = mid
+            else:
+                ch <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(chars)
+
+
+def thin_polyline(points, min_spacing_m):
+    """Drop points closer than `min_spacing_m` to the last kept one; the first and last point are always kept"""
+    if len(points) <= 2:
+        return list(points)
+    kept = [points[0]]
+    for lat, lng in points[1:-1]:
+        if haversine_m(kept[-1][0], kept[-1][1], lat, lng) >= min_spacing_m:
+            kept.append((lat, lng))
+    kept.append(points[-1])
+    return kept
+
+
+def sample_polyline(points, k):
+    """`k` points evenly spaced by distance along a polyline, from its first to its last point.
+
+    Returns (lat, lng, distance from the start in metres) tuples.
+    """
+    if not points:
+        return []
+    if k <= 1 or len(points) == 1:
+        return [(points[0][0], points[0][1], 0.0)]
+    cumulative = [0.0]
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        cumulative.append(cumulative[-1] + haversine_m(lat1, lng1, lat2, lng2))
+    total = cumulative[-1]
+    samples = []
+    segment = 0
+    for i in range(k):
+        target = total * i / (k - 1)
+        while segment < len(points) - 2 and cumulative[segment + 1] < target:
+            segment += 1
+        span = cumulative[segment + 1] - cumulative[segment]
+        f = (target - cumulative[segment]) / span if span > 0 else 0.0
+        (lat1, lng1), (lat2, lng2) = points[segment], points[segment + 1]
+        samples.append((lat1 + (lat2 - lat1) * f, lng1 + (lng2 - lng1) * f, target))
+    return samples
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from datetime import timezone
+from email.utils import format_datetime
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+from db import DB_TIMEZONE
+from services.cache import TTLCache
+
+load_dotenv()
+
+# Seconds the deliveries version (latest id, last change and generation) is trusted before it is read
+# again, i.e. how late another worker's inserts and rewrites may show up in /history
+# (0 = read it on every request, no page cache)
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "2"))
+# Rendered /history pages kept per process; they are only served while the version is unchanged
+HISTORY_CACHE_MAX = int(os.getenv("HISTORY_CACHE_MAX", "256"))
+HISTORY_CACHE_PAGE_TTL = float(os.getenv("HISTORY_CACHE_PAGE_TTL", "300"))
+
+
+# Inserts move max(id); rewrites (UPDATE, DELETE, TRUNCATE and dropped partitions) bump the
+# deliveries generation instead, through the trigger below or bump_generation()
+_BUMP_GENERATION = """
+    INSERT INTO data_generations (name, generation, bumped_at) VALUES ('deliveries', 1, now())
+    ON CONFLICT (name) DO UPDATE SET generation = data_generations.generation + 1, bumped_at = now()
+"""
+GENERATION_TRIGGER = [
+    f"""CREATE OR REPLACE FUNCTION bump_deliveries_generation() RETURNS trigger AS $$
+    BEGIN
+        {_BUMP_GENERATION};
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS deliveries_rewritten ON deliveries",
+    "CREATE TRIGGER deliveries_rewritten AFTER UPDATE OR DELETE OR TRUNCATE ON deliveries "
+    "FOR EACH STATEMENT EXECUTE FUNCTION bump_deliveries_generation()",
+]
+
+
+def bump_generation(cur):
+    """Mark deliveries as rewritten, for changes the trigger does not see (e.g. dropped partitions)"""
+    cur.execute(_BUMP_GENERATION)
+
+
+def read_version(conn):
+    """(max id, last change, generation) of deliveries.
+
+    The last change is the newest created_at or the last rewrite, whichever
+    is later. max(id) and max(created_at) are index-only lookups, the
+    generation one primary key lookup.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT max(id), GREATEST(max(created_at), (SELECT bumped_at FROM data_generations WHERE name = 'deliveries')),
+               COALESCE((SELECT generation FROM data_generations WHERE name = 'deliveries'), 0)
+        FROM deliveries
+    """)
+    version = cur.fetchone()
+    conn.rollback()
+    cur.close()
+    return version
+
+
+class HistoryCache:
+    """The deliveries version and rendered /history pages, shared by every poll in this process.
+
+    The version changes with every insert and rewrite and is read at most once per
+    `ttl` seconds; a cached page is served only while the version it was
+    rendered at is current. Writers in this process call invalidate(), so
+    their rows show up at once; other processes' within `ttl`.
+    """
+
+    def __init__(self, ttl=HISTORY_CACHE_TTL, maxsize=HISTORY_CACHE_MAX, page_ttl=HISTORY_CACHE_PAGE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._pages = TTLCache(maxsize=maxsize, ttl=page_ttl, clock=clock)  # query key -> (version, page)
+        self._lock = threading.Lock()
+        self._version = None
+        self._expires_at = 0.0
+        self._generation = 0  # bumped by invalidate(), so a read racing it is not kept
+        self._stats = {"version_reads": 0, "version_hits": 0, "invalidations": 0, "not_modified": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def version(self, read):
+        """The current version, calling `read()` when the cached one is older than ttl or invalidated"""
+        with self._lock:
+            if self._version is not None and self._clock() < self._expires_at:
+                self._stats["version_hits"] += 1
+                return self._version
+            generation = self._generation
+        version = read()
+        with self._lock:
+            self._stats["version_reads"] += 1
+            if generation == self._generation and self.enabled:
+                if version != self._version:
+                    self._pages.clear()
+                self._version, self._expires_at = version, self._clock() + self.ttl
+        return version
+
+    def get(self, key, version):
+        entry = self._pages.get(key) if self.enabled else None
+        return entry[1] if entry is not None and entry[0] == version else None
+
+    def set(self, key, version, page):
+        if self.enabled:
+            self._pages.set(key, (version, page))
+
+    def not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def invalidate(self):
+        """Forget the version and every page; call after committing inserts or rewrites of deliveries"""
+        with self._lock:
+            self._generation += 1
+            self._version = None
+            self._stats["invalidations"] += 1
+        self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, "ttl_sec": self.ttl, "pages": self._pages.stats()}
+
+
+def modified_at(created_at):
+    """created_at (naive, in DB_TIMEZONE) in UTC, to the second as in HTTP dates"""
+    moment = created_at.replace(tzinfo=ZoneInfo(DB_TIMEZONE)) if created_at.tzinfo is None else created_at
+    return moment.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def last_modified(created_at):
+    """created_at as an HTTP date for the Last-Modified header"""
+    return format_datetime(modified_at(created_at), usegmt=True)
+
+
+history_cache = HistoryCache()
@@ -0,0 +1,32 @@
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+
+_client = None
+
+def get_client() -> httpx.AsyncClient:
+    """One long-lived AsyncClient per process so upstream connections are kept alive"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
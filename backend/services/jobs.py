@@ -0,0 +1,565 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from dotenv import load_dotenv
+import logging
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from db import get_pool
+from services.delivery_writer import record_deliveries
+from services.metrics import SCORING
+from services.planning import plan_route, score_items
+from services.rate_limit import upstream_priority
+from services.rescore import rescore
+from services.rollups import refold_rollups
+from services.scoring import get_model, score_batch
+
+load_dotenv()
+
+# Job records live in a local SQLite file, so every uvicorn worker on the host
+# shares one queue and queued jobs survive a restart.
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(tempfile.gettempdir(), "routemonk_jobs.sqlite3"))
+JOB_MAX_RUNNING = int(os.getenv("JOB_MAX_RUNNING", "2"))    # running jobs across every worker sharing the store
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))    # submissions beyond this are refused
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # seconds a finished job and its result are kept
+JOB_PROCESS_WORKERS = int(os.getenv("JOB_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))  # seconds between claims and progress heartbeats
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "30"))  # a running job without a heartbeat this long is requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_SCORE_CHUNK = int(os.getenv("JOB_SCORE_CHUNK", "20000"))  # items per process-pool scoring task
+JOB_INSERT_CHUNK = int(os.getenv("JOB_INSERT_CHUNK", "5000"))  # delivery rows per INSERT
+JOB_RESULT_PAGE = 1000  # "results" entries per stored result part
+
+FINISHED = ("succeeded", "failed", "cancelled")
+_JOB_COLUMNS = (
+    "id", "kind", "status", "progress", "error", "attempts", "owner", "cancel_requested",
+    "created_at", "started_at", "finished_at", "heartbeat_at", "wrote_rows",
+)
+# A job that already committed deliveries is failed rather than rerun when its run is cut short,
+# since the rerun would insert those rows again
+_INTERRUPTED_AFTER_WRITES = "interrupted after saving deliveries; not rerun, so they are not inserted twice"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """Jobs and their results in a local SQLite file.
+
+    Claims run in one IMMEDIATE transaction, so two workers never start the
+    same job and JOB_MAX_RUNNING holds for the whole host. A result's
+    "results" list is stored in parts of JOB_RESULT_PAGE entries, so paging
+    through a large batch does not load all of it.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL,"
+            " progress TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, owner TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL,"
+            " finished_at REAL, heartbeat_at REAL, wrote_rows INTEGER NOT NULL DEFAULT 0)"
+        )
+        try:
+            # Stores created before wrote_rows existed
+            conn.execute("ALTER TABLE jobs ADD COLUMN wrote_rows INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created_at ON jobs (status, created_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            " job_id TEXT NOT NULL, part INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (job_id, part))"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _job(row):
+        job = dict(zip(_JOB_COLUMNS, row))
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["wrote_rows"] = bool(job["wrote_rows"])
+        return job
+
+    def submit(self, kind, payload, max_queued=JOB_MAX_QUEUED, now=None):
+        """Queue a job; raises JobQueueFull when max_queued jobs are already waiting"""
+        job_id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            queued = conn.execute("SELECT count(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                raise JobQueueFull(f"{queued} jobs already queued")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now or time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._conn().execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list(self, status=None, limit=50):
+        sql, params = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs", []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        rows = self._conn().execute(sql + " ORDER BY created_at DESC LIMIT ?", (*params, limit)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def result(self, job_id, offset=0, limit=None):
+        """The stored result with "results" cut to [offset, offset + limit), plus "results_total"; None if absent"""
+        conn = self._conn()
+        row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        result = json.loads(row[0])
+        if "results_total" not in result:
+            return result
+        end = result["results_total"] if limit is None else min(offset + limit, result["results_total"])
+        results = []
+        if offset < end:
+            parts = conn.execute(
+                "SELECT data FROM job_results WHERE job_id = ? AND part BETWEEN ? AND ? ORDER BY part",
+                (job_id, offset // JOB_RESULT_PAGE, (end - 1) // JOB_RESULT_PAGE),
+            ).fetchall()
+            first = offset // JOB_RESULT_PAGE * JOB_RESULT_PAGE
+            results = [item for (data,) in parts for item in json.loads(data)][offset - first:end - first]
+        result["results"] = results
+        return result
+
+    def claim(self, owner, max_running=JOB_MAX_RUNNING, now=None, stale_after=JOB_STALE_AFTER,
+              max_attempts=JOB_MAX_ATTEMPTS):
+        """Mark the oldest queued job running for `owner` and return it with its payload, or None.
+
+        Running jobs whose heartbeat stopped are requeued first (their worker
+        died), unless they had already written deliveries, and jobs that
+        already ran max_attempts times are failed.
+        """
+        now = now or time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = ?"
+                " WHERE status = 'running' AND heartbeat_at < ? AND wrote_rows = 1",
+                (now, _INTERRUPTED_AFTER_WRITES, now - stale_after),
+            )
+            stale = conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running' AND heartbeat_at < ?",
+                (now - stale_after,),
+            ).rowcount
+            if stale:
+                logging.warning(f"Requeued {stale} jobs whose worker stopped sending heartbeats")
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'gave up after ' || attempts || ' attempts'"
+                " WHERE status = 'queued' AND attempts >= ?",
+                (now, max_attempts),
+            )
+            if conn.execute("SELECT count(*) FROM jobs WHERE status = 'running'").fetchone()[0] >= max_running:
+                return None
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?"
+                " WHERE id = ?",
+                (owner, now, now, row[0]),
+            )
+        job = self.get(row[0])
+        job["payload"] = json.loads(row[1])
+        return job
+
+    def mark_writing(self, job_id, owner):
+        """Record, before the first insert, that the job writes deliveries and must not be rerun"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET wrote_rows = 1 WHERE id = ? AND owner = ? AND status = 'running'", (job_id, owner)
+            )
+
+    def heartbeat(self, owner, progress, now=None):
+        """Record the progress of owner's running jobs ({id: progress}); returns the ids asked to cancel"""
+        with self._transaction() as conn:
+            for job_id, job_progress in progress.items():
+                conn.execute(
+                    "UPDATE jobs SET heartbeat_at = ?, progress = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                    (now or time.time(), json.dumps(job_progress), job_id, owner),
+                )
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE owner = ? AND status = 'running' AND cancel_requested = 1", (owner,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def finish(self, job_id, owner, status, result=None, error=None, progress=None, now=None):
+        parts = []
+        if isinstance(result, dict) and isinstance(result.get("results"), list):
+            results = result["results"]
+            result = {**result, "results_total": len(results)}
+            del result["results"]
+            parts = [
+                (job_id, start // JOB_RESULT_PAGE, json.dumps(results[start:start + JOB_RESULT_PAGE]))
+                for start in range(0, len(results), JOB_RESULT_PAGE)
+            ]
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, progress = ?, finished_at = ?"
+                " WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, None if result is None else json.dumps(result), error,
+                 json.dumps(progress) if progress else None, now or time.time(), job_id, owner),
+            ).rowcount
+            if updated:
+                conn.executemany("INSERT OR REPLACE INTO job_results (job_id, part, data) VALUES (?, ?, ?)", parts)
+        return bool(updated)
+
+    def release(self, job_ids, owner, now=None):
+        """Put owner's running jobs back in the queue (shutdown); the interrupted run is not counted.
+
+        Jobs that already wrote deliveries are failed instead. Returns how many were requeued.
+        """
+        requeued = 0
+        with self._transaction() as conn:
+            for job_id in job_ids:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, error = ?"
+                    " WHERE id = ? AND owner = ? AND status = 'running' AND wrote_rows = 1",
+                    (now or time.time(), _INTERRUPTED_AFTER_WRITES, job_id, owner),
+                )
+                requeued += conn.execute(
+                    "UPDATE jobs SET status = 'queued', owner = NULL, attempts = attempts - 1"
+                    " WHERE id = ? AND owner = ? AND status = 'running'",
+                    (job_id, owner),
+                ).rowcount
+        return requeued
+
+    def cancel(self, job_id, now=None):
+        """Cancel a queued job at once, or flag a running one for its worker; returns the job or None"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row[0] == "queued":
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (now or time.time(), job_id)
+                )
+            elif row[0] == "running":
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        return self.get(job_id)
+
+    def purge(self, ttl=JOB_RESULT_TTL, now=None):
+        """Delete jobs (and results) that finished more than ttl seconds ago; returns how many"""
+        cutoff = (now or time.time()) - ttl
+        expired = f"SELECT id FROM jobs WHERE status IN {FINISHED} AND finished_at < ?"
+        with self._transaction() as conn:
+            conn.execute(f"DELETE FROM job_results WHERE job_id IN ({expired})", (cutoff,))
+            return conn.execute(f"DELETE FROM jobs WHERE id IN ({expired})", (cutoff,)).rowcount
+
+    def counts(self):
+        return dict(self._conn().execute("SELECT status, count(*) FROM jobs GROUP BY status").fetchall())
+
+
+def _score_chunk(*columns):
+    # Runs in a worker process
+    return score_batch(*columns)
+
+
+async def _run_batch(manager, job_id, payload, progress, cancelled):
+    """Many shipments: lookups on the event loop, scoring in the process pool, rows inserted in chunks"""
+    upstream_priority.set("batch")
+    items = [SimpleNamespace(**item) for item in payload["items"]]
+    progress.update(stage="lookups", done=0, total=None)
+
+    def looked_up(done, total):
+        progress.update(done=done, total=total)
+
+    async def scorer(*columns):
+        n = len(columns[0])
+        progress.update(stage="scoring", done=0, total=n)
+
+        async def chunk(start):
+            scores = await manager.run_cpu(_score_chunk, *(column[start:start + JOB_SCORE_CHUNK] for column in columns))
+            progress["done"] += len(scores)
+            return scores
+
+        with SCORING.labels("job").time():
+            parts = await asyncio.gather(*(chunk(start) for start in range(0, n, JOB_SCORE_CHUNK)))
+        return np.concatenate(parts) if parts else np.zeros(0)
+
+    results, rows, stats = await score_items(items, payload["concurrency"], scorer, looked_up)
+    response = {"results": results, "stats": stats}
+
+    progress.update(stage="saving", done=0, total=len(rows))
+    if rows:
+        await run_in_threadpool(manager.store.mark_writing, job_id, manager.owner)
+    try:
+        for start in range(0, len(rows), JOB_INSERT_CHUNK):
+            chunk = rows[start:start + JOB_INSERT_CHUNK]
+            response["db_status"] = await record_deliveries(get_pool(), chunk, wait=True)
+            progress["done"] += len(chunk)
+    except Exception as db_error:
+        logging.error(f"❌ Job database insert failed: {db_error}")
+        response["error"] = f"Database insert failed: {str(db_error)}"
+    return response
+
+
+async def _run_multi(manager, job_id, payload, progress, cancelled):
+    """A multi-stop route: matrix lookups on the event loop, sequencing in the process pool"""
+    progress.update(stage="matrix", done=0, total=None)
+
+    async def sequence(fn, *args):
+        progress.update(stage="sequencing")
+        return await manager.run_cpu(fn, *args)
+
+    drops = [SimpleNamespace(**drop) for drop in payload["drops"]]
+    return await plan_route(payload["depot"], drops, payload["time_budget_ms"], run_cpu=sequence)
+
+
+async def _run_rescore(manager, job_id, payload, progress, cancelled):
+    """Rescore stored deliveries; a thread rather than a process, since it mostly waits on Postgres.
+
+    Safe to rerun: rescoring rows that were already rescored changes nothing.
+    """
+    model = get_model(payload.get("model"))
+    since, until = (datetime.fromisoformat(payload[key]) if payload.get(key) else None for key in ("since", "until"))
+    progress.update(stage="rescoring", done=0, total=None)
+
+    def on_batch(rows):
+        progress["done"] = rows
+        if cancelled.is_set():
+            raise JobCancelled()
+
+    def work():
+        with get_pool().connection() as conn:
+            stats = rescore(conn, model, payload["batch_size"], since, until, payload["dry_run"], on_batch)
+            stats["model"] = model.name
+            if stats["changed"] and not payload["dry_run"] and payload["rebuild_rollups"]:
+                progress.update(stage="rollups")
+                refolded = refold_rollups(conn, since, until)
+                stats["rollup_buckets"], stats["rollups_last_id"] = refolded["buckets"], refolded["last_id"]
+        return stats
+
+    return await run_in_threadpool(work)
+
+
+JOB_RUNNERS = {"batch": _run_batch, "multi": _run_multi, "rescore": _run_rescore}
+
+
+class _RunningJob:
+    def __init__(self, job):
+        self.job = job
+        self.progress = {"stage": "starting", "done": 0, "total": None}
+        self.cancelled = threading.Event()
+        self.task = None
+
+
+class JobManager:
+    """Runs queued jobs in the background of every worker.
+
+    Upstream lookups run on the event loop like any request; CPU-heavy steps
+    (scoring chunks, route sequencing) go to a process pool of
+    JOB_PROCESS_WORKERS, so they neither block the loop nor hold the GIL.
+    Running jobs write their progress to the store every JOB_POLL_INTERVAL;
+    on shutdown they go back to the queue for the next start, except batch
+    jobs that already saved deliveries, which are failed instead of rerun.
+    """
+
+    def __init__(self, store=None, max_running=JOB_MAX_RUNNING, process_workers=JOB_PROCESS_WORKERS):
+        self._store = store
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.max_running = max_running
+        self.process_workers = process_workers
+        self._pool = None
+        self._task = None
+        self._wake = None
+        self._running = {}  # job id -> _RunningJob
+        self._stopping = False
+        self._last_purge = 0.0
+        self._stats = {"claimed": 0, "succeeded": 0, "failed": 0, "cancelled": 0, "released": 0, "purged": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Let the dispatch loop finish its tick rather than cancel it mid-claim,
+        # so every job it claimed is in _running to be released below
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        running = dict(self._running)
+        for entry in running.values():
+            entry.cancelled.set()
+            entry.task.cancel()
+        await asyncio.gather(*(entry.task for entry in running.values()), return_exceptions=True)
+        self._running.clear()  # tasks cancelled before they started never removed themselves
+        if running:
+            requeued = await run_in_threadpool(self.store.release, list(running), self.owner)
+            self._stats["released"] += requeued
+            self._stats["failed"] += len(running) - requeued
+            logging.info(f"Returned {requeued} of {len(running)} running jobs to the queue")
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._task = None
+        self._stopping = False
+
+    async def submit(self, kind, payload):
+        """Queue a job of one of JOB_RUNNERS' kinds; raises JobQueueFull.
+
+        Called on the event loop: the wake-up event and job tasks are not thread-safe.
+        """
+        job = await run_in_threadpool(self.store.submit, kind, payload)
+        if self._wake is not None:
+            self._wake.set()
+        return job
+
+    async def cancel(self, job_id):
+        job = await run_in_threadpool(self.store.cancel, job_id)
+        if job_id in self._running:
+            self._cancel_local(job_id)
+        return job
+
+    def _cancel_local(self, job_id):
+        entry = self._running.get(job_id)
+        if entry is not None and not entry.cancelled.is_set():
+            entry.cancelled.set()
+            entry.task.cancel()
+
+    async def run_cpu(self, fn, *args):
+        """Run fn(*args) in the job process pool"""
+        if self._pool is None:
+            # spawn, not fork: the parent has an event loop, threads and open sockets
+            self._pool = ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+        pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the next call starts a fresh pool
+            if self._pool is pool:
+                self._pool = None
+            raise
+
+    async def _run(self):
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                await self._tick(time.time())
+            except Exception as e:
+                logging.error(f"❌ Job dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self, now):
+        # The store work (each step a SQLite write transaction) runs in the threadpool;
+        # cancelling and starting job tasks stays on the loop
+        progress = {job_id: dict(entry.progress) for job_id, entry in self._running.items()}
+        purge = now - self._last_purge >= 60
+        slots = 0 if self._stopping else self.max_running - len(self._running)
+        cancel_requested, purged, claimed = await run_in_threadpool(self._sync_store, progress, purge, slots, now)
+        for job_id in cancel_requested:
+            self._cancel_local(job_id)
+        if purge:
+            self._stats["purged"] += purged
+            self._last_purge = now
+        for job in claimed:
+            self._stats["claimed"] += 1
+            entry = _RunningJob(job)
+            entry.task = asyncio.create_task(self._execute(entry))
+            self._running[job["id"]] = entry
+
+    def _sync_store(self, progress, purge, slots, now):
+        """Heartbeat the running jobs, purge expired ones and claim up to `slots` queued jobs"""
+        cancel_requested = self.store.heartbeat(self.owner, progress, now) if progress else set()
+        purged = self.store.purge(now=now) if purge else 0
+        claimed = []
+        while len(claimed) < slots:
+            job = self.store.claim(self.owner, self.max_running, now)
+            if job is None:
+                break
+            claimed.append(job)
+        return cancel_requested, purged, claimed
+
+    async def _execute(self, entry):
+        job = entry.job
+        status, result, error = "succeeded", None, None
+        try:
+            runner = JOB_RUNNERS.get(job["kind"])
+            if runner is None:
+                raise ValueError(f"Unknown job kind {job['kind']!r}")
+            result = await runner(self, job["id"], job["payload"], entry.progress, entry.cancelled)
+        except (asyncio.CancelledError, JobCancelled):
+            if self._stopping:
+                self._running.pop(job["id"], None)
+                return  # stop() puts it back in the queue
+            status = "cancelled"
+        except Exception as e:
+            logging.error(f"❌ Job {job['id']} ({job['kind']}) failed: {e}")
+            status, error = "failed", str(e)
+
+        self._running.pop(job["id"], None)
+        # Large results take a while to serialise; keep that off the event loop
+        await run_in_threadpool(self.store.finish, job["id"], self.owner, status, result, error, entry.progress)
+        self._stats[status] += 1
+        logging.info(f"Job {job['id']} ({job['kind']}) {status}")
+        self._wake.set()
+
+    def stats(self):
+        return {
+            **self._stats,
+            "owner": self.owner,
+            "running_here": {job_id: entry.progress for job_id, entry in self._running.items()},
+            "jobs": self.store.counts(),
+            "max_running": self.max_running,
+            "max_queued": JOB_MAX_QUEUED,
+            "process_workers": self.process_workers,
+            "result_ttl_sec": JOB_RESULT_TTL,
+        }
+
+
+job_manager = JobManager()
@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import logging
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; covers cache hits (sub-millisecond) up to the 10 s upstream timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._new()
+            self._children[()] = self._default
+
+    def labels(self, *values):
+        """Child for one label combination; look it up once and keep it on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = _labels(self.labelnames, values, [f'le="{_number(bound)}"'])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_number(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text format (version 0.0.4).
+
+    Besides counters, gauges and histograms updated on the hot path,
+    collectors are called at scrape time to report state that already lives
+    elsewhere (pool, caches, queues) without touching the request path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn):
+        """Register fn() -> [(name, type, help, samples)], where samples maps
+        ((label, value), ...) tuples to numbers; usable as a decorator"""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logging.error(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    if value is None:
+                        continue
+                    names, values = zip(*labels) if labels else ((), ())
+                    lines.append(f"{name}{_labels(names, values)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "routemonk_http_requests_total", "HTTP requests by route template, method and status", ("method", "route", "status"))
+HTTP_DURATION = registry.histogram(
+    "routemonk_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge("routemonk_http_requests_in_flight", "HTTP requests being served")
+
+UPSTREAM_DURATION = registry.histogram(
+    "routemonk_upstream_request_duration_seconds", "Upstream call latency (tomtom, openweather, tomtom_matrix)",
+    ("upstream", "outcome"))
+UPSTREAM_IN_FLIGHT = registry.gauge("routemonk_upstream_requests_in_flight", "Upstream calls in flight", ("upstream",))
+LOOKUPS = registry.counter(
+    "routemonk_lookups_total",
+    "Travel time and weather lookups by where the value came from (live, cached, stale, local, fallback)",
+    ("kind", "source"))
+
+DB_ACQUIRE = registry.histogram("routemonk_db_acquire_seconds", "Time to check a connection out of the pool")
+DB_INSERT = registry.histogram("routemonk_db_insert_seconds", "Delivery INSERT + COMMIT time by batch size", ("rows",))
+SCORING = registry.histogram("routemonk_scoring_seconds", "Time spent scoring legs", ("path",))
+
+
+def rows_bucket(n):
+    """Coarse label for batch sizes, so the rows label stays low-cardinality"""
+    if n <= 1:
+        return "1"
+    if n <= 10:
+        return "2-10"
+    if n <= 100:
+        return "11-100"
+    return "100+"
+
+
+@contextmanager
+def upstream_call(upstream):
+    """Time one upstream call; the outcome label is "error" if the block raises"""
+    in_flight = UPSTREAM_IN_FLIGHT.labels(upstream)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        in_flight.dec()
+        UPSTREAM_DURATION.labels(upstream, outcome).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route request counts, latency and in-flight requests.
+
+    Routes are labelled by their template (e.g. /optimize/batch), never the
+    raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(scope["method"], template, str(status)).inc()
+            HTTP_DURATION.labels(scope["method"], template).observe(time.perf_counter() - started)
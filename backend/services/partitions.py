@@ -0,0 +1,260 @@
+import asyncio
+import gzip
+import os
+import re
+from datetime import datetime
+from dotenv import load_dotenv
+import logging
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from starlette.concurrency import run_in_threadpool
+from db import Delivery, get_pool
+from services.history_cache import bump_generation, history_cache
+
+load_dotenv()
+
+# Monthly partitions are kept this many months ahead of the current one
+DELIVERY_PARTITIONS_AHEAD = int(os.getenv("DELIVERY_PARTITIONS_AHEAD", "2"))
+# Whole months of deliveries to keep; older partitions are dropped (0 = keep everything)
+DELIVERY_RETENTION_MONTHS = int(os.getenv("DELIVERY_RETENTION_MONTHS", "0"))
+# If set, each partition is written there as gzipped CSV before it is dropped
+DELIVERY_ARCHIVE_DIR = os.getenv("DELIVERY_ARCHIVE_DIR")
+# Seconds between background partition checks while the app runs (0 = off)
+DELIVERY_PARTITION_CHECK_INTERVAL = float(os.getenv("DELIVERY_PARTITION_CHECK_INTERVAL", "3600"))
+
+_PARTITION_SUFFIX = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return datetime(month.year + years, index + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def _lock(cur, table):
+    # Serialises partition maintenance across workers and the command line tools
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{table}_partitions",))
+
+
+def is_partitioned(cur, table="deliveries"):
+    cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (table,))
+    return cur.fetchone() is not None
+
+
+def list_partitions(cur, table="deliveries"):
+    """Monthly partitions of `table` as (month, name), oldest first; the default partition is left out"""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)",
+        (table,),
+    )
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((datetime(int(match[1]), int(match[2]), 1), name))
+    return sorted(partitions)
+
+
+def _create_partition(cur, table, month):
+    name = partition_name(table, month)
+    lower, upper = month, add_months(month, 1)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0] is not None:
+        return False
+    cur.execute(
+        f"SELECT 1 FROM {table}_default WHERE created_at >= %s AND created_at < %s LIMIT 1", (lower, upper)
+    )
+    if cur.fetchone() is None:
+        cur.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+        return True
+    # Rows for this month already landed in the default partition (no partition
+    # existed yet); move them over, or attaching the new partition would fail
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default WHERE created_at >= %s AND created_at < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (lower, upper))
+    logging.info(f"Moved {cur.rowcount} deliveries from {table}_default into {name}")
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lower, upper))
+    return True
+
+
+def ensure_partitions(conn, table="deliveries", first=None, months_ahead=DELIVERY_PARTITIONS_AHEAD, now=None):
+    """Create the monthly partitions from `first` (default: this month) to `months_ahead` months from now.
+
+    Also creates `<table>_default`, which catches rows outside every monthly
+    range, including legacy rows without a created_at. Returns the names of
+    the partitions created.
+    """
+    now = now or datetime.now()
+    month = month_start(first or now)
+    last = add_months(month_start(now), months_ahead)
+    cur = conn.cursor()
+    _lock(cur, table)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    created = []
+    while month <= last:
+        if _create_partition(cur, table, month):
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+    conn.commit()
+    cur.close()
+    return created
+
+
+def partition_deliveries(conn, months_ahead=DELIVERY_PARTITIONS_AHEAD):
+    """Turn the plain deliveries table into one range-partitioned by month on created_at.
+
+    Runs in a single transaction: the existing table is renamed, a
+    partitioned table with the same columns takes its place (the id
+    sequence moves along), partitions covering the existing rows are
+    created, the rows are copied over and the indexes of the Delivery model
+    are rebuilt on the new table. The id stays unique through
+    UNIQUE (id, created_at), since every unique constraint must include the
+    partition key. Does nothing if deliveries is already partitioned.
+    """
+    cur = conn.cursor()
+    if is_partitioned(cur):
+        cur.close()
+        return False
+    _lock(cur, "deliveries")
+    cur.execute("LOCK TABLE deliveries IN ACCESS EXCLUSIVE MODE")
+    cur.execute("ALTER TABLE deliveries RENAME TO deliveries_unpartitioned")
+    cur.execute("SELECT pg_get_serial_sequence('deliveries_unpartitioned', 'id')")
+    sequence = cur.fetchone()[0]
+    if sequence is None:
+        raise RuntimeError("deliveries.id is not backed by a sequence; cannot partition automatically")
+    cur.execute("CREATE TABLE deliveries (LIKE deliveries_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    cur.execute("ALTER TABLE deliveries ADD CONSTRAINT deliveries_id_created_at_key UNIQUE (id, created_at)")
+    cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY deliveries.id")
+
+    cur.execute("SELECT min(created_at) FROM deliveries_unpartitioned")
+    oldest = cur.fetchone()[0]
+    cur.execute("CREATE TABLE deliveries_default PARTITION OF deliveries DEFAULT")
+    now = datetime.now()
+    month, last = month_start(min(oldest or now, now)), add_months(month_start(now), months_ahead)
+    while month <= last:
+        _create_partition(cur, "deliveries", month)
+        month = add_months(month, 1)
+
+    cur.execute("INSERT INTO deliveries SELECT * FROM deliveries_unpartitioned")
+    logging.info(f"Copied {cur.rowcount} deliveries into the partitioned table")
+    # Index names are per schema, so the old table (and its indexes) must go first
+    cur.execute("DROP TABLE deliveries_unpartitioned")
+    for index in Delivery.__table__.indexes:
+        cur.execute(str(CreateIndex(index).compile(dialect=postgresql.dialect())))
+    conn.commit()
+    cur.close()
+    return True
+
+
+def _archive(cur, name, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    with gzip.open(path, "wt", newline="") as f:
+        cur.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    return path
+
+
+def drop_expired_partitions(conn, keep_months=DELIVERY_RETENTION_MONTHS, archive_dir=DELIVERY_ARCHIVE_DIR,
+                            table="deliveries", now=None, dry_run=False):
+    """Drop monthly partitions that ended more than `keep_months` whole months ago.
+
+    Each partition is detached and dropped in its own transaction, which is
+    a catalog change rather than a DELETE of every row. With `archive_dir`,
+    the partition is first copied there as <partition>.csv.gz. Rows in the
+    default partition are never dropped. The hourly rollups
+    (services/rollups.py) keep their aggregates. Returns
+    [{"partition", "archive"}] for what was (or, with dry_run, would be) dropped.
+    """
+    if keep_months <= 0:
+        return []
+    cutoff = add_months(month_start(now or datetime.now()), -keep_months)
+    cur = conn.cursor()
+    expired = [name for month, name in list_partitions(cur, table) if add_months(month, 1) <= cutoff]
+    dropped = []
+    for name in expired:
+        if dry_run:
+            dropped.append({"partition": name, "archive": None})
+            continue
+        _lock(cur, table)
+        archive = _archive(cur, name, archive_dir) if archive_dir else None
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        cur.execute(f"DROP TABLE {name}")
+        # Not an UPDATE or DELETE, so the generation trigger does not see it
+        bump_generation(cur)
+        conn.commit()
+        history_cache.invalidate()
+        logging.info(f"Dropped expired partition {name}" + (f", archived to {archive}" if archive else ""))
+        dropped.append({"partition": name, "archive": archive})
+    conn.rollback()
+    cur.close()
+    return dropped
+
+
+class PartitionMaintainer:
+    """Background task that keeps future monthly partitions created and applies retention.
+
+    Does nothing while deliveries is a plain table.
+    """
+
+    def __init__(self, interval=DELIVERY_PARTITION_CHECK_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self._stats = {"checks": 0, "created": [], "dropped": [], "failures": 0, "partitioned": None}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _check(self):
+        with get_pool().connection() as conn:
+            cur = conn.cursor()
+            partitioned = is_partitioned(cur)
+            cur.close()
+            conn.rollback()
+            self._stats["partitioned"] = partitioned
+            if not partitioned:
+                return
+            self._stats["created"] += ensure_partitions(conn)
+            self._stats["dropped"] += [d["partition"] for d in drop_expired_partitions(conn)]
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self._check)
+                self._stats["checks"] += 1
+            except Exception as e:
+                self._stats["failures"] += 1
+                logging.error(f"❌ Partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            **self._stats,
+            "interval_sec": self.interval,
+            "months_ahead": DELIVERY_PARTITIONS_AHEAD,
+            "retention_months": DELIVERY_RETENTION_MONTHS,
+        }
+
+
+partition_maintainer = PartitionMaintainer()
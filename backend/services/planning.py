@@ -0,0 +1,216 @@
+import asyncio
+from starlette.concurrency import run_in_threadpool
+from services.delivery_writer import delivery_row
+from services.geo import haversine_m, parse_point
+from services.metrics import SCORING
+from services.scoring import get_model, score as score_leg, score_batch, weather_severity, weather_severity_batch
+from services.sequencing import solve_sequence
+from services.travel_matrix import get_travel_time_matrix_async
+from services.travel_time import get_travel_time_result_async
+from services.weather import get_weather_by_coordinates_result_async
+
+# Shared by /optimize/batch, /optimize/stream and /optimize/multi and the job runners (services/jobs.py).
+# `run_cpu(fn, *args)` is awaited for the CPU-bound step: a thread for
+# request handlers, a worker process for jobs.
+
+
+async def _score_inline(*columns):
+    with SCORING.labels("batch").time():
+        return score_batch(*columns)
+
+
+def _describe(index, item, route, weather, score, start_point, end_point):
+    """(result, delivery row) for one scored item"""
+    travel_time, travel_source = route
+    weather_info, weather_source = weather
+    location = weather_info.get("location", "Unknown Location")
+    result = {
+        "index": index,
+        "city": location,
+        "travel_time_sec": travel_time,
+        "weather": weather_info.get("weather", "unknown"),
+        "temperature": weather_info.get("temperature"),
+        "final_score": score,
+        "coordinates": {"start": item.start, "end": item.end},
+        "sources": {"travel_time": travel_source, "weather": weather_source},
+    }
+    return result, delivery_row(
+        location, item.perishability, travel_time, result["weather"], score, start_point, end_point, travel_source,
+    )
+
+
+async def score_items(items, concurrency, scorer=None, on_lookup=None):
+    """Look up, score and describe many shipments (objects with start, end, perishability, bypass_cache).
+
+    Identical origin/destination pairs and start cells are looked up once,
+    with at most `concurrency` upstream calls in flight, and every valid
+    item is scored in one vectorized pass by `scorer(perishability, travel
+    time, severity, temperature, distance)`. `on_lookup(done, total)` is
+    called after each lookup finishes. Returns (per-item results, delivery rows for the
+    valid items, stats); invalid items carry their own "error".
+    """
+    limit = asyncio.Semaphore(concurrency)
+    scorer = scorer or _score_inline
+    results = [None] * len(items)
+    routes = {}   # (start point, end point) -> (travel time, source)
+    weather = {}  # start point -> (weather info, source)
+    bypass = set()  # route keys and start points whose items asked for fresh lookups
+    valid = []
+
+    for index, item in enumerate(items):
+        try:
+            start_point, end_point = parse_point(item.start), parse_point(item.end)
+        except ValueError as coord_error:
+            results[index] = {"index": index, "error": f"Invalid coordinate format: {coord_error}"}
+            continue
+        valid.append((index, item, start_point, end_point))
+        routes[(start_point, end_point)] = None
+        weather[start_point] = None
+        if item.bypass_cache:
+            bypass.update([(start_point, end_point), start_point])
+
+    lookups = {"done": 0, "total": len(routes) + len(weather)}
+
+    def looked_up():
+        lookups["done"] += 1
+        if on_lookup:
+            on_lookup(lookups["done"], lookups["total"])
+
+    async def fetch_route(key):
+        async with limit:
+            routes[key] = await get_travel_time_result_async(
+                f"{key[0][0]},{key[0][1]}", f"{key[1][0]},{key[1][1]}", use_cache=key not in bypass
+            )
+        looked_up()
+
+    async def fetch_weather(point):
+        async with limit:
+            weather[point] = await get_weather_by_coordinates_result_async(point[0], point[1], use_cache=point not in bypass)
+        looked_up()
+
+    await asyncio.gather(*(fetch_route(key) for key in routes), *(fetch_weather(point) for point in weather))
+
+    scores = await scorer(
+        [item.perishability for _, item, _, _ in valid],
+        [routes[(start_point, end_point)][0] for _, _, start_point, end_point in valid],
+        weather_severity_batch([weather[start_point][0].get("weather") for _, _, start_point, _ in valid]),
+        [weather[start_point][0].get("temperature") for _, _, start_point, _ in valid],
+        [haversine_m(*start_point, *end_point) for _, _, start_point, end_point in valid],
+    )
+
+    rows = []
+    for (index, item, start_point, end_point), score in zip(valid, scores.tolist()):
+        results[index], row = _describe(
+            index, item, routes[(start_point, end_point)], weather[start_point], score, start_point, end_point,
+        )
+        rows.append(row)
+
+    stats = {
+        "items": len(items),
+        "unique_routes": len(routes),
+        "unique_weather_points": len(weather),
+        "errors": len(items) - len(valid),
+        "score_model": get_model().name,
+    }
+    return results, rows, stats
+
+
+async def iter_scored_items(items, concurrency):
+    """Like score_items, but yields (result, delivery row or None) for each item as soon as it is scored.
+
+    Items finish in whatever order their lookups do; each result carries its
+    "index". Lookups are still shared between identical routes and start
+    cells. Closing the generator (e.g. when a streaming client goes away)
+    cancels every lookup that has not finished.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    lookups = {}  # ("route", start, end) or ("weather", start) -> task, shared by the items that need it
+
+    async def limited(call):
+        async with limit:
+            return await call
+
+    def lookup(key, use_cache):
+        if key not in lookups:
+            if key[0] == "route":
+                call = get_travel_time_result_async(f"{key[1][0]},{key[1][1]}", f"{key[2][0]},{key[2][1]}", use_cache=use_cache)
+            else:
+                call = get_weather_by_coordinates_result_async(key[1][0], key[1][1], use_cache=use_cache)
+            lookups[key] = asyncio.ensure_future(limited(call))
+        # Shielded so that one item being cancelled does not cancel a lookup other items share
+        return asyncio.shield(lookups[key])
+
+    async def one(index, item):
+        try:
+            start_point, end_point = parse_point(item.start), parse_point(item.end)
+        except ValueError as coord_error:
+            return {"index": index, "error": f"Invalid coordinate format: {coord_error}"}, None
+        route, weather = await asyncio.gather(
+            lookup(("route", start_point, end_point), not item.bypass_cache),
+            lookup(("weather", start_point), not item.bypass_cache),
+        )
+        score = score_leg(
+            item.perishability, route[0], weather_severity(weather[0].get("weather")),
+            weather[0].get("temperature"), haversine_m(*start_point, *end_point),
+        )
+        return _describe(index, item, route, weather, score, start_point, end_point)
+
+    tasks = [asyncio.ensure_future(one(index, item)) for index, item in enumerate(items)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in [*tasks, *lookups.values()]:
+            task.cancel()
+
+
+async def plan_route(depot, drops, time_budget_ms, run_cpu=run_in_threadpool):
+    """Order a depot plus drops (objects with location, perishability, id and time window) into one route.
+
+    Travel times come from one chunked TomTom matrix request, with cells
+    TomTom did not answer estimated (counted in stats["matrix"]); sequencing
+    favours perishable drops and respects time windows, within the time
+    budget. Raises ValueError for malformed coordinates.
+    """
+    points = [parse_point(depot)] + [parse_point(drop.location) for drop in drops]
+    matrix = await get_travel_time_matrix_async(points)
+    rows = [matrix.row(i) for i in range(matrix.n_origins)]
+
+    result = await run_cpu(
+        solve_sequence,
+        rows,
+        [drop.perishability for drop in drops],
+        [drop.window_start_sec for drop in drops],
+        [drop.window_end_sec for drop in drops],
+        time_budget_ms / 1000,
+    )
+
+    route = []
+    for position, (stop, arrival, late) in enumerate(zip(result.order, result.arrivals, result.lateness)):
+        drop = drops[stop - 1]
+        route.append({
+            "position": position,
+            "index": stop - 1,
+            "id": drop.id,
+            "location": drop.location,
+            "perishability": drop.perishability,
+            "eta_sec": round(arrival),
+            "late_sec": round(late),
+        })
+
+    return {
+        "depot": depot,
+        "route": route,
+        "total_travel_time_sec": round(result.total_travel_time),
+        "objective": result.objective,
+        "stats": {
+            "stops": len(drops),
+            "construction_objective": result.construction_objective,
+            "local_search_iterations": result.iterations,
+            "moves": result.moves,
+            "timed_out": result.timed_out,
+            "solve_ms": round(result.elapsed_ms, 1),
+            "matrix_fallback_cells": matrix.missing_count(),
+            "matrix": matrix.summary(),
+        },
+    }
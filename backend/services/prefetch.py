@@ -0,0 +1,252 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+import logging
+from starlette.concurrency import run_in_threadpool
+from db import DB_TIMEZONE, get_pool
+from services.geo import geohash
+from services.rate_limit import openweather_limiter, tomtom_limiter, upstream_priority
+from services.travel_time import TRAVEL_CACHE_PRECISION, prefetch_travel_time, tomtom_breaker, travel_time_prefetched
+from services.weather import openweather_breaker, prefetch_weather, weather_prefetched
+from services.weather_cache import WEATHER_CACHE_PRECISION
+
+load_dotenv()
+
+# Seconds between warm-ups while the app runs (0 = off; warm_caches.py runs one by hand or from cron).
+# Keep it at or below TRAVEL_CACHE_TTL, or hot pairs go cold between runs.
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "0"))
+# Patterns are mined from deliveries made in the hours of day from now to now + this many minutes,
+# on the same kind of day (weekday or weekend), over the last PREFETCH_WINDOW_DAYS
+PREFETCH_LOOKAHEAD_MIN = int(os.getenv("PREFETCH_LOOKAHEAD_MIN", "60"))
+PREFETCH_WINDOW_DAYS = int(os.getenv("PREFETCH_WINDOW_DAYS", "28"))
+# Trips a corridor or start cell needs in that window to be worth warming
+PREFETCH_MIN_TRIPS = int(os.getenv("PREFETCH_MIN_TRIPS", "3"))
+PREFETCH_MAX_ROUTES = int(os.getenv("PREFETCH_MAX_ROUTES", "200"))
+PREFETCH_MAX_CELLS = int(os.getenv("PREFETCH_MAX_CELLS", "50"))
+# Upstream calls one warm-up may make per provider; lookups answered from cache or history are free
+PREFETCH_TOMTOM_BUDGET = int(os.getenv("PREFETCH_TOMTOM_BUDGET", "50"))
+PREFETCH_OPENWEATHER_BUDGET = int(os.getenv("PREFETCH_OPENWEATHER_BUDGET", "20"))
+# Share of each provider's daily quota kept for on-demand lookups; warm-ups stop once the rest is used
+PREFETCH_QUOTA_RESERVE = float(os.getenv("PREFETCH_QUOTA_RESERVE", "0.5"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+# Cached travel times that expire within this many seconds are refreshed rather than counted as
+# warm, so hot pairs do not go cold before the next warm-up (default: PREFETCH_INTERVAL). Weather
+# entries are keyed by time bucket, so a refresh could only extend a key about to be abandoned.
+PREFETCH_REFRESH_SEC = float(os.getenv("PREFETCH_REFRESH_SEC", str(PREFETCH_INTERVAL)))
+
+# Sources for which no upstream call was made, so the budget is handed back
+_FREE_SOURCES = ("cached", "estimate")
+
+
+def _lookahead_hours(now, lookahead_min):
+    return sorted({(now + timedelta(minutes=m)).hour for m in range(0, lookahead_min + 1, 15)})
+
+
+def mine_patterns(
+    conn,
+    now=None,
+    lookahead_min=PREFETCH_LOOKAHEAD_MIN,
+    window_days=PREFETCH_WINDOW_DAYS,
+    min_trips=PREFETCH_MIN_TRIPS,
+    max_routes=PREFETCH_MAX_ROUTES,
+    max_cells=PREFETCH_MAX_CELLS,
+):
+    """The most frequent corridors and start cells for the coming hours, most frequent first.
+
+    Corridors are start/end points snapped like the travel time cache keys
+    (TRAVEL_CACHE_PRECISION decimals); start cells are merged per weather
+    cache geohash cell and carry their most common city. Returns
+    {"hours": [...], "routes": [{start, end, trips}], "cells": [{lat, lng, city, trips}]}.
+    """
+    now = now or datetime.now(ZoneInfo(DB_TIMEZONE)).replace(tzinfo=None)
+    hours = _lookahead_hours(now, lookahead_min)
+    recent = """
+        created_at >= %(since)s AND start_lat IS NOT NULL AND end_lat IS NOT NULL
+        AND EXTRACT(HOUR FROM created_at)::int IN %(hours)s
+        AND (EXTRACT(ISODOW FROM created_at) >= 6) = %(weekend)s
+    """
+    params = {
+        "since": now - timedelta(days=window_days),
+        "hours": tuple(hours),
+        "weekend": now.weekday() >= 5,
+        "precision": TRAVEL_CACHE_PRECISION,
+        "min_trips": min_trips,
+    }
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT round(start_lat::numeric, %(precision)s)::float8, round(start_lng::numeric, %(precision)s)::float8,
+               round(end_lat::numeric, %(precision)s)::float8, round(end_lng::numeric, %(precision)s)::float8,
+               count(*) AS trips
+        FROM deliveries
+        WHERE {recent}
+        GROUP BY 1, 2, 3, 4
+        HAVING count(*) >= %(min_trips)s
+        ORDER BY trips DESC
+        LIMIT %(limit)s
+    """, {**params, "limit": max_routes})
+    routes = [
+        {"start": f"{s_lat},{s_lng}", "end": f"{e_lat},{e_lng}", "trips": trips}
+        for s_lat, s_lng, e_lat, e_lng, trips in cur.fetchall()
+    ]
+    # ~1 km squares, merged into the coarser weather cache cells below
+    cur.execute(f"""
+        SELECT round(start_lat::numeric, 2)::float8, round(start_lng::numeric, 2)::float8,
+               mode() WITHIN GROUP (ORDER BY city), count(*) AS trips
+        FROM deliveries
+        WHERE {recent}
+        GROUP BY 1, 2
+        ORDER BY trips DESC
+        LIMIT %(limit)s
+    """, {**params, "limit": max_cells * 4})
+    cells = {}
+    for lat, lng, city, trips in cur.fetchall():
+        cell = cells.setdefault(geohash(lat, lng, WEATHER_CACHE_PRECISION), {"lat": lat, "lng": lng, "city": city, "trips": 0})
+        cell["trips"] += trips
+    conn.rollback()
+    cur.close()
+    ranked = sorted((c for c in cells.values() if c["trips"] >= min_trips), key=lambda c: -c["trips"])
+    return {"hours": hours, "routes": routes, "cells": ranked[:max_cells]}
+
+
+class _Budget:
+    """Upstream calls one warm-up may still make to a provider"""
+
+    def __init__(self, calls, limiter, breaker, reserve=PREFETCH_QUOTA_RESERVE):
+        self.breaker = breaker
+        self.left = calls
+        self.spent = 0
+        if limiter is not None and limiter.daily_quota:
+            used = limiter.stats().get("used_today", 0)
+            self.left = max(0, min(calls, int(limiter.daily_quota * (1 - reserve)) - used))
+
+    def take(self):
+        # An open circuit would only answer stale; leave the failing upstream alone
+        if self.left <= 0 or self.breaker.state == "open":
+            return False
+        self.left -= 1
+        self.spent += 1
+        return True
+
+    def refund(self):
+        self.left += 1
+        self.spent -= 1
+
+
+async def _warm_all(patterns, lookup, budget, concurrency):
+    """Warm each pattern in order while the budget lasts; returns counts per lookup source"""
+    limit = asyncio.Semaphore(concurrency)
+    counts = {"mined": len(patterns), "over_budget": 0}
+
+    async def warm(pattern):
+        async with limit:
+            if not budget.take():
+                counts["over_budget"] += 1
+                return
+            try:
+                source = await lookup(pattern)
+            except Exception as e:
+                logging.error(f"❌ Prefetch lookup failed for {pattern}: {e}")
+                source = "error"
+            if source in _FREE_SOURCES:
+                budget.refund()
+            counts[source] = counts.get(source, 0) + 1
+
+    await asyncio.gather(*(warm(pattern) for pattern in patterns))
+    return counts
+
+
+async def warm_caches(
+    patterns,
+    tomtom_budget=PREFETCH_TOMTOM_BUDGET,
+    openweather_budget=PREFETCH_OPENWEATHER_BUDGET,
+    concurrency=PREFETCH_CONCURRENCY,
+    refresh_within=PREFETCH_REFRESH_SEC,
+):
+    """Look up mined patterns (see mine_patterns) so the travel time and weather caches hold them.
+
+    Runs in the "batch" rate limit lane, so on-demand lookups overtake it,
+    and makes at most the given number of upstream calls per provider
+    (fewer once PREFETCH_QUOTA_RESERVE of the daily quota is reached).
+    Travel times expiring within `refresh_within` seconds are refreshed.
+    Returns per-source counts and the calls spent.
+    """
+    token = upstream_priority.set("batch")
+    try:
+        tomtom = _Budget(tomtom_budget, tomtom_limiter, tomtom_breaker)
+        openweather = _Budget(openweather_budget, openweather_limiter, openweather_breaker)
+        routes, weather = await asyncio.gather(
+            _warm_all(patterns["routes"], lambda r: prefetch_travel_time(r["start"], r["end"], refresh_within), tomtom, concurrency),
+            _warm_all(patterns["cells"], lambda c: prefetch_weather(c["lat"], c["lng"]), openweather, concurrency),
+        )
+    finally:
+        upstream_priority.reset(token)
+    return {
+        "routes": routes,
+        "weather": weather,
+        "upstream_calls": {"tomtom": tomtom.spent, "openweather": openweather.spent},
+    }
+
+
+class Prefetcher:
+    """Background task that mines hot patterns and warms the caches every `interval` seconds"""
+
+    def __init__(self, interval=PREFETCH_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self._stats = {"runs": 0, "failures": 0, "last_run": None}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _mine(self):
+        with get_pool().connection() as conn:
+            return mine_patterns(conn)
+
+    async def run_once(self):
+        started = time.perf_counter()
+        patterns = await run_in_threadpool(self._mine)
+        report = await warm_caches(patterns)
+        report["hours"] = patterns["hours"]
+        report["duration_sec"] = round(time.perf_counter() - started, 2)
+        report["finished_at"] = datetime.now(ZoneInfo(DB_TIMEZONE)).isoformat()
+        return report
+
+    async def _run(self):
+        while True:
+            try:
+                self._stats["last_run"] = await self.run_once()
+                self._stats["runs"] += 1
+                calls = self._stats["last_run"]["upstream_calls"]
+                logging.info(f"Prefetch warmed caches with {calls['tomtom']} TomTom and {calls['openweather']} OpenWeather calls")
+            except Exception as e:
+                self._stats["failures"] += 1
+                logging.error(f"❌ Prefetch failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            **self._stats,
+            "interval_sec": self.interval,
+            "budget_per_run": {"tomtom": PREFETCH_TOMTOM_BUDGET, "openweather": PREFETCH_OPENWEATHER_BUDGET},
+            "quota_reserve": PREFETCH_QUOTA_RESERVE,
+            "refresh_within_sec": PREFETCH_REFRESH_SEC,
+            # How many on-demand lookups (this worker) the warmed entries answered
+            "warm_hits": {"travel_time": travel_time_prefetched.stats(), "weather": weather_prefetched.stats()},
+        }
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from dotenv import load_dotenv
+import logging
+
+load_dotenv()
+
+# Token buckets live in a local SQLite file by default, so every uvicorn
+# worker on the host draws from the same per-provider rate and daily budget.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")  # sqlite | memory | off
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(tempfile.gettempdir(), "routemonk_rate_limits.sqlite3"))
+RATE_LIMIT_MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", "100"))  # waiters per provider and process before failing fast
+# Longest a call may wait for a token, per priority lane
+RATE_LIMIT_MAX_WAIT = {
+    "interactive": float(os.getenv("RATE_LIMIT_MAX_WAIT_INTERACTIVE", "2")),
+    "batch": float(os.getenv("RATE_LIMIT_MAX_WAIT_BATCH", "30")),
+}
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+# Per-provider requests per second, burst size and daily budget (0 = no daily budget)
+TOMTOM_QPS = float(os.getenv("TOMTOM_QPS", "5"))
+TOMTOM_BURST = float(os.getenv("TOMTOM_BURST", "5"))
+TOMTOM_DAILY_QUOTA = int(os.getenv("TOMTOM_DAILY_QUOTA", "2500"))
+OPENWEATHER_QPS = float(os.getenv("OPENWEATHER_QPS", "1"))
+OPENWEATHER_BURST = float(os.getenv("OPENWEATHER_BURST", "10"))
+OPENWEATHER_DAILY_QUOTA = int(os.getenv("OPENWEATHER_DAILY_QUOTA", "30000"))
+
+# Set to "batch" for work that should yield to interactive /optimize calls
+upstream_priority = ContextVar("upstream_priority", default="interactive")
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class QuotaExhausted(RateLimitExceeded):
+    pass
+
+
+def _today(now):
+    return time.strftime("%Y-%m-%d", time.gmtime(now))
+
+
+def _refill(tokens, updated_at, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+class MemoryBucketStore:
+    """Per-process buckets, for single-worker deployments and tests"""
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # name -> [tokens, updated_at, day, used]
+
+    def take(self, name, rate, burst, quota, cost, now):
+        """Take one token and `cost` quota units; returns seconds to wait (0 = granted)"""
+        with self._lock:
+            bucket = self._buckets.setdefault(name, [burst, now, _today(now), 0])
+            if bucket[2] != _today(now):
+                bucket[2], bucket[3] = _today(now), 0
+            if quota and bucket[3] + cost > quota:
+                raise QuotaExhausted(f"{name} daily quota of {quota} calls used up")
+            bucket[0] = _refill(bucket[0], bucket[1], now, rate, burst)
+            bucket[1] = now
+            if bucket[0] < 1:
+                return (1 - bucket[0]) / rate
+            bucket[0] -= 1
+            bucket[3] += cost
+            return 0.0
+
+    def usage(self, name):
+        with self._lock:
+            bucket = self._buckets.get(name)
+            return {"tokens": bucket[0], "used_today": bucket[3]} if bucket else {"tokens": None, "used_today": 0}
+
+
+class SQLiteBucketStore:
+    """Buckets in a local SQLite file; each take is one IMMEDIATE transaction, so processes never double-spend"""
+
+    # A take may wait up to the 1s busy timeout while another worker holds the write lock
+    blocking = True
+
+    def __init__(self, path=RATE_LIMIT_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL,"
+            " day TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, name, rate, burst, quota, cost, now):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at, day, used FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+            tokens, updated_at, day, used = row if row else (burst, now, _today(now), 0)
+            if day != _today(now):
+                day, used = _today(now), 0
+            if quota and used + cost > quota:
+                raise QuotaExhausted(f"{name} daily quota of {quota} calls used up")
+            tokens = _refill(tokens, updated_at, now, rate, burst)
+            wait = 0.0
+            if tokens < 1:
+                wait = (1 - tokens) / rate
+            else:
+                tokens -= 1
+                used += cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at, day, used) VALUES (?, ?, ?, ?, ?)",
+                (name, tokens, now, day, used),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def usage(self, name):
+        row = self._conn().execute("SELECT tokens, day, used FROM rate_buckets WHERE name = ?", (name,)).fetchone()
+        if row is None or row[1] != _today(time.time()):
+            return {"tokens": row[0] if row else None, "used_today": 0}
+        return {"tokens": row[0], "used_today": row[2]}
+
+
+class ProviderLimiter:
+    """Token bucket plus a priority queue in front of one upstream provider.
+
+    Within a process only the highest-priority, longest-waiting caller asks
+    the shared bucket for a token, so interactive calls overtake queued
+    batch work. Callers fail fast with RateLimitExceeded when the queue is
+    full or the token would not arrive within their lane's maximum wait,
+    and with QuotaExhausted once the daily budget is spent.
+    """
+
+    def __init__(self, name, rate, burst, daily_quota, store, max_queue=RATE_LIMIT_MAX_QUEUE):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.daily_quota = daily_quota
+        self.store = store
+        self.max_queue = max_queue
+        self._queue = []  # heap of (priority rank, arrival sequence)
+        self._seq = itertools.count()
+        self._cond = None
+        self._loop = None
+        self._stats = {"granted": 0, "waited": 0, "rejected_queue_full": 0, "rejected_wait": 0, "quota_exhausted": 0}
+
+    def _take(self, cost):
+        try:
+            return self.store.take(self.name, self.rate, self.burst, self.daily_quota, cost, time.time())
+        except QuotaExhausted:
+            self._stats["quota_exhausted"] += 1
+            raise
+
+    async def acquire(self, cost=1, priority=None):
+        """Wait for a token in the caller's priority lane (upstream_priority by default)"""
+        priority = priority or upstream_priority.get()
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond, self._loop = asyncio.Condition(), loop
+        if len(self._queue) >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise RateLimitExceeded(f"{self.name} call queue is full ({self.max_queue} waiting)")
+
+        deadline = loop.time() + RATE_LIMIT_MAX_WAIT[priority]
+        entry = (PRIORITIES[priority], next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                waited = False
+                while True:
+                    wait = None
+                    if self._queue[0] == entry:
+                        # The SQLite store can wait on other workers' write locks; keep that off the loop
+                        if self.store.blocking:
+                            wait = await asyncio.to_thread(self._take, cost)
+                        else:
+                            wait = self._take(cost)
+                        if wait == 0:
+                            self._stats["granted"] += 1
+                            self._stats["waited"] += waited
+                            return
+                    remaining = deadline - loop.time()
+                    if remaining <= 0 or (wait is not None and wait > remaining):
+                        self._stats["rejected_wait"] += 1
+                        raise RateLimitExceeded(f"{self.name} rate limit: no token within {RATE_LIMIT_MAX_WAIT[priority]}s")
+                    waited = True
+                    try:
+                        # Woken early when the queue changes, e.g. an interactive call arrives
+                        await asyncio.wait_for(self._cond.wait(), wait if wait is not None else remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def acquire_sync(self, cost=1, priority=None):
+        """Blocking variant for the sync lookup paths; no lane ordering, same bucket and budget"""
+        priority = priority or upstream_priority.get()
+        deadline = time.monotonic() + RATE_LIMIT_MAX_WAIT[priority]
+        while True:
+            wait = self._take(cost)
+            if wait == 0:
+                self._stats["granted"] += 1
+                return
+            if time.monotonic() + wait > deadline:
+                self._stats["rejected_wait"] += 1
+                raise RateLimitExceeded(f"{self.name} rate limit: no token within {RATE_LIMIT_MAX_WAIT[priority]}s")
+            time.sleep(wait)
+
+    def capacity(self, priority=None):
+        """Calls the caller's lane could be granted now and within its maximum wait, capped by the daily budget left.
+
+        Nothing is taken, so concurrent callers may still use the tokens up
+        first; a check before starting a burst of calls, not a reservation.
+        """
+        priority = priority or upstream_priority.get()
+        usage = self.store.usage(self.name)
+        tokens = usage["tokens"] if usage["tokens"] is not None else self.burst
+        calls = int(tokens + self.rate * RATE_LIMIT_MAX_WAIT[priority])
+        if self.daily_quota:
+            calls = min(calls, self.daily_quota - usage["used_today"])
+        return max(0, calls)
+
+    def stats(self):
+        try:
+            usage = self.store.usage(self.name)
+        except Exception as e:
+            usage = {"error": str(e)}
+        lanes = {name: sum(1 for rank, _ in self._queue if rank == r) for name, r in PRIORITIES.items()}
+        return {
+            **self._stats,
+            **usage,
+            "qps": self.rate,
+            "burst": self.burst,
+            "daily_quota": self.daily_quota,
+            "queued": lanes,
+        }
+
+
+def _create_store():
+    if RATE_LIMIT_BACKEND == "off":
+        return None
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryBucketStore()
+    try:
+        return SQLiteBucketStore()
+    except Exception as e:
+        logging.error(f"Rate limit store at {RATE_LIMIT_PATH} unavailable, limiting per process: {e}")
+        return MemoryBucketStore()
+
+
+_store = _create_store()
+
+tomtom_limiter = ProviderLimiter("tomtom", TOMTOM_QPS, TOMTOM_BURST, TOMTOM_DAILY_QUOTA, _store) if _store else None
+openweather_limiter = ProviderLimiter("openweather", OPENWEATHER_QPS, OPENWEATHER_BURST, OPENWEATHER_DAILY_QUOTA, _store) if _store else None
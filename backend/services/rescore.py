@@ -0,0 +1,63 @@
+import numpy as np
+from psycopg2.extras import execute_values
+from services.geo import haversine_batch_m
+from services.history_cache import history_cache
+from services.scoring import weather_severity_batch
+
+
+def rescore(conn, model, batch_size=50000, since=None, until=None, dry_run=False, on_batch=None):
+    """Recompute final_score for stored deliveries with `model`, in id order, one transaction per batch.
+
+    Distance is the straight-line distance between the stored start and
+    end points, as in /optimize; it stays neutral for rows without
+    coordinates, and temperature (not stored) always does. Rows without a
+    travel time are left as they are. `on_batch(rows so far)`
+    is called after each committed batch. Returns counts and the size of
+    the score changes.
+    """
+    clauses, params = ["id > %s"], []
+    for column, op, value in (("created_at", ">=", since), ("created_at", "<", until)):
+        if value is not None:
+            clauses.append(f"{column} {op} %s")
+            params.append(value)
+    cur = conn.cursor()
+    last_id, stats = 0, {"rows": 0, "changed": 0, "max_change": 0.0, "sum_change": 0.0}
+    while True:
+        cur.execute(
+            f"SELECT id, perishability, travel_time_sec, weather, start_lat, start_lng, end_lat, end_lng, final_score "
+            f"FROM deliveries "
+            f"WHERE {' AND '.join(clauses)} AND travel_time_sec IS NOT NULL AND perishability IS NOT NULL "
+            f"ORDER BY id LIMIT %s",
+            (last_id, *params, batch_size),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            break
+        ids, perishability, travel_time, weather, start_lat, start_lng, end_lat, end_lng, old = zip(*rows)
+        # NULL coordinates become NaN, and so does their distance
+        coordinates = (np.array(column, dtype=np.float64) for column in (start_lat, start_lng, end_lat, end_lng))
+        distance = haversine_batch_m(*coordinates)
+        scores = model.score_batch(perishability, travel_time, weather_severity_batch(weather), distance_m=distance)
+        old = np.array([np.nan if s is None else s for s in old], dtype=np.float64)
+        delta = np.abs(scores - old)
+        changed = ~np.isclose(scores, old) | np.isnan(old)
+        stats["rows"] += len(rows)
+        stats["changed"] += int(changed.sum())
+        stats["max_change"] = max(stats["max_change"], float(np.nanmax(delta, initial=0.0)))
+        stats["sum_change"] += float(np.nansum(delta))
+        if not dry_run and changed.any():
+            execute_values(
+                cur,
+                "UPDATE deliveries AS d SET final_score = v.score FROM (VALUES %s) AS v(id, score) WHERE d.id = v.id",
+                [(i, float(s)) for i, s, c in zip(ids, scores, changed) if c],
+                page_size=1000,
+            )
+        conn.commit()
+        if not dry_run and changed.any():
+            history_cache.invalidate()
+        last_id = ids[-1]
+        if on_batch:
+            on_batch(stats["rows"])
+    cur.close()
+    stats["mean_change"] = stats.pop("sum_change") / stats["rows"] if stats["rows"] else 0.0
+    return stats
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from services.metrics import upstream_call
+
+load_dotenv()
+
+# Consecutive failures that open a circuit, and how long it stays open before one probe call
+UPSTREAM_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_TIMEOUT = float(os.getenv("UPSTREAM_RESET_TIMEOUT", "30"))
+# Adaptive timeout = UPSTREAM_TIMEOUT_FACTOR x the UPSTREAM_TIMEOUT_PERCENTILE latency of the
+# last UPSTREAM_LATENCY_WINDOW calls, clamped to [UPSTREAM_TIMEOUT_MIN, the provider's timeout]
+UPSTREAM_TIMEOUT_PERCENTILE = float(os.getenv("UPSTREAM_TIMEOUT_PERCENTILE", "99"))
+UPSTREAM_TIMEOUT_FACTOR = float(os.getenv("UPSTREAM_TIMEOUT_FACTOR", "2"))
+UPSTREAM_TIMEOUT_MIN = float(os.getenv("UPSTREAM_TIMEOUT_MIN", "1"))
+UPSTREAM_LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "200"))
+UPSTREAM_LATENCY_MIN_SAMPLES = 5
+# How long a last known good value may be served as "stale"
+UPSTREAM_STALE_TTL = float(os.getenv("UPSTREAM_STALE_TTL", "86400"))
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class UpstreamError(Exception):
+    pass
+
+
+def _is_failure(response):
+    # 4xx other than 429 means our request was bad, not that the upstream is unhealthy
+    status = getattr(response, "status_code", 200)
+    return status >= 500 or status == 429
+
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker with an adaptive call timeout.
+
+    closed: calls go through; `failure_threshold` consecutive failures open it.
+    open: calls are rejected with CircuitOpenError for `reset_timeout` seconds.
+    half_open: a single probe call is let through; success closes the
+    circuit, failure opens it again.
+
+    Failures are exceptions (including timeouts) and 5xx/429 responses.
+    Latencies of successful calls set the adaptive timeout; half-open probes
+    always get the full `max_timeout`, so an upstream that recovers slower
+    than before can still close the circuit.
+    """
+
+    def __init__(self, name, max_timeout, failure_threshold=UPSTREAM_FAILURE_THRESHOLD,
+                 reset_timeout=UPSTREAM_RESET_TIMEOUT, min_timeout=UPSTREAM_TIMEOUT_MIN,
+                 percentile=UPSTREAM_TIMEOUT_PERCENTILE, factor=UPSTREAM_TIMEOUT_FACTOR,
+                 window=UPSTREAM_LATENCY_WINDOW, clock=time.monotonic):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.percentile = percentile
+        self.factor = factor
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        """True if a call may go out now; in half-open state only one probe at a time is allowed"""
+        with self._lock:
+            if self.state == "open":
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    self._stats["rejected"] += 1
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    self._stats["rejected"] += 1
+                    return False
+                self._probing = True
+            self._stats["calls"] += 1
+            return True
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a probe through (0 when it already would)"""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def record_success(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self._stats["successes"] += 1
+            self._failures = 0
+            self.state = "closed"
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self._stats["opened"] += 1
+                self.state = "open"
+                self._opened_at = self._clock()
+
+    def _release(self):
+        # A cancelled or rate-limited call tells us nothing about the upstream
+        with self._lock:
+            self._probing = False
+
+    def latency(self, percentile=50):
+        """Seconds at `percentile` of recent successful calls, or None with too few samples"""
+        with self._lock:
+            if len(self._latencies) < UPSTREAM_LATENCY_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def timeout(self):
+        with self._lock:
+            if self.state != "closed" or len(self._latencies) < UPSTREAM_LATENCY_MIN_SAMPLES:
+                return self.max_timeout
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return min(self.max_timeout, max(self.min_timeout, ordered[index] * self.factor))
+
+    def _check(self, response, started):
+        if _is_failure(response):
+            self.record_failure()
+            raise UpstreamError(f"{self.name} returned HTTP {response.status_code}")
+        self.record_success(time.perf_counter() - started)
+        return response
+
+    def call(self, fn, limiter=None):
+        """Run fn(timeout) through the breaker; raises CircuitOpenError without calling fn when open.
+
+        With a `limiter` (services.rate_limit), a token is taken only once the
+        circuit lets the call through, so rejected calls never spend quota.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if limiter is not None:
+            try:
+                limiter.acquire_sync()
+            except Exception:
+                self._release()
+                raise
+        started = time.perf_counter()
+        with upstream_call(self.name):
+            try:
+                response = fn(self.timeout())
+            except Exception:
+                self.record_failure()
+                raise
+            return self._check(response, started)
+
+    async def call_async(self, fn, limiter=None):
+        """Async variant of call; fn(timeout) must return an awaitable"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        if limiter is not None:
+            try:
+                await limiter.acquire()
+            except BaseException:
+                self._release()
+                raise
+        started = time.perf_counter()
+        with upstream_call(self.name):
+            try:
+                response = await fn(self.timeout())
+            except asyncio.CancelledError:
+                self._release()
+                raise
+            except Exception:
+                self.record_failure()
+                raise
+            return self._check(response, started)
+
+    def stats(self):
+        timeout = self.timeout()
+        with self._lock:
+            return {
+                **self._stats,
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "timeout_sec": round(timeout, 3),
+                "latency_samples": len(self._latencies),
+            }
+
+
+class Revalidator:
+    """Background refreshes for values served stale while a circuit is open.
+
+    At most one refresh per key is pending; each waits until the circuit
+    would let a probe through, so the refresh doubles as the half-open probe.
+    """
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self._pending = {}
+
+    def schedule(self, key, refresh):
+        """Run `await refresh()` in the background once the circuit allows a probe"""
+        if key in self._pending:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sync callers just serve stale until the next async lookup
+        self._pending[key] = loop.create_task(self._run(key, refresh))
+
+    async def _run(self, key, refresh):
+        try:
+            await asyncio.sleep(self.breaker.retry_in())
+            await refresh()
+        except Exception:
+            pass  # the lookup already logged it
+        finally:
+            self._pending.pop(key, None)
+
+    def __len__(self):
+        return len(self._pending)
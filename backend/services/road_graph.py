@@ -0,0 +1,169 @@
+import heapq
+import json
+import math
+import os
+import threading
+from dotenv import load_dotenv
+import logging
+import numpy as np
+from services.geo import haversine_m, parse_point
+
+load_dotenv()
+
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH")  # directory written by build_road_graph.py
+ROAD_GRAPH_SNAP_MAX_M = float(os.getenv("ROAD_GRAPH_SNAP_MAX_M", "2000"))  # max distance from a point to its road node
+
+GRAPH_ARRAYS = (
+    "node_lat", "node_lon",
+    "fwd_indptr", "fwd_indices", "fwd_weights",
+    "rev_indptr", "rev_indices", "rev_weights",
+    "grid_keys", "grid_indptr", "grid_nodes",
+)
+
+
+def grid_key(ilat, ilon):
+    """Pack integer grid cell coordinates into one sortable int64"""
+    return (np.int64(ilat) + 2**20) * 2**21 + (np.int64(ilon) + 2**20)
+
+
+class RoadGraph:
+    """Directed road graph in CSR form, answering shortest travel time queries.
+
+    All arrays are .npy files opened with mmap_mode="r", so loading is
+    cheap and every worker process shares the same page cache. Forward and
+    reverse adjacency are both stored so queries can run bidirectional A*.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.cell_deg = self.meta["cell_deg"]
+        self.max_speed = self.meta["max_speed_mps"]  # keeps the A* heuristic admissible
+        self.node_count = len(self.node_lat)
+
+    def nearest_node(self, lat, lng, max_distance_m=ROAD_GRAPH_SNAP_MAX_M):
+        """Closest node to (lat, lng) using the uniform grid index, or None if nothing is in range"""
+        ilat = math.floor(lat / self.cell_deg)
+        ilon = math.floor(lng / self.cell_deg)
+        best, best_d = None, max_distance_m
+        max_ring = max(1, math.ceil(max_distance_m / (self.cell_deg * 111000)))
+        for ring in range(max_ring + 1):
+            for dlat in range(-ring, ring + 1):
+                for dlon in range(-ring, ring + 1):
+                    if max(abs(dlat), abs(dlon)) != ring:
+                        continue
+                    key = grid_key(ilat + dlat, ilon + dlon)
+                    k = int(np.searchsorted(self.grid_keys, key))
+                    if k >= len(self.grid_keys) or self.grid_keys[k] != key:
+                        continue
+                    for node in self.grid_nodes[self.grid_indptr[k]:self.grid_indptr[k + 1]].tolist():
+                        d = haversine_m(lat, lng, float(self.node_lat[node]), float(self.node_lon[node]))
+                        if d < best_d:
+                            best, best_d = node, d
+            # Anything in a further ring is at least `ring` cells away
+            if best is not None and best_d < ring * self.cell_deg * 111000 * math.cos(math.radians(lat)):
+                break
+        return best
+
+    def _neighbours(self, node, indptr, indices, weights):
+        a, b = int(indptr[node]), int(indptr[node + 1])
+        return zip(indices[a:b].tolist(), weights[a:b].tolist())
+
+    def shortest_time(self, source, target):
+        """Travel time in seconds between two nodes with bidirectional A*, or None if unreachable.
+
+        The forward search is keyed by d(v) + p(v) and the backward search by
+        d(v) - p(v), with the average potential p(v) = (h_t(v) - h_s(v)) / 2.
+        Both then run Dijkstra over the same non-negative reduced costs, so
+        the search can stop once the two frontier keys sum past the best path.
+        """
+        if source == target:
+            return 0.0
+        lat, lon, vmax = self.node_lat, self.node_lon, self.max_speed
+        s_lat, s_lon = float(lat[source]), float(lon[source])
+        t_lat, t_lon = float(lat[target]), float(lon[target])
+        potentials = {}
+
+        def p(v):
+            pv = potentials.get(v)
+            if pv is None:
+                v_lat, v_lon = float(lat[v]), float(lon[v])
+                pv = (haversine_m(v_lat, v_lon, t_lat, t_lon) - haversine_m(v_lat, v_lon, s_lat, s_lon)) / (2 * vmax)
+                potentials[v] = pv
+            return pv
+
+        dist = ({source: 0.0}, {target: 0.0})
+        done = (set(), set())
+        heaps = ([(p(source), source)], [(-p(target), target)])
+        adjacency = (
+            (self.fwd_indptr, self.fwd_indices, self.fwd_weights),
+            (self.rev_indptr, self.rev_indices, self.rev_weights),
+        )
+        signs = (1, -1)  # forward search uses p, backward search uses -p
+        best = math.inf
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            d_u = dist[side][u]
+            other = dist[1 - side]
+            sign = signs[side]
+            for v, w in self._neighbours(u, *adjacency[side]):
+                d_v = d_u + w
+                if d_v < dist[side].get(v, math.inf):
+                    dist[side][v] = d_v
+                    heapq.heappush(heaps[side], (d_v + sign * p(v), v))
+                    if v in other and d_v + other[v] < best:
+                        best = d_v + other[v]
+        return None if best == math.inf else best
+
+    def travel_time(self, start_lat, start_lng, end_lat, end_lng):
+        """Snap both points to the graph and return the shortest travel time in seconds, or None"""
+        source = self.nearest_node(start_lat, start_lng)
+        target = self.nearest_node(end_lat, end_lng)
+        if source is None or target is None:
+            return None
+        seconds = self.shortest_time(source, target)
+        return None if seconds is None else int(round(seconds))
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_graph_failed = False
+
+
+def get_road_graph():
+    """Process-wide graph from ROAD_GRAPH_PATH, loaded on first use; None if not configured or unreadable"""
+    global _graph, _graph_failed
+    if _graph is None and not _graph_failed and ROAD_GRAPH_PATH:
+        with _graph_lock:
+            if _graph is None and not _graph_failed:
+                try:
+                    _graph = RoadGraph(ROAD_GRAPH_PATH)
+                    logging.info(f"Loaded road graph from {ROAD_GRAPH_PATH}: {_graph.node_count} nodes")
+                except Exception as e:
+                    _graph_failed = True
+                    logging.error(f"Road graph at {ROAD_GRAPH_PATH} could not be loaded: {e}")
+    return _graph
+
+
+def local_travel_time(start: str, end: str):
+    """Offline travel time for two "lat,lng" strings, or None if no graph/route is available"""
+    graph = get_road_graph()
+    if graph is None:
+        return None
+    try:
+        start_lat, start_lng = parse_point(start)
+        end_lat, end_lng = parse_point(end)
+        return graph.travel_time(start_lat, start_lng, end_lat, end_lng)
+    except Exception as e:
+        logging.error(f"Local routing error for {start}:{end}: {e}")
+        return None
@@ -0,0 +1,273 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import logging
+from starlette.concurrency import run_in_threadpool
+from db import get_pool
+
+load_dotenv()
+
+# Seconds between background refreshes of the hourly rollup (0 = only on demand / from the command)
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))
+# Delivery ids folded in per transaction, so a large backfill never holds one huge transaction
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "100000"))
+
+ROLLUP_NAME = "deliveries_hourly"
+
+
+def _high_water_mark(conn):
+    """Highest delivery id below which every insert has committed or rolled back.
+
+    SHARE mode waits for transactions that are inserting into deliveries
+    (and blocks new ones) just long enough to read max(id), so no row with
+    a lower id can appear after we read it. Released at the commit.
+    """
+    cur = conn.cursor()
+    cur.execute("SET LOCAL lock_timeout = '5s'")
+    cur.execute("LOCK TABLE deliveries IN SHARE MODE")
+    cur.execute("SELECT COALESCE(max(id), 0) FROM deliveries")
+    high = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    return high
+
+
+def refresh_rollups(conn, batch_size=ROLLUP_BATCH_SIZE):
+    """Fold deliveries added since the last refresh into delivery_rollups.
+
+    Only rows with an id above the stored watermark are read (a primary key
+    range scan), aggregated per city, hour and weather, and added onto the
+    existing buckets. The watermark moves in the same transaction, and the
+    state row lock serialises refreshes from several workers, so every row
+    is counted exactly once. Rows without a created_at cannot be bucketed
+    and are skipped. Returns {"rows": folded in, "last_id": new watermark}.
+    """
+    high = _high_water_mark(conn)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO rollup_state (name, last_id) VALUES (%s, 0) ON CONFLICT (name) DO NOTHING",
+        (ROLLUP_NAME,),
+    )
+    conn.commit()
+
+    folded = 0
+    while True:
+        cur.execute("SELECT last_id FROM rollup_state WHERE name = %s FOR UPDATE", (ROLLUP_NAME,))
+        last_id = cur.fetchone()[0]
+        if last_id >= high:
+            conn.commit()
+            break
+        upper = min(high, last_id + batch_size)
+        cur.execute("""
+            WITH batch AS (
+                SELECT COALESCE(city, 'unknown') AS city, date_trunc('hour', created_at) AS bucket,
+                       COALESCE(weather, 'unknown') AS weather, count(*) AS deliveries,
+                       COALESCE(sum(travel_time_sec), 0) AS travel_time_sec_sum,
+                       count(travel_time_sec) AS travel_time_sec_count,
+                       COALESCE(sum(final_score), 0) AS final_score_sum,
+                       count(final_score) AS final_score_count
+                FROM deliveries
+                WHERE id > %s AND id <= %s AND created_at IS NOT NULL
+                GROUP BY 1, 2, 3
+            ), upserted AS (
+                INSERT INTO delivery_rollups AS r (city, bucket, weather, deliveries, travel_time_sec_sum,
+                    travel_time_sec_count, final_score_sum, final_score_count)
+                SELECT * FROM batch
+                ON CONFLICT (city, bucket, weather) DO UPDATE SET
+                    deliveries = r.deliveries + EXCLUDED.deliveries,
+                    travel_time_sec_sum = r.travel_time_sec_sum + EXCLUDED.travel_time_sec_sum,
+                    travel_time_sec_count = r.travel_time_sec_count + EXCLUDED.travel_time_sec_count,
+                    final_score_sum = r.final_score_sum + EXCLUDED.final_score_sum,
+                    final_score_count = r.final_score_count + EXCLUDED.final_score_count
+            )
+            SELECT COALESCE(sum(deliveries), 0)::bigint FROM batch
+        """, (last_id, upper))
+        folded += cur.fetchone()[0]
+        cur.execute(
+            "UPDATE rollup_state SET last_id = %s, refreshed_at = now() WHERE name = %s",
+            (upper, ROLLUP_NAME),
+        )
+        conn.commit()
+    cur.close()
+    return {"rows": folded, "last_id": high}
+
+
+def rebuild_rollups(conn, batch_size=ROLLUP_BATCH_SIZE):
+    """Drop every bucket and fold the whole deliveries table in again.
+
+    Buckets of partitions already dropped by retention are lost for good;
+    after rewriting rows, refold_rollups the affected range instead.
+    """
+    cur = conn.cursor()
+    cur.execute("LOCK TABLE rollup_state IN EXCLUSIVE MODE")
+    cur.execute("TRUNCATE delivery_rollups")
+    cur.execute("DELETE FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+    conn.commit()
+    cur.close()
+    return refresh_rollups(conn, batch_size)
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def refold_rollups(conn, since=None, until=None, step=timedelta(days=1)):
+    """Recompute the buckets between since and until from the deliveries still stored, e.g. after a rescore.
+
+    Buckets with deliveries in the range are overwritten, one `step` of
+    hours per transaction; buckets whose deliveries are gone (partitions
+    dropped by retention) keep their aggregates. Only rows at or below the
+    watermark are read, so rows not yet folded in are still left to
+    refresh_rollups. Returns {"buckets": rewritten, "last_id": watermark}.
+    """
+    clauses, params = ["created_at IS NOT NULL"], []
+    for op, value in ((">=", since), ("<", until)):
+        if value is not None:
+            clauses.append(f"created_at {op} %s")
+            params.append(value)
+    cur = conn.cursor()
+    cur.execute(f"SELECT min(created_at), max(created_at) FROM deliveries WHERE {' AND '.join(clauses)}", params)
+    first, last = cur.fetchone()
+    conn.commit()
+    buckets, last_id = 0, None
+    # Whole hours, so a bucket is never refolded from part of its deliveries
+    start = _hour(first) if first is not None else None
+    while start is not None and start <= last:
+        end = start + step
+        cur.execute("SELECT last_id FROM rollup_state WHERE name = %s FOR UPDATE", (ROLLUP_NAME,))
+        row = cur.fetchone()
+        if row is None:
+            # Nothing folded in yet; refresh_rollups will read these rows
+            conn.commit()
+            break
+        last_id = row[0]
+        cur.execute("""
+            INSERT INTO delivery_rollups AS r (city, bucket, weather, deliveries, travel_time_sec_sum,
+                travel_time_sec_count, final_score_sum, final_score_count)
+            SELECT COALESCE(city, 'unknown'), date_trunc('hour', created_at), COALESCE(weather, 'unknown'), count(*),
+                   COALESCE(sum(travel_time_sec), 0), count(travel_time_sec),
+                   COALESCE(sum(final_score), 0), count(final_score)
+            FROM deliveries
+            WHERE id <= %s AND created_at >= %s AND created_at < %s
+            GROUP BY 1, 2, 3
+            ON CONFLICT (city, bucket, weather) DO UPDATE SET
+                deliveries = EXCLUDED.deliveries,
+                travel_time_sec_sum = EXCLUDED.travel_time_sec_sum,
+                travel_time_sec_count = EXCLUDED.travel_time_sec_count,
+                final_score_sum = EXCLUDED.final_score_sum,
+                final_score_count = EXCLUDED.final_score_count
+        """, (last_id, start, end))
+        buckets += cur.rowcount
+        conn.commit()
+        start = end
+    cur.close()
+    return {"buckets": buckets, "last_id": last_id}
+
+
+def rollup_status(cur):
+    cur.execute("SELECT last_id, refreshed_at FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+    row = cur.fetchone()
+    return {"last_id": row[0], "refreshed_at": row[1]} if row else {"last_id": 0, "refreshed_at": None}
+
+
+def query_rollups(cur, granularity="hour", city=None, since=None, until=None, limit=168):
+    """Average travel time, average score and weather mix per city and bucket, newest first.
+
+    Reads only delivery_rollups, so the cost grows with the number of
+    buckets in range, not with the number of deliveries. `granularity` is
+    "hour" or "day"; daily figures are re-aggregated from the hourly sums.
+    """
+    clauses, params = [], []
+    for column, op, value in (("city", "=", city), ("bucket", ">=", since), ("bucket", "<", until)):
+        if value is not None:
+            clauses.append(f"{column} {op} %s")
+            params.append(value)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur.execute(f"""
+        WITH keys AS (
+            SELECT city, date_trunc(%s, bucket) AS bucket
+            FROM delivery_rollups {where}
+            GROUP BY 1, 2 ORDER BY 2 DESC, 1 LIMIT %s
+        )
+        SELECT r.city, keys.bucket, r.weather, sum(r.deliveries)::bigint,
+               sum(r.travel_time_sec_sum)::bigint, sum(r.travel_time_sec_count)::bigint,
+               sum(r.final_score_sum), sum(r.final_score_count)::bigint
+        FROM delivery_rollups r
+        JOIN keys ON r.city = keys.city AND date_trunc(%s, r.bucket) = keys.bucket
+        {"WHERE " + " AND ".join("r." + c for c in clauses) if clauses else ""}
+        GROUP BY 1, 2, 3
+        ORDER BY 2 DESC, 1, 4 DESC
+    """, (granularity, *params, limit, granularity, *params))
+
+    buckets = {}
+    for city_name, bucket, weather, deliveries, tt_sum, tt_count, score_sum, score_count in cur.fetchall():
+        entry = buckets.get((city_name, bucket))
+        if entry is None:
+            entry = buckets[(city_name, bucket)] = {
+                "city": city_name, "bucket": bucket, "deliveries": 0,
+                "_tt": [0, 0], "_score": [0.0, 0], "weather_mix": {},
+            }
+        entry["deliveries"] += deliveries
+        entry["_tt"][0] += tt_sum
+        entry["_tt"][1] += tt_count
+        entry["_score"][0] += score_sum
+        entry["_score"][1] += score_count
+        entry["weather_mix"][weather] = deliveries
+
+    results = []
+    for entry in buckets.values():
+        (tt_sum, tt_count), (score_sum, score_count) = entry.pop("_tt"), entry.pop("_score")
+        entry["avg_travel_time_sec"] = round(tt_sum / tt_count, 1) if tt_count else None
+        entry["avg_final_score"] = round(score_sum / score_count, 2) if score_count else None
+        results.append(entry)
+    return results
+
+
+class RollupRefresher:
+    """Background task that folds new deliveries into the rollup every ROLLUP_REFRESH_INTERVAL seconds"""
+
+    def __init__(self, interval=ROLLUP_REFRESH_INTERVAL):
+        self.interval = interval
+        self._task = None
+        self._stats = {"refreshes": 0, "rows": 0, "failures": 0, "last_refresh": None}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh(self):
+        result = await run_in_threadpool(self._refresh)
+        self._stats["refreshes"] += 1
+        self._stats["rows"] += result["rows"]
+        self._stats["last_refresh"] = datetime.utcnow().isoformat()
+        return result
+
+    def _refresh(self):
+        with get_pool().connection() as conn:
+            return refresh_rollups(conn)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                self._stats["failures"] += 1
+                logging.error(f"❌ Rollup refresh failed: {e}")
+
+    def stats(self):
+        return {**self._stats, "interval_sec": self.interval}
+
+
+rollup_refresher = RollupRefresher()
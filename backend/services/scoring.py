@@ -0,0 +1,144 @@
+import json
+import os
+from dataclasses import dataclass, replace
+import numpy as np
+
+# Bad weather on a leg multiplies its score by 1 + WEATHER_SEVERITY_WEIGHT * severity (0..1)
+WEATHER_SEVERITY_WEIGHT = float(os.getenv("WEATHER_SEVERITY_WEIGHT", "0.5"))
+# Cost model used for new scores (see MODELS), and optional JSON overrides of its weights,
+# e.g. SCORING_MODEL_PARAMS='{"heat_weight": 0.05}'. Defaults to the original formula so stored
+# scores stay comparable; switch to "weather" or "cold_chain" here and rescore history to match
+SCORING_MODEL = os.getenv("SCORING_MODEL", "legacy")
+SCORING_MODEL_PARAMS = os.getenv("SCORING_MODEL_PARAMS")
+
+# Substrings of OpenWeather descriptions and how bad they are for a refrigerated leg
+_SEVERITY = (
+    ("thunderstorm", 1.0), ("tornado", 1.0), ("squall", 1.0),
+    ("snow", 0.9), ("sleet", 0.9),
+    ("heavy", 0.8), ("extreme", 0.8),
+    ("rain", 0.6), ("shower", 0.6),
+    ("drizzle", 0.4),
+    ("fog", 0.3), ("mist", 0.3), ("dust", 0.3), ("sand", 0.3),
+    ("haze", 0.2), ("smoke", 0.2),
+    ("cloud", 0.1),
+)
+
+
+def weather_severity(description):
+    """0 (clear or unknown) to 1 (thunderstorm) for an OpenWeather description"""
+    description = (description or "").lower()
+    return max((severity for word, severity in _SEVERITY if word in description), default=0.0)
+
+
+def weather_severity_batch(descriptions):
+    """weather_severity over many descriptions; each distinct description is classified once"""
+    if not isinstance(descriptions, list):
+        descriptions = list(descriptions)
+    table = {d: weather_severity(d) for d in set(descriptions)}
+    return np.array([table[d] for d in descriptions], dtype=np.float64)
+
+
+def _array(values, n):
+    """float64 array of length n; None (or None entries) become NaN, i.e. "not known" """
+    if values is None:
+        return np.full(n, np.nan)
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return values
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """Score = perishability x (travel minutes + distance_weight x km) x weather factor x heat factor.
+
+    weather factor = 1 + weather_weight x severity (0..1)
+    heat factor    = 1 + heat_weight x degrees C above heat_threshold_c
+
+    Every input is a NumPy array, so one leg and a 100k-row batch take the
+    same path. Unknown inputs (None or NaN) leave their factor at 1, so a
+    failed weather lookup scores like clear, mild weather. Subclass and
+    override `cost` for a different formula, then `register_model` it.
+    """
+
+    name: str
+    weather_weight: float = 0.0
+    heat_weight: float = 0.0
+    heat_threshold_c: float = 25.0
+    distance_weight: float = 0.0  # extra minutes per km of leg distance
+
+    def cost(self, perishability, travel_min, severity, temperature_c, distance_km):
+        minutes = travel_min
+        if self.distance_weight:
+            minutes = minutes + self.distance_weight * np.nan_to_num(distance_km)
+        scores = perishability * minutes
+        if self.weather_weight:
+            scores = scores * (1 + self.weather_weight * np.nan_to_num(severity))
+        if self.heat_weight:
+            excess = np.clip(np.nan_to_num(temperature_c - self.heat_threshold_c, nan=0.0), 0, None)
+            scores = scores * (1 + self.heat_weight * excess)
+        return scores
+
+    def score_batch(self, perishability, travel_time_sec, weather_severity=None, temperature_c=None, distance_m=None):
+        perishability = np.asarray(perishability, dtype=np.float64)
+        n = perishability.shape[0]
+        travel_min = np.asarray(travel_time_sec, dtype=np.float64) / 60
+        return self.cost(
+            perishability,
+            travel_min,
+            _array(weather_severity, n),
+            _array(temperature_c, n),
+            _array(distance_m, n) / 1000,
+        )
+
+
+MODELS = {}
+
+
+def register_model(model):
+    MODELS[model.name] = model
+    return model
+
+
+# The original demo score: perishability x travel minutes
+register_model(CostModel("legacy"))
+# legacy with the weather factor, as used for corridor-sampled legs
+register_model(CostModel("weather", weather_weight=WEATHER_SEVERITY_WEIGHT))
+# Refrigerated legs: weather, heat above 25 C (+2% per degree) and distance (+0.25 min per km)
+register_model(CostModel(
+    "cold_chain", weather_weight=WEATHER_SEVERITY_WEIGHT, heat_weight=0.02, heat_threshold_c=25.0, distance_weight=0.25,
+))
+
+
+def get_model(name=None):
+    """The named cost model, or SCORING_MODEL with SCORING_MODEL_PARAMS applied; raises ValueError if unknown"""
+    if name is not None and name != SCORING_MODEL:
+        if name not in MODELS:
+            raise ValueError(f"Unknown scoring model {name!r}; known: {sorted(MODELS)}")
+        return MODELS[name]
+    return _default_model()
+
+
+_default = None
+
+
+def _default_model():
+    global _default
+    if _default is None:
+        if SCORING_MODEL not in MODELS:
+            raise ValueError(f"Unknown SCORING_MODEL {SCORING_MODEL!r}; known: {sorted(MODELS)}")
+        model = MODELS[SCORING_MODEL]
+        _default = replace(model, **json.loads(SCORING_MODEL_PARAMS)) if SCORING_MODEL_PARAMS else model
+    return _default
+
+
+def score_batch(perishability, travel_time_sec, weather_severity=None, temperature_c=None, distance_m=None, model=None):
+    """Score many legs in one vectorized pass with `model` (default: the configured model)"""
+    return get_model(model).score_batch(perishability, travel_time_sec, weather_severity, temperature_c, distance_m)
+
+
+def score(perishability, travel_time_sec, weather_severity=None, temperature_c=None, distance_m=None, model=None):
+    """Score a single leg with the same code path as score_batch"""
+    wrap = lambda value: None if value is None else [value]
+    return float(score_batch(
+        [perishability], [travel_time_sec], wrap(weather_severity), wrap(temperature_c), wrap(distance_m), model,
+    )[0])
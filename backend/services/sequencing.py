@@ -0,0 +1,192 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Each drop's arrival time is weighted by 1 + PERISHABILITY_WEIGHT * perishability,
+# so highly perishable drops are pulled towards the front of the route
+PERISHABILITY_WEIGHT = float(os.getenv("PERISHABILITY_WEIGHT", "0.5"))
+# Cost per second of arriving after a drop's window closes, on top of its weight
+LATE_PENALTY = float(os.getenv("LATE_PENALTY", "10"))
+# Local search only tries moves towards each stop's nearest neighbours
+NEIGHBOURS = int(os.getenv("SEQUENCING_NEIGHBOURS", "12"))
+
+
+@dataclass
+class SequenceResult:
+    order: List[int]               # drop indices (1-based matrix rows) in visiting order
+    arrivals: List[float]          # arrival time in seconds from departure, per visited drop
+    lateness: List[float]          # seconds past each drop's window end
+    objective: float
+    construction_objective: float
+    total_travel_time: float
+    iterations: int = 0
+    timed_out: bool = False
+    elapsed_ms: float = 0.0
+    moves: dict = field(default_factory=dict)
+
+
+class _Instance:
+    def __init__(self, matrix, weights, window_start, window_end):
+        self.m = matrix
+        self.w = weights
+        self.ws = window_start
+        self.we = window_end
+
+    def cost(self, route):
+        m, w, ws, we = self.m, self.w, self.ws, self.we
+        t = 0.0
+        prev = 0
+        total = 0.0
+        for s in route:
+            t += m[prev][s]
+            if t < ws[s]:
+                t = ws[s]
+            late = t - we[s]
+            if late > 0:
+                total += late * LATE_PENALTY * w[s]
+            total += w[s] * t
+            prev = s
+        return total
+
+    def schedule(self, route):
+        m, ws, we = self.m, self.ws, self.we
+        t = 0.0
+        prev = 0
+        travel = 0.0
+        arrivals, lateness = [], []
+        for s in route:
+            t += m[prev][s]
+            travel += m[prev][s]
+            if t < ws[s]:
+                t = ws[s]
+            arrivals.append(t)
+            lateness.append(max(0.0, t - we[s]))
+            prev = s
+        return arrivals, lateness, travel
+
+
+def _construct(inst, n):
+    """Weighted nearest neighbour: next stop minimises (time until service) / weight"""
+    m, w, ws = inst.m, inst.w, inst.ws
+    remaining = set(range(1, n + 1))
+    route = []
+    prev = 0
+    t = 0.0
+    while remaining:
+        row = m[prev]
+        best, best_key, best_t = None, None, None
+        for s in remaining:
+            arrive = t + row[s]
+            if arrive < ws[s]:
+                arrive = ws[s]
+            key = (arrive - t) / w[s]
+            if best_key is None or key < best_key:
+                best, best_key, best_t = s, key, arrive
+        route.append(best)
+        remaining.discard(best)
+        prev, t = best, best_t
+    return route
+
+
+def _neighbours(inst, n, k):
+    m = inst.m
+    near = [[] for _ in range(n + 1)]
+    for a in range(1, n + 1):
+        row = m[a]
+        others = sorted((row[b] + m[b][a], b) for b in range(1, n + 1) if b != a)
+        near[a] = [b for _, b in others[:k]]
+    return near
+
+
+def _local_search(inst, route, deadline, result):
+    """First-improvement 2-opt and Or-opt over neighbour lists until no move helps or time runs out"""
+    n = len(route)
+    near = _neighbours(inst, n, NEIGHBOURS)
+    best = inst.cost(route)
+    improved = True
+    while improved:
+        improved = False
+        result.iterations += 1
+        pos = {s: i for i, s in enumerate(route)}
+
+        # 2-opt: reverse route[i..j] so that route[i] ends up next to a neighbour of route[i-1]
+        for i in range(n - 1):
+            a = route[i - 1] if i > 0 else None
+            for b in (near[a] if a is not None else near[route[0]]):
+                j = pos[b]
+                if j <= i:
+                    continue
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                c = inst.cost(candidate)
+                if c < best - 1e-9:
+                    route, best, improved = candidate, c, True
+                    pos = {s: k for k, s in enumerate(route)}
+                    result.moves["2opt"] = result.moves.get("2opt", 0) + 1
+                if time.perf_counter() > deadline:
+                    result.timed_out = True
+                    return route, best
+
+        # Or-opt: move a segment of 1-3 stops right after one of its head's neighbours
+        for length in (1, 2, 3):
+            i = 0
+            while i + length <= len(route):
+                segment = route[i:i + length]
+                rest = route[:i] + route[i + length:]
+                for b in near[segment[0]]:
+                    if b in segment:
+                        continue
+                    p = rest.index(b) + 1
+                    candidate = rest[:p] + segment + rest[p:]
+                    c = inst.cost(candidate)
+                    if c < best - 1e-9:
+                        route, best, improved = candidate, c, True
+                        result.moves["oropt"] = result.moves.get("oropt", 0) + 1
+                        break
+                if time.perf_counter() > deadline:
+                    result.timed_out = True
+                    return route, best
+                i += 1
+    return route, best
+
+
+def solve_sequence(matrix, perishability, window_start: Optional[List[Optional[float]]] = None,
+                   window_end: Optional[List[Optional[float]]] = None, time_budget: float = 0.8):
+    """Order the drops of a single-vehicle route starting at the depot.
+
+    `matrix` is an (n+1)x(n+1) travel-time table (seconds) where row/column
+    0 is the depot and 1..n are the drops; `perishability` and the optional
+    time windows (seconds after departure) are per drop, in the same order.
+    The route is built with a weighted nearest-neighbour heuristic and then
+    improved with 2-opt and Or-opt until no move helps or `time_budget`
+    seconds have passed since the call started.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget
+    n = len(perishability)
+    if n == 0:
+        return SequenceResult([], [], [], 0.0, 0.0, 0.0)
+
+    window_start = window_start or [None] * n
+    window_end = window_end or [None] * n
+    weights = [1.0] + [1.0 + PERISHABILITY_WEIGHT * max(0, p) for p in perishability]
+    ws = [0.0] + [float(v) if v is not None else 0.0 for v in window_start]
+    we = [float("inf")] + [float(v) if v is not None else float("inf") for v in window_end]
+    rows = [list(r) for r in matrix]
+    inst = _Instance(rows, weights, ws, we)
+
+    route = _construct(inst, n)
+    construction_objective = inst.cost(route)
+    result = SequenceResult([], [], [], construction_objective, construction_objective, 0.0)
+    if n > 1:
+        # With two drops this is just trying the reverse order, which time windows can need
+        route, _ = _local_search(inst, route, deadline, result)
+
+    arrivals, lateness, travel = inst.schedule(route)
+    result.order = route
+    result.arrivals = arrivals
+    result.lateness = lateness
+    result.objective = inst.cost(route)
+    result.total_travel_time = travel
+    result.elapsed_ms = (time.perf_counter() - started) * 1000
+    return result
@@ -0,0 +1,104 @@
+import asyncio
+import os
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", "10"))
+SINGLEFLIGHT_TRACKED_KEYS = int(os.getenv("SINGLEFLIGHT_TRACKED_KEYS", "1000"))
+
+
+class _Flight:
+    """One in-flight call and how many callers are waiting on it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent async calls that share a key into one in-flight call.
+
+    The first caller for a key (the leader) starts the call in its own task;
+    callers arriving while it is in flight wait for the same result or
+    exception, for at most `wait_timeout` seconds (asyncio.TimeoutError
+    after that). A caller that is cancelled or times out only stops waiting;
+    the call itself is cancelled once nobody is waiting on it. Nothing is
+    remembered once the call finishes, caching is a separate layer.
+    """
+
+    def __init__(self, name, wait_timeout=SINGLEFLIGHT_WAIT_TIMEOUT, tracked_keys=SINGLEFLIGHT_TRACKED_KEYS):
+        self.name = name
+        self.wait_timeout = wait_timeout
+        self.tracked_keys = tracked_keys
+        self._inflight = {}  # key -> _Flight
+        self._per_key = OrderedDict()  # key -> [leader calls, coalesced waiters], most recent last
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _count(self, key, index):
+        counts = self._per_key.get(key)
+        if counts is None:
+            counts = self._per_key[key] = [0, 0]
+            if len(self._per_key) > self.tracked_keys:
+                self._per_key.popitem(last=False)
+        else:
+            self._per_key.move_to_end(key)
+        counts[index] += 1
+
+    async def do(self, key, fn):
+        """Return the result of `await fn()`, sharing it with concurrent callers of the same key"""
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            self._count(key, 1)
+            try:
+                return await self._wait(key, flight, self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+
+        flight = _Flight(asyncio.ensure_future(fn()))
+        self._inflight[key] = flight
+        self.leaders += 1
+        self._count(key, 0)
+        flight.task.add_done_callback(lambda task: self._finished(key, flight))
+        return await self._wait(key, flight, None)
+
+    async def _wait(self, key, flight, timeout):
+        flight.waiters += 1
+        try:
+            # shield: one caller being cancelled or timing out must not cancel the call the others share
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if flight.waiters == 1 and not flight.task.done():
+                # Nobody else wants the result; callers arriving from now on start a new call
+                flight.task.cancel()
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finished(self, key, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Also marks the exception retrieved when nobody was waiting any more
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            self.errors += 1
+
+    def stats(self, top=20):
+        hottest = sorted(self._per_key.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "waiter_timeouts": self.timeouts,
+            "errors": self.errors,
+            "top_keys": [{"key": str(k), "calls": c[0], "coalesced": c[1]} for k, c in hottest],
+        }
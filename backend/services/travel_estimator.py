@@ -0,0 +1,277 @@
+import asyncio
+import math
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+import logging
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from db import DB_TIMEZONE, get_pool
+from services.geo import haversine_batch_m, haversine_m
+
+load_dotenv()
+
+# Origin and destination are bucketed into grid cells of this many degrees (0.01 ~ 1.1 km;
+# at least _MIN_CELL_DEG, about 0.0055)
+TRAVEL_ESTIMATOR_CELL_DEG = float(os.getenv("TRAVEL_ESTIMATOR_CELL_DEG", "0.01"))
+# History used to build the profiles, newest first
+TRAVEL_ESTIMATOR_WINDOW_DAYS = int(os.getenv("TRAVEL_ESTIMATOR_WINDOW_DAYS", "90"))
+TRAVEL_ESTIMATOR_MAX_ROWS = int(os.getenv("TRAVEL_ESTIMATOR_MAX_ROWS", "1000000"))
+# Observations a profile needs before it is used on its own
+TRAVEL_ESTIMATOR_MIN_SAMPLES = int(os.getenv("TRAVEL_ESTIMATOR_MIN_SAMPLES", "3"))
+# Answer without calling TomTom at or above this confidence
+TRAVEL_ESTIMATOR_MIN_CONFIDENCE = float(os.getenv("TRAVEL_ESTIMATOR_MIN_CONFIDENCE", "0.8"))
+# Answer instead of waiting on a slow or failing TomTom at or above this confidence
+TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE = float(os.getenv("TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE", "0.5"))
+# TomTom counts as slow when its median latency, or the call in flight, passes this
+TRAVEL_ESTIMATOR_SLOW_MS = float(os.getenv("TRAVEL_ESTIMATOR_SLOW_MS", "1500"))
+# Seconds between profile rebuilds from deliveries while the app runs (0 = off)
+TRAVEL_ESTIMATOR_REFRESH_INTERVAL = float(os.getenv("TRAVEL_ESTIMATOR_REFRESH_INTERVAL", "3600"))
+
+# Sources whose travel times are fresh TomTom answers. "cached" and "stale" rows repeat
+# an earlier live answer and would count one reading as several samples; estimates,
+# the road graph and fallback values are models or placeholders and would only echo themselves
+OBSERVED_SOURCES = ("live",)
+_MIN_DISTANCE_M = 100.0
+# Prior on the spread of log pace (sigma 0.3, worth two observations), so a
+# profile built from one or two trips is never trusted much
+_PRIOR_VAR, _PRIOR_N = 0.09, 2
+# Added to the expected error when the hour of week is too sparse and a
+# coarser profile answers: same hour any day, any time, neighbouring cells
+_LEVEL_PENALTY = {"hour_of_week": 0.0, "hour_of_day": 0.05, "any_time": 0.15, "neighbours": 0.3}
+
+
+@dataclass(frozen=True)
+class TravelEstimate:
+    travel_time_sec: int
+    confidence: float  # ~ 1 - expected relative error, 0..1
+    samples: int
+    level: str  # which profile answered, see _LEVEL_PENALTY
+
+
+def _cell(value, cell_deg):
+    # The epsilon keeps round inputs such as 19.07 in the cell they name (19.07 / 0.01 = 1906.9999...)
+    return math.floor(value / cell_deg + 1e-9)
+
+
+# Smallest cell whose indexes fit _pair_id: +-90 degrees of latitude in 15 bits, +-180 of longitude in 16
+# (one cell short of 2**15, so the +90 and +180 edges still fit)
+_MIN_CELL_DEG = 180 / (2**15 - 1)
+
+
+def _valid(lat, lng):
+    return -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+def _pair_id(o_lat, o_lng, d_lat, d_lng):
+    # Four cell indexes packed into one int (15 + 16 bits per point, 62 in all); ints or int64 arrays
+    return (((o_lat + 2**14) << 16 | (o_lng + 2**15)) << 31) | ((d_lat + 2**14) << 16 | (d_lng + 2**15))
+
+
+def _group(keys, values, min_samples):
+    """{key: (n, mean, variance)} of values per key, for keys with at least min_samples values"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    n = np.bincount(inverse)
+    mean = np.bincount(inverse, weights=values) / n
+    var = np.maximum(np.bincount(inverse, weights=values * values) / n - mean * mean, 0.0)
+    keep = n >= min_samples
+    return dict(zip(unique[keep].tolist(), zip(n[keep].tolist(), mean[keep].tolist(), var[keep].tolist())))
+
+
+def _pool(groups):
+    """Combine (n, mean, variance) groups into one"""
+    total = sum(n for n, _, _ in groups)
+    mean = sum(n * m for n, m, _ in groups) / total
+    var = sum(n * (v + (m - mean) ** 2) for n, m, v in groups) / total
+    return total, mean, var
+
+
+class TravelTimeEstimator:
+    """Travel times from delivery history, by origin/destination grid cell and hour of week.
+
+    Each observed leg becomes a pace (seconds per metre of straight-line
+    distance, on a log scale), so legs anywhere within the same pair of
+    cells share a profile and the estimate scales with the exact distance.
+    Profiles are kept for the hour of week (smoothed over the neighbouring
+    hours), the hour of day across all days and the pair as a whole; a
+    lookup uses the most specific one with TRAVEL_ESTIMATOR_MIN_SAMPLES
+    observations, then pools the neighbouring cell pairs. A lookup is a
+    few dict probes.
+
+    The confidence is exp(-expected relative error), from the spread of the
+    profile shrunk towards a wide prior and the number of observations.
+    """
+
+    def __init__(self, cell_deg=TRAVEL_ESTIMATOR_CELL_DEG, min_samples=TRAVEL_ESTIMATOR_MIN_SAMPLES,
+                 timezone=DB_TIMEZONE):
+        if not cell_deg >= _MIN_CELL_DEG:
+            # Finer cells would overflow their _pair_id fields and mix unrelated pairs
+            raise ValueError(f"TRAVEL_ESTIMATOR_CELL_DEG must be at least {_MIN_CELL_DEG:.5f} degrees, got {cell_deg}")
+        self.cell_deg = cell_deg
+        self.min_samples = min_samples
+        self._tz = ZoneInfo(timezone)
+        # (pairs, hour_of_week, hour_of_day, any_time), replaced as a whole on rebuild:
+        #   pairs:        _pair_id -> pair index, for every cell pair seen at least once
+        #   hour_of_week: pair index * 168 + hour of week -> (n, mean log pace, variance)
+        #   hour_of_day:  pair index * 24 + hour of day -> (n, mean log pace, variance)
+        #   any_time:     pair index -> (n, mean log pace, variance)
+        self._profiles = ({}, {}, {}, {})
+        self._stats = {"rows": 0, "pairs": 0, "built_at": None, "build_sec": None,
+                       "lookups": 0, "answered": 0}
+
+    def __len__(self):
+        return self._stats["rows"]
+
+    def build(self, start_lat, start_lng, end_lat, end_lng, travel_time_sec, hour_of_week):
+        """Replace the profiles with ones built from these observations (equal-length sequences)"""
+        started = time.perf_counter()
+        start_lat, start_lng, end_lat, end_lng, travel = (
+            np.asarray(column, dtype=np.float64) for column in (start_lat, start_lng, end_lat, end_lng, travel_time_sec)
+        )
+        how = np.asarray(hour_of_week, dtype=np.int64)
+        ok = (
+            (np.abs(start_lat) <= 90) & (np.abs(start_lng) <= 180) & (np.abs(end_lat) <= 90) & (np.abs(end_lng) <= 180)
+            & (travel > 0)
+        )
+        start_lat, start_lng, end_lat, end_lng, travel, how = (
+            column[ok] for column in (start_lat, start_lng, end_lat, end_lng, travel, how)
+        )
+
+        cells = [np.floor(column / self.cell_deg + 1e-9).astype(np.int64) for column in (start_lat, start_lng, end_lat, end_lng)]
+        pair_ids, pair = np.unique(_pair_id(*cells), return_inverse=True)
+        log_pace = np.log(travel / np.maximum(haversine_batch_m(start_lat, start_lng, end_lat, end_lng), _MIN_DISTANCE_M))
+
+        # Each trip also counts for the hour before and after, which smooths the
+        # profile across hour boundaries; same for the hour-of-day profile
+        shifts = (-1, 0, 1)
+        hod = how % 24
+        hour_of_week = _group(
+            np.concatenate([pair * 168 + (how + s) % 168 for s in shifts]), np.tile(log_pace, 3), self.min_samples
+        )
+        hour_of_day = _group(
+            np.concatenate([pair * 24 + (hod + s) % 24 for s in shifts]), np.tile(log_pace, 3), self.min_samples
+        )
+        any_time = _group(pair, log_pace, 1)
+
+        # One assignment, so concurrent lookups see either the old profiles or the new ones
+        self._profiles = (dict(zip(pair_ids.tolist(), range(len(pair_ids)))), hour_of_week, hour_of_day, any_time)
+        self._stats.update(
+            rows=int(len(travel)), pairs=len(any_time), built_at=datetime.now(self._tz).isoformat(),
+            build_sec=round(time.perf_counter() - started, 3),
+        )
+
+    def load(self, conn, window_days=TRAVEL_ESTIMATOR_WINDOW_DAYS, max_rows=TRAVEL_ESTIMATOR_MAX_ROWS):
+        """Rebuild from the newest observed legs in deliveries; returns the number of rows used"""
+        since = datetime.now(self._tz).replace(tzinfo=None) - timedelta(days=window_days)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT start_lat, start_lng, end_lat, end_lng, travel_time_sec,
+                   ((EXTRACT(ISODOW FROM created_at)::int - 1) * 24 + EXTRACT(HOUR FROM created_at)::int)
+            FROM deliveries
+            WHERE created_at >= %s AND travel_time_source IN %s
+              AND start_lat IS NOT NULL AND end_lat IS NOT NULL AND travel_time_sec > 0
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (since, OBSERVED_SOURCES, max_rows))
+        rows = cur.fetchall()
+        conn.rollback()
+        cur.close()
+        columns = list(zip(*rows)) if rows else [[]] * 6
+        self.build(*columns)
+        return len(rows)
+
+    def estimate(self, start_lat, start_lng, end_lat, end_lng, when=None):
+        """TravelEstimate for one leg at `when` (default: now, in DB_TIMEZONE), or None without history"""
+        self._stats["lookups"] += 1
+        pairs, hour_of_week, hour_of_day, any_time = self._profiles
+        if not pairs or not (_valid(start_lat, start_lng) and _valid(end_lat, end_lng)):
+            return None
+        cell = self.cell_deg
+        o_lat, o_lng, d_lat, d_lng = _cell(start_lat, cell), _cell(start_lng, cell), _cell(end_lat, cell), _cell(end_lng, cell)
+        pair = pairs.get(_pair_id(o_lat, o_lng, d_lat, d_lng))
+        when = when or datetime.now(self._tz)
+
+        stats = None
+        if pair is not None:
+            stats, level = hour_of_week.get(pair * 168 + when.weekday() * 24 + when.hour), "hour_of_week"
+            if stats is None:
+                stats, level = hour_of_day.get(pair * 24 + when.hour), "hour_of_day"
+            if stats is None and any_time[pair][0] >= self.min_samples:
+                stats, level = any_time[pair], "any_time"
+        if stats is None:
+            near = [
+                any_time[pairs[key]]
+                for key in (
+                    _pair_id(o_lat + a, o_lng + b, d_lat + c, d_lng + d)
+                    for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1) for d in (-1, 0, 1)
+                )
+                if key in pairs
+            ]
+            if not near:
+                return None
+            stats, level = _pool(near), "neighbours"
+
+        n, mean, var = stats
+        shrunk = (var * n + _PRIOR_VAR * _PRIOR_N) / (n + _PRIOR_N)
+        expected_error = math.sqrt(shrunk * (1 + 1 / n)) + _LEVEL_PENALTY[level]
+        distance = max(haversine_m(start_lat, start_lng, end_lat, end_lng), _MIN_DISTANCE_M)
+        self._stats["answered"] += 1
+        return TravelEstimate(round(math.exp(mean) * distance), round(math.exp(-expected_error), 3), int(n), level)
+
+    def stats(self):
+        return {
+            **self._stats,
+            "profiles": {"hour_of_week": len(self._profiles[1]), "hour_of_day": len(self._profiles[2])},
+            "cell_deg": self.cell_deg,
+            "min_confidence": TRAVEL_ESTIMATOR_MIN_CONFIDENCE,
+            "fallback_confidence": TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE,
+        }
+
+
+class EstimatorRefresher:
+    """Background task that rebuilds travel_estimator from deliveries every `interval` seconds"""
+
+    def __init__(self, estimator, interval=TRAVEL_ESTIMATOR_REFRESH_INTERVAL):
+        self.estimator = estimator
+        self.interval = interval
+        self._task = None
+        self._stats = {"refreshes": 0, "failures": 0}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _refresh(self):
+        with get_pool().connection() as conn:
+            return self.estimator.load(conn)
+
+    async def _run(self):
+        while True:
+            try:
+                rows = await run_in_threadpool(self._refresh)
+                self._stats["refreshes"] += 1
+                logging.info(f"Travel time estimator rebuilt from {rows} deliveries")
+            except Exception as e:
+                self._stats["failures"] += 1
+                logging.error(f"❌ Travel time estimator refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {**self._stats, "interval_sec": self.interval, **self.estimator.stats()}
+
+
+travel_estimator = TravelTimeEstimator()
+estimator_refresher = EstimatorRefresher(travel_estimator)
@@ -0,0 +1,207 @@
+import os
+import asyncio
+from array import array
+from collections import Counter
+from dotenv import load_dotenv
+import logging
+from services.geo import haversine_m
+from services.http_client import get_client
+from services.rate_limit import RateLimitExceeded, tomtom_limiter
+from services.resilience import CircuitOpenError
+from services.road_graph import get_road_graph
+from services.travel_estimator import TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE, travel_estimator
+from services.travel_time import (
+    FALLBACK_TRAVEL_TIME, ROUTING_MODE, TOMTOM_API_KEY, TOMTOM_BASE_URL, TOMTOM_TIMEOUT, tomtom_breaker,
+)
+
+load_dotenv()
+
+# TomTom synchronous Matrix Routing v2 caps the number of cells per request
+TOMTOM_MATRIX_MAX_CELLS = int(os.getenv("TOMTOM_MATRIX_MAX_CELLS", "200"))
+TOMTOM_MATRIX_CONCURRENCY = int(os.getenv("TOMTOM_MATRIX_CONCURRENCY", "4"))
+# Cells TomTom did not answer are estimated: from delivery history for up to this many cells,
+# with the offline road graph (one A* search each) for up to TOMTOM_MATRIX_GRAPH_MAX_CELLS,
+# and otherwise from the straight-line distance at TOMTOM_MATRIX_FALLBACK_KMH
+TOMTOM_MATRIX_ESTIMATE_MAX_CELLS = int(os.getenv("TOMTOM_MATRIX_ESTIMATE_MAX_CELLS", "20000"))
+TOMTOM_MATRIX_GRAPH_MAX_CELLS = int(os.getenv("TOMTOM_MATRIX_GRAPH_MAX_CELLS", "2000"))
+TOMTOM_MATRIX_FALLBACK_KMH = float(os.getenv("TOMTOM_MATRIX_FALLBACK_KMH", "20"))
+
+
+class TravelTimeMatrix:
+    """Row-major origins x destinations travel times (seconds) in a compact int array.
+
+    Cells TomTom did not answer are flagged in `missing`; they hold
+    FALLBACK_TRAVEL_TIME until estimate_missing fills them, counting the
+    estimates per source in `estimated`.
+    """
+
+    def __init__(self, n_origins, n_destinations):
+        self.n_origins = n_origins
+        self.n_destinations = n_destinations
+        self.seconds = array("i", [FALLBACK_TRAVEL_TIME]) * (n_origins * n_destinations)
+        self.missing = bytearray(b"\x01") * (n_origins * n_destinations)
+        self.estimated = Counter()
+        self.answered = 0  # cells TomTom answered
+        self.blocks = 0
+        self.skipped = None  # why TomTom was not asked at all, if it wasn't
+
+    def set(self, i, j, seconds):
+        k = i * self.n_destinations + j
+        self.seconds[k] = int(seconds)
+        self.missing[k] = 0
+
+    def get(self, i, j):
+        return self.seconds[i * self.n_destinations + j]
+
+    def row(self, i):
+        start = i * self.n_destinations
+        return self.seconds[start:start + self.n_destinations]
+
+    def missing_count(self):
+        return sum(self.missing)
+
+    def to_lists(self):
+        return [self.row(i).tolist() for i in range(self.n_origins)]
+
+    def summary(self):
+        """How the cells were filled, for responses: TomTom answers and estimates per source"""
+        cells = self.n_origins * self.n_destinations
+        return {
+            "cells": cells,
+            "blocks": self.blocks,
+            "tomtom_cells": self.answered,
+            "estimated_cells": dict(self.estimated),
+            "tomtom_skipped": self.skipped,
+        }
+
+    def estimate_missing(self, origins, destinations):
+        """Fill every missing cell from history, the road graph or the straight-line distance (CPU-bound)"""
+        graph = get_road_graph()
+        estimates, graph_routes = TOMTOM_MATRIX_ESTIMATE_MAX_CELLS, TOMTOM_MATRIX_GRAPH_MAX_CELLS if graph else 0
+        speed = TOMTOM_MATRIX_FALLBACK_KMH / 3.6
+        for k in [k for k, missing in enumerate(self.missing) if missing]:
+            i, j = divmod(k, self.n_destinations)
+            (o_lat, o_lng), (d_lat, d_lng) = origins[i], destinations[j]
+            seconds = None
+            if estimates > 0:
+                estimates -= 1
+                estimate = travel_estimator.estimate(o_lat, o_lng, d_lat, d_lng)
+                if estimate is not None and estimate.confidence >= TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE:
+                    seconds, source = estimate.travel_time_sec, "estimate"
+            if seconds is None and graph_routes > 0:
+                graph_routes -= 1
+                try:
+                    seconds, source = graph.travel_time(o_lat, o_lng, d_lat, d_lng), "local"
+                except Exception as e:
+                    logging.error(f"Local routing error for matrix cell {origins[i]}:{destinations[j]}: {e}")
+            if seconds is None:
+                seconds, source = haversine_m(o_lat, o_lng, d_lat, d_lng) / speed, "distance"
+            self.seconds[k] = int(round(seconds))
+            self.estimated[source] += 1
+
+
+def _chunks(n_origins, n_destinations, max_cells):
+    """Split the full matrix into (origin range, destination range) blocks of at most max_cells"""
+    dest_step = min(n_destinations, max_cells)
+    origin_step = max(1, max_cells // dest_step)
+    for o in range(0, n_origins, origin_step):
+        for d in range(0, n_destinations, dest_step):
+            yield range(o, min(o + origin_step, n_origins)), range(d, min(d + dest_step, n_destinations))
+
+
+def _points(points, indexes):
+    return [{"point": {"latitude": points[i][0], "longitude": points[i][1]}} for i in indexes]
+
+
+async def _fetch_block(matrix, origins, destinations, origin_range, dest_range):
+    url = f"{TOMTOM_BASE_URL}/routing/matrix/2?key={TOMTOM_API_KEY}"
+    body = {
+        "origins": _points(origins, origin_range),
+        "destinations": _points(destinations, dest_range),
+        "options": {"departAt": "now", "traffic": "live", "travelMode": "car"},
+    }
+    try:
+        # A block takes longer than one route, so it gets the whole TOMTOM_TIMEOUT, not the adaptive one
+        res = await tomtom_breaker.call_async(
+            lambda timeout: get_client().post(url, json=body, timeout=TOMTOM_TIMEOUT), tomtom_limiter
+        )
+        res.raise_for_status()
+        data = res.json()
+        for cell in data.get("data", []):
+            summary = cell.get("routeSummary")
+            if summary is None:
+                continue  # unroutable pair, keeps the fallback
+            matrix.set(
+                origin_range[cell["originIndex"]],
+                dest_range[cell["destinationIndex"]],
+                summary["travelTimeInSeconds"],
+            )
+            matrix.answered += 1
+    except (CircuitOpenError, RateLimitExceeded) as e:
+        logging.warning(f"Travel time matrix block {origin_range}x{dest_range} skipped: {e}")
+    except Exception as e:
+        logging.error(f"Travel time matrix API error for block {origin_range}x{dest_range}: {e}")
+
+
+async def _tomtom_capacity():
+    """TomTom calls this caller may still make, or None without a rate limiter"""
+    if tomtom_limiter is None:
+        return None
+    if tomtom_limiter.store.blocking:
+        return await asyncio.to_thread(tomtom_limiter.capacity)
+    return tomtom_limiter.capacity()
+
+
+async def _skip_tomtom(blocks):
+    """Why the matrix should not be asked of TomTom at all, or None"""
+    if ROUTING_MODE == "local":
+        return "routing_mode_local"
+    if tomtom_breaker.retry_in() > 0:
+        return "circuit_open"
+    capacity = await _tomtom_capacity()
+    if capacity is not None and blocks > capacity:
+        # Half a matrix is no better than none, and the calls would be spent for nothing
+        return f"rate_limit: {blocks} blocks needed, {capacity} calls available"
+    return None
+
+
+async def get_travel_time_matrix_async(origins, destinations=None, max_cells=TOMTOM_MATRIX_MAX_CELLS,
+                                       concurrency=TOMTOM_MATRIX_CONCURRENCY):
+    """Travel times for every origin x destination pair.
+
+    `origins` and `destinations` are lists of (lat, lng); destinations
+    defaults to origins (square matrix). The request is split into blocks
+    that respect the per-request cell limit and blocks are fetched with
+    bounded concurrency through the TomTom circuit breaker, so N points
+    cost ceil(N*N / max_cells) calls instead of N*N. When the rate limit
+    or daily quota cannot cover every block, none are sent. Cells TomTom
+    did not answer are estimated (see estimate_missing and summary()).
+    """
+    destinations = origins if destinations is None else destinations
+    matrix = TravelTimeMatrix(len(origins), len(destinations))
+    if not origins or not destinations:
+        return matrix
+
+    blocks = list(_chunks(len(origins), len(destinations), max_cells))
+    matrix.skipped = await _skip_tomtom(len(blocks))
+    if matrix.skipped is None:
+        matrix.blocks = len(blocks)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def fetch(origin_range, dest_range):
+            async with limit:
+                await _fetch_block(matrix, origins, destinations, origin_range, dest_range)
+
+        await asyncio.gather(*(fetch(o, d) for o, d in blocks))
+
+    if origins is destinations:
+        for i in range(len(origins)):
+            matrix.set(i, i, 0)
+    missing = matrix.missing_count()
+    if missing:
+        await asyncio.to_thread(matrix.estimate_missing, origins, destinations)
+        logging.warning(
+            f"Travel time matrix: {missing} of {len(origins) * len(destinations)} cells estimated "
+            f"({dict(matrix.estimated)}){f', TomTom skipped: {matrix.skipped}' if matrix.skipped else ''}"
+        )
+    return matrix
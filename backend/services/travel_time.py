@@ -1,21 +1,293 @@
 import os, requests
+from datetime import datetime
 from dotenv import load_dotenv
 import logging
+from services.cache import TTLCache, WarmKeys
+from services.geo import parse_point, thin_polyline
+from services.http_client import get_client
+from services.metrics import LOOKUPS
+from services.rate_limit import RateLimitExceeded, tomtom_limiter
+from services.resilience import CircuitBreaker, CircuitOpenError, Revalidator, UPSTREAM_STALE_TTL
+from services.road_graph import local_travel_time
+from services.singleflight import SingleFlight
+from services.travel_estimator import (
+    TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE, TRAVEL_ESTIMATOR_MIN_CONFIDENCE, TRAVEL_ESTIMATOR_SLOW_MS, travel_estimator,
+)
+import asyncio
 
 load_dotenv()
 TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")
+TOMTOM_BASE_URL = os.getenv("TOMTOM_BASE_URL", "https://api.tomtom.com")
 
-def get_travel_time(start: str, end: str):
+FALLBACK_TRAVEL_TIME = 1800
+
+# "tomtom": TomTom only; "local": offline road graph only (ROAD_GRAPH_PATH);
+# "fallback": TomTom first, road graph when TomTom fails
+ROUTING_MODE = os.getenv("ROUTING_MODE", "tomtom")
+TOMTOM_TIMEOUT = float(os.getenv("TOMTOM_TIMEOUT", "10"))
+
+# Travel time cache: coordinates are snapped to TRAVEL_CACHE_PRECISION decimals
+# (3 ~ 110 m) and entries are bucketed by time of day, since traffic changes
+TRAVEL_CACHE_PRECISION = int(os.getenv("TRAVEL_CACHE_PRECISION", "3"))
+TRAVEL_CACHE_BUCKET_MIN = int(os.getenv("TRAVEL_CACHE_BUCKET_MIN", "15"))
+TRAVEL_CACHE_TTL = float(os.getenv("TRAVEL_CACHE_TTL", "300"))
+TRAVEL_CACHE_MAX = int(os.getenv("TRAVEL_CACHE_MAX", "10000"))
+# Route geometry from calculateRoute, thinned to one point per ROUTE_GEOMETRY_SPACING_M, for corridor weather
+ROUTE_GEOMETRY_SPACING_M = float(os.getenv("ROUTE_GEOMETRY_SPACING_M", "500"))
+ROUTE_GEOMETRY_TTL = float(os.getenv("ROUTE_GEOMETRY_TTL", "3600"))
+
+travel_time_cache = TTLCache(maxsize=TRAVEL_CACHE_MAX, ttl=TRAVEL_CACHE_TTL)
+# Snapped (start, end) -> [(lat, lng), ...]; roads change far slower than traffic, so no time bucket
+route_geometry_cache = TTLCache(maxsize=TRAVEL_CACHE_MAX, ttl=ROUTE_GEOMETRY_TTL)
+# Concurrent async lookups for the same snapped pair share one upstream call
+travel_time_flights = SingleFlight("travel_time")
+
+# TOMTOM_TIMEOUT is the ceiling; the breaker shortens it from observed latencies
+tomtom_breaker = CircuitBreaker("tomtom", max_timeout=TOMTOM_TIMEOUT)
+# Last TomTom answer per snapped pair (any time bucket), served as "stale" when TomTom is down
+travel_time_last_good = TTLCache(maxsize=TRAVEL_CACHE_MAX, ttl=UPSTREAM_STALE_TTL)
+# Cache keys the prefetcher filled, to count the on-demand lookups it answered
+travel_time_prefetched = WarmKeys(maxsize=TRAVEL_CACHE_MAX, ttl=TRAVEL_CACHE_TTL)
+_revalidator = Revalidator(tomtom_breaker)
+
+def _snap(point: str):
+    lat, lng = parse_point(point)
+    return round(lat, TRAVEL_CACHE_PRECISION), round(lng, TRAVEL_CACHE_PRECISION)
+
+def travel_cache_key(start: str, end: str, now: datetime = None):
+    """(snapped start, snapped end, time-of-day bucket), or None for unparseable coordinates"""
+    try:
+        now = now or datetime.now()
+        bucket = (now.hour * 60 + now.minute) // TRAVEL_CACHE_BUCKET_MIN
+        return _snap(start), _snap(end), bucket
+    except ValueError:
+        return None
+
+def _route_url(start: str, end: str):
+    return f"{TOMTOM_BASE_URL}/routing/1/calculateRoute/{start}:{end}/json?key={TOMTOM_API_KEY}&traffic=true"
+
+def _parse_travel_time(data):
+    if isinstance(data, dict) and "routes" in data:
+        return data["routes"][0]["summary"]["travelTimeInSeconds"]
+    logging.error(f"TomTom response not valid: {data}")
+    return None
+
+def _parse_route_points(data):
+    try:
+        return [(p["latitude"], p["longitude"]) for leg in data["routes"][0]["legs"] for p in leg["points"]]
+    except (KeyError, IndexError, TypeError):
+        return []
+
+def _remember_geometry(key, data):
+    points = _parse_route_points(data)
+    if key is not None and len(points) >= 2:
+        route_geometry_cache.set(key[:2], thin_polyline(points, ROUTE_GEOMETRY_SPACING_M))
+
+def get_route_geometry(start: str, end: str):
+    """Thinned polyline of the last TomTom route between two "lat,lng" points, or None"""
+    key = travel_cache_key(start, end)
+    return route_geometry_cache.get(key[:2]) if key is not None else None
+
+def _remember(key, travel_time):
+    if key is not None:
+        travel_time_cache.set(key, travel_time)
+        travel_time_last_good.set(key[:2], travel_time)
+
+def _stale(key):
+    return travel_time_last_good.get(key[:2]) if key is not None else None
+
+def _estimate(key):
+    """Estimate from delivery history for the snapped pair (services/travel_estimator.py), or None"""
+    return travel_estimator.estimate(*key[0], *key[1]) if key is not None else None
+
+def _usable(estimate, confidence):
+    return estimate is not None and estimate.confidence >= confidence
+
+def _tomtom_slow():
+    latency = tomtom_breaker.latency(50)
+    return latency is not None and latency * 1000 > TRAVEL_ESTIMATOR_SLOW_MS
+
+def _shortcut(key, use_cache):
+    """A history estimate good enough to skip TomTom: confident, or fair while TomTom is slow"""
+    if not use_cache:
+        return None
+    estimate = _estimate(key)
+    if _usable(estimate, TRAVEL_ESTIMATOR_MIN_CONFIDENCE):
+        return estimate
+    if _usable(estimate, TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE) and _tomtom_slow():
+        return estimate
+    return None
+
+def _fetch_tomtom(start: str, end: str, key):
+    if ROUTING_MODE == "local":
+        return None
     try:
-        url = f"https://api.tomtom.com/routing/1/calculateRoute/{start}:{end}/json?key={TOMTOM_API_KEY}&traffic=true"
-        res = requests.get(url, timeout=10)
+        res = tomtom_breaker.call(lambda timeout: requests.get(_route_url(start, end), timeout=timeout), tomtom_limiter)
         data = res.json()
-        if isinstance(data, dict) and "routes" in data:
-            return data["routes"][0]["summary"]["travelTimeInSeconds"]
-        else:
-            logging.error(f"TomTom response not valid: {data}")
-            return 1800  # fallback value
+        _remember_geometry(key, data)
+        return _parse_travel_time(data)
+    except CircuitOpenError:
+        return None
+    except RateLimitExceeded as e:
+        logging.warning(f"Travel time lookup skipped: {e}")
+        return None
     except Exception as e:
         logging.error(f"Travel time API error: {e}")
-        return 1800
+        return None
+
+def _local(key, travel_time):
+    if travel_time is None:
+        return FALLBACK_TRAVEL_TIME, "fallback"  # fallback value, never cached
+    if key is not None:
+        travel_time_cache.set(key, travel_time)
+    return travel_time, "local"
+
+def _counted(start: str, end: str, result):
+    LOOKUPS.labels("travel_time", result[1]).inc()
+    hit = result[1] == "cached"
+    travel_time_prefetched.record(travel_cache_key(start, end) if hit else None, hit)
+    return result
+
+def get_travel_time_result(start: str, end: str, use_cache: bool = True):
+    """(travel time in seconds, source) for a "lat,lng" pair.
+
+    source is "live" (TomTom just answered), "cached", "stale" (last good
+    TomTom answer, TomTom failing or its circuit open), "estimate" (delivery
+    history, when confident enough or TomTom is slow or failing), "local"
+    (offline road graph) or "fallback" (FALLBACK_TRAVEL_TIME).
+    """
+    return _counted(start, end, _travel_time_result(start, end, use_cache))
+
+def _travel_time_result(start: str, end: str, use_cache: bool):
+    # use_cache=False skips the lookup but still refreshes the entry
+    key = travel_cache_key(start, end)
+    if key is None:
+        # Unparseable coordinates: TomTom would only reject them, and there is nothing to cache
+        return FALLBACK_TRAVEL_TIME, "fallback"
+    if use_cache:
+        cached = travel_time_cache.get(key)
+        if cached is not None:
+            return cached, "cached"
+    estimate = _shortcut(key, use_cache)
+    if estimate is not None:
+        return estimate.travel_time_sec, "estimate"
+    travel_time = _fetch_tomtom(start, end, key)
+    if travel_time is not None:
+        _remember(key, travel_time)
+        return travel_time, "live"
+    stale = _stale(key)
+    if stale is not None:
+        return stale, "stale"
+    estimate = _estimate(key)
+    if _usable(estimate, TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE):
+        return estimate.travel_time_sec, "estimate"
+    if ROUTING_MODE in ("local", "fallback"):
+        return _local(key, local_travel_time(start, end))
+    return FALLBACK_TRAVEL_TIME, "fallback"
+
+def get_travel_time(start: str, end: str, use_cache: bool = True):
+    return get_travel_time_result(start, end, use_cache)[0]
+
+async def _fetch_tomtom_async(start: str, end: str, key):
+    if ROUTING_MODE == "local":
+        return None
+    try:
+        res = await tomtom_breaker.call_async(
+            lambda timeout: get_client().get(_route_url(start, end), timeout=timeout), tomtom_limiter
+        )
+        data = res.json()
+        _remember_geometry(key, data)
+        return _parse_travel_time(data)
+    except CircuitOpenError:
+        return None
+    except RateLimitExceeded as e:
+        logging.warning(f"Travel time lookup skipped: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Travel time API error: {e}")
+        return None
+
+def _revalidate(start: str, end: str, key):
+    # Refresh in the background once TomTom may be probed again
+    _revalidator.schedule(key, lambda: travel_time_flights.do(key, lambda: _lookup_async(start, end, key)))
+
+async def _lookup_async(start: str, end: str, key):
+    travel_time = await _fetch_tomtom_async(start, end, key)
+    if travel_time is not None:
+        _remember(key, travel_time)
+        return travel_time, "live"
+    stale = _stale(key)
+    if stale is not None:
+        if tomtom_breaker.state != "closed":
+            _revalidate(start, end, key)
+        return stale, "stale"
+    estimate = _estimate(key)
+    if _usable(estimate, TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE):
+        return estimate.travel_time_sec, "estimate"
+    if ROUTING_MODE in ("local", "fallback"):
+        # Graph search is CPU-bound, keep it off the event loop
+        return _local(key, await asyncio.to_thread(local_travel_time, start, end))
+    return FALLBACK_TRAVEL_TIME, "fallback"
+
+async def get_travel_time_result_async(start: str, end: str, use_cache: bool = True):
+    """Async variant of get_travel_time_result using the shared keep-alive client"""
+    return _counted(start, end, await _travel_time_result_async(start, end, use_cache))
+
+async def _travel_time_result_async(start: str, end: str, use_cache: bool):
+    # use_cache=False skips the lookup but still refreshes the entry
+    key = travel_cache_key(start, end)
+    if key is None:
+        # Unparseable coordinates: TomTom would only reject them, and there is nothing to cache
+        return FALLBACK_TRAVEL_TIME, "fallback"
+    if use_cache:
+        cached = travel_time_cache.get(key)
+        if cached is not None:
+            return cached, "cached"
+    estimate = _shortcut(key, use_cache)
+    if estimate is not None:
+        return estimate.travel_time_sec, "estimate"
+    if tomtom_breaker.state != "closed":
+        # Don't queue behind a probe of a failing upstream: serve stale and refresh in the background
+        stale = _stale(key)
+        if stale is not None:
+            _revalidate(start, end, key)
+            return stale, "stale"
+    lookup = travel_time_flights.do(key, lambda: _lookup_async(start, end, key))
+    try:
+        estimate = _estimate(key) if use_cache else None
+        if not _usable(estimate, TRAVEL_ESTIMATOR_FALLBACK_CONFIDENCE):
+            return await lookup
+        # A fair estimate exists: wait at most TRAVEL_ESTIMATOR_SLOW_MS for TomTom, after
+        # which the estimate answers and the call carries on to fill the cache
+        flight = asyncio.ensure_future(lookup)
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            done, _ = await asyncio.wait({flight}, timeout=TRAVEL_ESTIMATOR_SLOW_MS / 1000)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        return flight.result() if done else (estimate.travel_time_sec, "estimate")
+    except asyncio.TimeoutError:
+        logging.error(f"Timed out waiting for in-flight travel time lookup {key}")
+        stale = _stale(key)
+        return (stale, "stale") if stale is not None else (FALLBACK_TRAVEL_TIME, "fallback")
+
+async def prefetch_travel_time(start: str, end: str, refresh_within: float = 0):
+    """Fill the cache for a pair ahead of demand (services/prefetch.py); returns the lookup source.
+
+    "cached" means the pair was already warm and "estimate" that history
+    answers it without TomTom; neither called an upstream. An entry that
+    expires within `refresh_within` seconds is looked up again, so a hot
+    pair stays warm until the next warm-up. Not counted in the lookup metrics.
+    """
+    key = travel_cache_key(start, end)
+    left = travel_time_cache.ttl_left(key) if key is not None else None
+    refresh = left is not None and left < refresh_within
+    source = (await _travel_time_result_async(start, end, not refresh))[1]
+    if source in ("live", "local"):
+        travel_time_prefetched.add(travel_cache_key(start, end))
+    return source
 
+async def get_travel_time_async(start: str, end: str, use_cache: bool = True):
+    """Async variant of get_travel_time using the shared keep-alive client"""
+    return (await get_travel_time_result_async(start, end, use_cache))[0]
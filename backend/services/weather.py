@@ -1,54 +1,211 @@
+import asyncio
 import os, requests
 from dotenv import load_dotenv
 import logging
+from services.geo import geohash
+from services.http_client import get_client
+from services.metrics import LOOKUPS
+from services.cache import TTLCache, WarmKeys
+from services.rate_limit import RateLimitExceeded, openweather_limiter
+from services.resilience import CircuitBreaker, CircuitOpenError, Revalidator, UPSTREAM_STALE_TTL
+from services.singleflight import SingleFlight
+from services.weather_cache import WEATHER_CACHE_MAX, WEATHER_CACHE_PRECISION, WEATHER_CACHE_TTL, weather_cache
 
 load_dotenv()
 WEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org")
+OPENWEATHER_TIMEOUT = float(os.getenv("OPENWEATHER_TIMEOUT", "10"))
 
-def get_weather_by_coordinates(lat: float, lng: float):
-    """Get weather using coordinates directly"""
+UNKNOWN_WEATHER = {"weather": "unknown", "location": "unknown", "temperature": None}
+
+# Concurrent async lookups in the same geohash cell share one upstream call
+weather_flights = SingleFlight("weather")
+
+# OPENWEATHER_TIMEOUT is the ceiling; the breaker shortens it from observed latencies
+openweather_breaker = CircuitBreaker("openweather", max_timeout=OPENWEATHER_TIMEOUT)
+# Last good answer per geohash cell or city (any time bucket), served as "stale" when OpenWeather is down
+weather_last_good = TTLCache(maxsize=WEATHER_CACHE_MAX, ttl=UPSTREAM_STALE_TTL)
+# Cache keys the prefetcher filled, to count the on-demand lookups it answered
+weather_prefetched = WarmKeys(maxsize=WEATHER_CACHE_MAX, ttl=WEATHER_CACHE_TTL)
+_revalidator = Revalidator(openweather_breaker)
+
+def _coordinates_url(lat: float, lng: float):
+    return f"{OPENWEATHER_BASE_URL}/data/2.5/weather?lat={lat}&lon={lng}&appid={WEATHER_API_KEY}&units=metric"
+
+def _parse_coordinates_weather(data):
+    if isinstance(data, dict) and "weather" in data and isinstance(data["weather"], list) and len(data["weather"]) > 0:
+        # Return both weather and location name
+        weather_desc = data["weather"][0]["description"]
+        location_name = data.get("name", "Unknown Location")
+        return {
+            "weather": weather_desc,
+            "location": location_name,
+            "temperature": data["main"]["temp"]
+        }
+    logging.error(f"Weather response not valid: {data}")
+    return dict(UNKNOWN_WEATHER)
+
+def _cached(key, use_cache):
+    if weather_cache is None or not use_cache:
+        return None
+    return weather_cache.get(key)
+
+def _store(key, value):
+    # "unknown" fallbacks are never cached
+    if weather_cache is not None and value["weather"] != "unknown":
+        weather_cache.set(key, value)
+    return value
+
+async def _cached_async(key, use_cache):
+    # The SQLite store can wait on other workers' writes; keep that off the event loop
+    if weather_cache is not None and weather_cache.blocking and use_cache:
+        return await asyncio.to_thread(_cached, key, use_cache)
+    return _cached(key, use_cache)
+
+async def _store_async(key, value):
+    if weather_cache is not None and weather_cache.blocking:
+        return await asyncio.to_thread(_store, key, value)
+    return _store(key, value)
+
+def _coordinates_key(lat: float, lng: float):
+    return weather_cache.coordinates_key(lat, lng) if weather_cache is not None else None
+
+def _cell(lat: float, lng: float):
+    return geohash(lat, lng, WEATHER_CACHE_PRECISION)
+
+def _live(key, cell, value):
+    weather_last_good.set(cell, value)
+    return _store(key, value), "live"
+
+async def _live_async(key, cell, value):
+    weather_last_good.set(cell, value)
+    return await _store_async(key, value), "live"
+
+def _stale_or_unknown(cell):
+    stale = weather_last_good.get(cell)
+    if stale is not None:
+        return stale, "stale"
+    return dict(UNKNOWN_WEATHER), "fallback"
+
+def _fetch_openweather(url: str):
+    """Parsed JSON from OpenWeather through the circuit breaker, or None"""
     try:
         if not WEATHER_API_KEY:
             raise ValueError("OPENWEATHER_API_KEY not configured")
-
-        # Use coordinates instead of city name
-        url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lng}&appid={WEATHER_API_KEY}&units=metric"
-        response = requests.get(url, timeout=10)
+        response = openweather_breaker.call(lambda timeout: requests.get(url, timeout=timeout), openweather_limiter)
         response.raise_for_status()
-
-        data = response.json()
-        if isinstance(data, dict) and "weather" in data and isinstance(data["weather"], list) and len(data["weather"]) > 0:
-            # Return both weather and location name
-            weather_desc = data["weather"][0]["description"]
-            location_name = data.get("name", "Unknown Location")
-            return {
-                "weather": weather_desc,
-                "location": location_name,
-                "temperature": data["main"]["temp"]
-            }
-        else:
-            logging.error(f"Weather response not valid: {data}")
-            return {"weather": "unknown", "location": "unknown", "temperature": None}
+        return response.json()
+    except CircuitOpenError:
+        return None
+    except RateLimitExceeded as e:
+        logging.warning(f"Weather lookup skipped: {e}")
+        return None
     except Exception as e:
-        logging.error(f"Weather API error for coordinates {lat},{lng}: {e}")
-        return {"weather": "unknown", "location": "unknown", "temperature": None}
+        logging.error(f"Weather API error for {url.split('appid=')[0]}: {e}")
+        return None
 
-def get_weather(city: str):
-    """Keep the old function for backward compatibility"""
+def _counted(lat: float, lng: float, result):
+    LOOKUPS.labels("weather", result[1]).inc()
+    hit = result[1] == "cached"
+    weather_prefetched.record(_coordinates_key(lat, lng) if hit else None, hit)
+    return result
+
+def get_weather_by_coordinates_result(lat: float, lng: float, use_cache: bool = True):
+    """(weather info, source) where source is "live", "cached", "stale" or "fallback" (unknown weather)"""
+    return _counted(lat, lng, _weather_by_coordinates_result(lat, lng, use_cache))
+
+def _weather_by_coordinates_result(lat: float, lng: float, use_cache: bool):
+    key = _coordinates_key(lat, lng)
+    cached = _cached(key, use_cache)
+    if cached is not None:
+        return cached, "cached"
+    data = _fetch_openweather(_coordinates_url(lat, lng))
+    info = _parse_coordinates_weather(data) if data is not None else UNKNOWN_WEATHER
+    if info["weather"] != "unknown":
+        return _live(key, _cell(lat, lng), info)
+    return _stale_or_unknown(_cell(lat, lng))
+
+def get_weather_by_coordinates(lat: float, lng: float, use_cache: bool = True):
+    """Get weather using coordinates directly"""
+    return get_weather_by_coordinates_result(lat, lng, use_cache)[0]
+
+async def _fetch_openweather_async(url: str):
     try:
         if not WEATHER_API_KEY:
             raise ValueError("OPENWEATHER_API_KEY not configured")
-
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={WEATHER_API_KEY}&units=metric"
-        response = requests.get(url, timeout=10)
+        response = await openweather_breaker.call_async(
+            lambda timeout: get_client().get(url, timeout=timeout), openweather_limiter
+        )
         response.raise_for_status()
-
-        data = response.json()
-        if isinstance(data, dict) and "weather" in data and isinstance(data["weather"], list) and len(data["weather"]) > 0:
-            return data["weather"][0]["description"]
-        else:
-            logging.error(f"Weather response not valid: {data}")
-            return "unknown"
+        return response.json()
+    except CircuitOpenError:
+        return None
+    except RateLimitExceeded as e:
+        logging.warning(f"Weather lookup skipped: {e}")
+        return None
     except Exception as e:
-        logging.error(f"Weather API error for city '{city}': {e}")
-        return "unknown"
\ No newline at end of file
+        logging.error(f"Weather API error for {url.split('appid=')[0]}: {e}")
+        return None
+
+async def _lookup_coordinates_async(lat: float, lng: float, key, cell):
+    data = await _fetch_openweather_async(_coordinates_url(lat, lng))
+    info = _parse_coordinates_weather(data) if data is not None else UNKNOWN_WEATHER
+    if info["weather"] != "unknown":
+        return await _live_async(key, cell, info)
+    result = _stale_or_unknown(cell)
+    if result[1] == "stale" and openweather_breaker.state != "closed":
+        _revalidate(lat, lng, key, cell)
+    return result
+
+def _revalidate(lat: float, lng: float, key, cell):
+    # Refresh in the background once OpenWeather may be probed again
+    _revalidator.schedule(cell, lambda: weather_flights.do(cell, lambda: _lookup_coordinates_async(lat, lng, key, cell)))
+
+async def get_weather_by_coordinates_result_async(lat: float, lng: float, use_cache: bool = True):
+    """Async variant of get_weather_by_coordinates_result using the shared keep-alive client"""
+    return _counted(lat, lng, await _weather_by_coordinates_result_async(lat, lng, use_cache))
+
+async def _weather_by_coordinates_result_async(lat: float, lng: float, use_cache: bool):
+    key = _coordinates_key(lat, lng)
+    cached = await _cached_async(key, use_cache)
+    if cached is not None:
+        return cached, "cached"
+    cell = _cell(lat, lng)
+    if openweather_breaker.state != "closed":
+        # Don't queue behind a probe of a failing upstream: serve stale and refresh in the background
+        stale = weather_last_good.get(cell)
+        if stale is not None:
+            _revalidate(lat, lng, key, cell)
+            return stale, "stale"
+    try:
+        return await weather_flights.do(cell, lambda: _lookup_coordinates_async(lat, lng, key, cell))
+    except asyncio.TimeoutError:
+        logging.error(f"Timed out waiting for in-flight weather lookup {cell}")
+        return _stale_or_unknown(cell)
+
+async def prefetch_weather(lat: float, lng: float):
+    """Fill the cache for a point's geohash cell ahead of demand (services/prefetch.py); returns the lookup source.
+
+    "cached" means the cell was already warm. Not counted in the lookup metrics.
+    """
+    source = (await _weather_by_coordinates_result_async(lat, lng, True))[1]
+    if source == "live":
+        weather_prefetched.add(_coordinates_key(lat, lng))
+    return source
+
+async def get_weather_by_coordinates_async(lat: float, lng: float, use_cache: bool = True):
+    """Async variant of get_weather_by_coordinates using the shared keep-alive client"""
+    return (await get_weather_by_coordinates_result_async(lat, lng, use_cache))[0]
+
+def get_weather(city: str, use_cache: bool = True):
+    """Keep the old function for backward compatibility"""
+    key = weather_cache.city_key(city) if weather_cache is not None else None
+    cached = _cached(key, use_cache)
+    if cached is not None:
+        return cached["weather"]
+    data = _fetch_openweather(f"{OPENWEATHER_BASE_URL}/data/2.5/weather?q={city}&appid={WEATHER_API_KEY}&units=metric")
+    if isinstance(data, dict) and "weather" in data and isinstance(data["weather"], list) and len(data["weather"]) > 0:
+        return _live(key, f"city:{city.strip().lower()}", {"weather": data["weather"][0]["description"]})[0]["weather"]
+    if data is not None:
+        logging.error(f"Weather response not valid: {data}")
+    return _stale_or_unknown(f"city:{city.strip().lower()}")[0]["weather"]
@@ -0,0 +1,176 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dotenv import load_dotenv
+import logging
+from services.cache import TTLCache
+from services.geo import geohash
+
+load_dotenv()
+
+# Weather is cached per geohash cell and time bucket. The default SQLite
+# backend lives in a local file so all uvicorn workers share one set of entries.
+WEATHER_CACHE_BACKEND = os.getenv("WEATHER_CACHE_BACKEND", "sqlite")  # sqlite | memory | off
+WEATHER_CACHE_PATH = os.getenv("WEATHER_CACHE_PATH", os.path.join(tempfile.gettempdir(), "routemonk_weather_cache.sqlite3"))
+WEATHER_CACHE_PRECISION = int(os.getenv("WEATHER_CACHE_PRECISION", "5"))  # geohash length, 5 ~ 4.9 km cells
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_MAX = int(os.getenv("WEATHER_CACHE_MAX", "50000"))
+
+
+class MemoryStore:
+    """Per-process store, for single-worker deployments and tests"""
+
+    blocking = False
+
+    def __init__(self, max_entries=WEATHER_CACHE_MAX):
+        self._cache = TTLCache(maxsize=max_entries, ttl=WEATHER_CACHE_TTL)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._cache)}
+
+
+class SQLiteStore:
+    """Store backed by a local SQLite file in WAL mode, shared by every process on the host"""
+
+    PRUNE_EVERY = 256  # writes between size/expiry pruning passes
+    # Calls can wait up to the 5s busy timeout on another worker's write, and every
+    # PRUNE_EVERY-th write prunes; async callers run them in a thread
+    blocking = True
+
+    def __init__(self, path=WEATHER_CACHE_PATH, max_entries=WEATHER_CACHE_MAX):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS weather_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_weather_cache_expires_at ON weather_cache (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM weather_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO weather_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM weather_cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM weather_cache WHERE key IN ("
+            " SELECT key FROM weather_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM weather_cache").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "size": size, "max_entries": self.max_entries}
+
+
+class WeatherCache:
+    """Weather lookups keyed by (geohash cell, time bucket) or (city, time bucket).
+
+    Store errors are logged and treated as misses so a broken cache never
+    breaks /optimize.
+    """
+
+    def __init__(self, store, precision=WEATHER_CACHE_PRECISION, ttl=WEATHER_CACHE_TTL):
+        self.store = store
+        self.precision = precision
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def blocking(self):
+        return self.store.blocking
+
+    def _bucket(self):
+        return int(time.time() // self.ttl)
+
+    def coordinates_key(self, lat: float, lng: float):
+        return f"geo:{geohash(lat, lng, self.precision)}:{self._bucket()}"
+
+    def city_key(self, city: str):
+        return f"city:{city.strip().lower()}:{self._bucket()}"
+
+    def get(self, key):
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            logging.error(f"Weather cache read failed: {e}")
+            self.errors += 1
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.store.set(key, value, self.ttl)
+        except Exception as e:
+            logging.error(f"Weather cache write failed: {e}")
+            self.errors += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        try:
+            store_stats = self.store.stats()
+        except Exception as e:
+            store_stats = {"error": str(e)}
+        return {
+            **store_stats,
+            "geohash_precision": self.precision,
+            "ttl_sec": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+
+def _create_weather_cache():
+    if WEATHER_CACHE_BACKEND == "off":
+        return None
+    if WEATHER_CACHE_BACKEND == "memory":
+        return WeatherCache(MemoryStore())
+    try:
+        return WeatherCache(SQLiteStore())
+    except Exception as e:
+        logging.error(f"Weather cache at {WEATHER_CACHE_PATH} unavailable, using in-process cache: {e}")
+        return WeatherCache(MemoryStore())
+
+
+weather_cache = _create_weather_cache()
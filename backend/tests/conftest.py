@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+
+# Read when the services are imported, so set before any test module imports them.
+# Nothing connects to DATABASE_URL; the upstreams are benchmarks/fake_upstream.py, served in-process.
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://routemonk@127.0.0.1:1/routemonk_test")
+os.environ.setdefault("TOMTOM_BASE_URL", "http://fake-upstream")
+os.environ.setdefault("TOMTOM_API_KEY", "test")
+os.environ.setdefault("OPENWEATHER_BASE_URL", "http://fake-upstream")
+os.environ.setdefault("OPENWEATHER_API_KEY", "test")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+os.environ.setdefault("WEATHER_CACHE_BACKEND", "memory")
+
+
+@pytest.fixture
+def fake_upstream(request):
+    """benchmarks/fake_upstream.py answering every TomTom and OpenWeather call made through get_client().
+
+    Parametrize indirectly to pass create_app() options, e.g. {"tomtom_qps": 10}.
+    Yields an async function returning the fake's /__stats.
+    """
+    from fake_upstream import create_app
+    from services import http_client
+
+    app = create_app(**{"latency_ms": 1, **getattr(request, "param", {})})
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake-upstream")
+    previous, http_client._client = http_client._client, client
+
+    async def stats():
+        return (await client.get("/__stats")).json()
+
+    yield stats
+    http_client._client = previous
+    asyncio.run(client.aclose())
@@ -0,0 +1,86 @@
+import base64
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from routers.history import HistoryFilters, decode_cursor, encode_cursor, fetch_history_page
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2024, 5, 1, 12, 30, 15, 123456),
+    datetime(2024, 5, 1),
+    None,  # legacy rows without created_at
+])
+def test_cursor_round_trip(created_at):
+    cursor = encode_cursor(created_at, 42)
+    assert decode_cursor(cursor) == (created_at, 42)
+    # Safe in a query string as is
+    assert not set(cursor) & set("+/?&")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b'["2024-05-01T00:00:00"]').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'[null, "x"]').decode(),
+])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+class Cursor:
+    """sqlite3 cursor taking the psycopg2 %s placeholders fetch_history_page writes"""
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def execute(self, sql, params):
+        self._cur.execute(sql.replace("%s", "?"), params)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    @property
+    def description(self):
+        return self._cur.description
+
+
+@pytest.fixture
+def deliveries():
+    conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("CREATE TABLE deliveries (id integer primary key, city text, final_score real, created_at timestamp)")
+    start = datetime(2024, 5, 1)
+    rows = [(i, "Pune" if i % 2 else "Mumbai", float(i), start + timedelta(minutes=i // 3)) for i in range(1, 31)]
+    rows += [(i, "Pune", float(i), None) for i in range(31, 38)]  # legacy rows, newest ids but undated
+    conn.executemany("INSERT INTO deliveries VALUES (?, ?, ?, ?)", rows)
+    yield Cursor(conn)
+    conn.close()
+
+
+def _walk(cur, filters, limit):
+    ids, cursor = [], None
+    while True:
+        page, next_cursor = fetch_history_page(cur, filters, ["id"], limit, decode_cursor(cursor) if cursor else None)
+        assert len(page) <= limit
+        ids += [row["id"] for row in page]
+        if next_cursor is None:
+            return ids
+        cursor = next_cursor
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 50])
+def test_pages_return_every_row_once_newest_first(deliveries, limit):
+    # Rows share created_at in threes, so the id breaks ties; undated rows come last
+    assert _walk(deliveries, HistoryFilters(), limit) == list(range(30, 0, -1)) + list(range(37, 30, -1))
+
+
+def test_pages_with_filters(deliveries):
+    assert _walk(deliveries, HistoryFilters(city="Mumbai"), 4) == list(range(30, 0, -2))
+    # A date range never matches undated rows
+    since = datetime(2024, 5, 1, 0, 5)
+    assert _walk(deliveries, HistoryFilters(since=since), 4) == list(range(30, 14, -1))
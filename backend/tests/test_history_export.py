@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import history
+from routers.history import HISTORY_COLUMNS, HistoryFilters, iter_export
+
+START = datetime(2024, 5, 1)
+
+
+class NamedCursor:
+    """Stands in for a psycopg2 server-side cursor: rows are made as they are fetched, never all held"""
+
+    def __init__(self, conn, rows):
+        self.conn = conn
+        self.rows = rows
+        self.closed = False
+
+    def execute(self, sql, params):
+        self.conn.executed.append((sql, params))
+        selected = [HISTORY_COLUMNS.index(f) for f in sql.split("SELECT ", 1)[1].split(" FROM", 1)[0].split(", ")]
+        self._rows = (
+            tuple(row[k] for k in selected)
+            for row in (
+                (i, "Pune", 5, 600 + i % 60, "clear sky", 50.0 + i % 7, START + timedelta(seconds=i))
+                for i in range(1, self.rows + 1)
+            )
+        )
+
+    def fetchmany(self, size):
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def close(self):
+        self.closed = True
+
+
+class Connection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.cursors = []
+        self.rolled_back = False
+
+    def cursor(self, name=None):
+        assert name, "the export must use a server-side (named) cursor"
+        self.cursors.append(NamedCursor(self, self.rows))
+        return self.cursors[-1]
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def _peak_mb(rows, fmt, compress=False):
+    tracemalloc.start()
+    chunks = iter_export(Connection(rows), HistoryFilters(), list(HISTORY_COLUMNS), fmt, fetch_size=500)
+    if compress:
+        chunks = history._gzip_chunks(chunks)
+    for _ in chunks:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+@pytest.mark.parametrize("fmt,compress", [("ndjson", False), ("csv", False), ("ndjson", True)])
+def test_export_memory_does_not_grow_with_rows(fmt, compress):
+    small, large = _peak_mb(2_000, fmt, compress), _peak_mb(20_000, fmt, compress)
+    assert large < small * 1.5 + 0.5
+    assert large < 4
+
+
+def test_ndjson_rows_and_filters():
+    conn = Connection(2500)
+    filters = HistoryFilters(city="Pune", min_score=10)
+    chunks = list(iter_export(conn, filters, ["id", "city", "created_at"], "ndjson", fetch_size=1000))
+    assert len(chunks) == 3  # one per fetched batch
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 2501))
+    assert rows[0] == {"id": 1, "city": "Pune", "created_at": (START + timedelta(seconds=1)).isoformat()}
+    sql, params = conn.executed[0]
+    assert "WHERE city = %s AND final_score >= %s ORDER BY id" in sql
+    assert params == ["Pune", 10]
+    assert conn.cursors[0].closed and conn.rolled_back
+
+
+def test_csv_has_one_header():
+    text = "".join(iter_export(Connection(2500), HistoryFilters(), list(HISTORY_COLUMNS), "csv", fetch_size=1000))
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == list(HISTORY_COLUMNS)
+    assert len(rows) == 2501
+    assert rows[-1][0] == "2500"
+
+
+def test_abandoned_export_closes_its_cursor():
+    conn = Connection(10_000)
+    chunks = iter_export(conn, HistoryFilters(), ["id"], "ndjson", fetch_size=1000)
+    next(chunks)
+    chunks.close()  # what a client disconnect does to the response body
+    assert conn.cursors[0].closed and conn.rolled_back
+
+
+def test_export_endpoint_streams_gzip(monkeypatch):
+    class Pool:
+        @contextmanager
+        def connection(self):
+            yield Connection(3000)
+
+    monkeypatch.setattr(history, "get_pool", lambda: Pool())
+    app = FastAPI()
+    app.include_router(history.router)
+    res = TestClient(app).get("/history/export", params={"format": "csv", "gzip": "true", "fields": "id,city"})
+    assert res.status_code == 200
+    assert res.headers["content-disposition"] == 'attachment; filename="deliveries.csv"'
+    assert res.headers["content-encoding"] == "gzip"
+    # httpx has already gunzipped the body, so this also checks it was one complete gzip stream
+    rows = list(csv.reader(io.StringIO(res.text)))
+    assert rows[0] == ["id", "city"] and len(rows) == 3001
@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+from services import rate_limit, travel_time
+from services.rate_limit import (
+    MemoryBucketStore, ProviderLimiter, QuotaExhausted, RateLimitExceeded, SQLiteBucketStore,
+)
+from services.resilience import CircuitBreaker
+
+
+def _points(n):
+    # Distinct after snapping to the cache precision, so every lookup is its own TomTom call
+    return [(f"{19 + i / 100:.2f},72.8", f"{19 + i / 100:.2f},72.9") for i in range(n)]
+
+
+def test_bucket_grants_burst_then_refills_at_rate():
+    store = MemoryBucketStore()
+    now = 1000.0
+    assert [store.take("p", 2.0, 3, 0, 1, now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take("p", 2.0, 3, 0, 1, now) == pytest.approx(0.5)
+    assert store.take("p", 2.0, 3, 0, 1, now + 0.5) == 0.0
+    # Refill stops at the burst size
+    assert store.usage("p")["tokens"] == pytest.approx(0.0)
+    store.take("p", 2.0, 3, 0, 1, now + 100)
+    assert store.usage("p")["tokens"] == pytest.approx(2.0)
+
+
+def test_daily_quota_is_spent_by_cost_and_resets_next_day():
+    store = MemoryBucketStore()
+    now = 1000.0
+    store.take("p", 100, 100, 5, 3, now)
+    with pytest.raises(QuotaExhausted):
+        store.take("p", 100, 100, 5, 3, now)
+    assert store.usage("p")["used_today"] == 3
+    assert store.take("p", 100, 100, 5, 3, now + 86400) == 0.0
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    path = str(tmp_path / "buckets.sqlite3")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    now = time.time()
+    assert first.take("p", 1.0, 2, 0, 1, now) == 0.0
+    assert second.take("p", 1.0, 2, 0, 1, now) == 0.0
+    assert first.take("p", 1.0, 2, 0, 1, now) > 0
+    assert second.usage("p")["used_today"] == 2
+
+
+def test_interactive_call_overtakes_queued_batch_calls():
+    async def scenario():
+        limiter = ProviderLimiter("p", rate=20, burst=1, daily_quota=0, store=MemoryBucketStore())
+        await limiter.acquire(priority="batch")
+        granted = []
+
+        async def call(priority):
+            await limiter.acquire(priority=priority)
+            granted.append(priority)
+
+        batch = [asyncio.ensure_future(call("batch")) for _ in range(3)]
+        await asyncio.sleep(0)
+        await asyncio.gather(call("interactive"), *batch)
+        assert granted == ["interactive", "batch", "batch", "batch"]
+        assert limiter.stats()["granted"] == 5
+
+    asyncio.run(scenario())
+
+
+def test_call_fails_fast_past_its_lane_wait(monkeypatch):
+    monkeypatch.setitem(rate_limit.RATE_LIMIT_MAX_WAIT, "interactive", 0.05)
+
+    async def scenario():
+        limiter = ProviderLimiter("p", rate=1, burst=1, daily_quota=0, store=MemoryBucketStore())
+        await limiter.acquire()
+        started = time.perf_counter()
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire()
+        assert time.perf_counter() - started < 0.05
+        assert limiter.stats()["rejected_wait"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_new_callers():
+    async def scenario():
+        limiter = ProviderLimiter("p", rate=5, burst=1, daily_quota=0, store=MemoryBucketStore(), max_queue=1)
+        await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire()
+        await waiting
+        assert limiter.stats()["rejected_queue_full"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_capacity_counts_lane_wait_and_quota_left():
+    limiter = ProviderLimiter("p", rate=2, burst=5, daily_quota=0, store=MemoryBucketStore())
+    assert limiter.capacity("batch") == 5 + 2 * int(rate_limit.RATE_LIMIT_MAX_WAIT["batch"])
+    limiter = ProviderLimiter("p", rate=2, burst=5, daily_quota=3, store=MemoryBucketStore())
+    limiter.acquire_sync()
+    assert limiter.capacity("batch") == 2
+
+
+@pytest.fixture
+def tomtom_breaker(monkeypatch):
+    # 429s count as failures; keep them from opening the shared breaker for later tests
+    breaker = CircuitBreaker("tomtom", max_timeout=travel_time.TOMTOM_TIMEOUT, failure_threshold=100)
+    monkeypatch.setattr(travel_time, "tomtom_breaker", breaker)
+    return breaker
+
+
+async def _lookups(points):
+    results = await asyncio.gather(*(travel_time.get_travel_time_result_async(s, e, use_cache=False) for s, e in points))
+    return [source for _, source in results]
+
+
+@pytest.mark.parametrize("fake_upstream", [{"tomtom_qps": 10}], indirect=True)
+def test_limited_lookups_never_hit_the_upstream_limit(fake_upstream, tomtom_breaker, monkeypatch):
+    # The fake answers 429 above 10 calls per second, like TomTom does
+    async def scenario():
+        monkeypatch.setattr(travel_time, "tomtom_limiter", None)
+        await _lookups(_points(15))
+        assert (await fake_upstream())["throttled"] > 0
+
+        await asyncio.sleep(1)  # let the fake's bucket refill
+        limiter = ProviderLimiter("tomtom", rate=8, burst=5, daily_quota=0, store=MemoryBucketStore())
+        monkeypatch.setattr(travel_time, "tomtom_limiter", limiter)
+        before = await fake_upstream()
+        sources = await _lookups(_points(12))
+        after = await fake_upstream()
+        assert sources == ["live"] * 12
+        assert after["throttled"] == before["throttled"]
+        assert limiter.stats()["waited"] > 0
+
+    asyncio.run(scenario())
+
+
+def test_daily_quota_caps_upstream_calls(fake_upstream, tomtom_breaker, monkeypatch):
+    limiter = ProviderLimiter("tomtom", rate=100, burst=100, daily_quota=3, store=MemoryBucketStore())
+    monkeypatch.setattr(travel_time, "tomtom_limiter", limiter)
+
+    async def scenario():
+        sources = await _lookups(_points(8))
+        assert sources.count("live") == 3
+        assert (await fake_upstream())["by_provider"]["tomtom"] == 3
+        assert limiter.stats()["quota_exhausted"] == 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from services.resilience import CircuitBreaker, CircuitOpenError, Revalidator, UpstreamError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Response:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+
+
+def _fail(timeout):
+    raise TimeoutError("upstream timed out")
+
+
+def test_opens_after_threshold_then_probes_once():
+    clock = Clock()
+    breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=3, reset_timeout=10, clock=clock)
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            breaker.call(_fail)
+    assert breaker.state == "open"
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda timeout: calls.append(timeout))
+    assert calls == []
+    assert breaker.retry_in() == 10
+
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_success(0.1)
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 1
+
+
+def test_failed_probe_opens_again():
+    clock = Clock()
+    breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=1, reset_timeout=10, clock=clock)
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail)
+    clock.now = 10
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail)
+    assert breaker.state == "open"
+    assert breaker.retry_in() == 10
+
+
+def test_server_errors_and_429_fail_but_other_4xx_do_not():
+    breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=2)
+    assert breaker.call(lambda timeout: Response(404)).status_code == 404
+    with pytest.raises(UpstreamError):
+        breaker.call(lambda timeout: Response(429))
+    with pytest.raises(UpstreamError):
+        breaker.call(lambda timeout: Response(503))
+    assert breaker.state == "open"
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=2)
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail)
+    breaker.call(lambda timeout: Response())
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail)
+    assert breaker.state == "closed"
+
+
+def test_timeout_adapts_to_latency_within_bounds():
+    breaker = CircuitBreaker("test", max_timeout=5, min_timeout=0.5, percentile=99, factor=2)
+    assert breaker.timeout() == 5  # too few samples
+    for _ in range(10):
+        breaker.record_success(0.4)
+    assert breaker.timeout() == pytest.approx(0.8)
+    for _ in range(10):
+        breaker.record_success(0.01)
+    assert breaker.timeout() == pytest.approx(0.8)  # p99 still sees the slow calls
+    breaker = CircuitBreaker("test", max_timeout=5, min_timeout=0.5)
+    for _ in range(10):
+        breaker.record_success(0.01)
+    assert breaker.timeout() == 0.5
+    for _ in range(10):
+        breaker.record_success(10)
+    assert breaker.timeout() == 5
+
+
+def test_cancelled_async_probe_releases_the_half_open_slot():
+    async def scenario():
+        clock = Clock()
+        breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=1, reset_timeout=10, clock=clock)
+        with pytest.raises(TimeoutError):
+            breaker.call(_fail)
+        clock.now = 10
+
+        async def slow(timeout):
+            await asyncio.sleep(1)
+
+        probe = asyncio.ensure_future(breaker.call_async(slow))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The cancelled probe said nothing about the upstream, so another may go
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+
+    asyncio.run(scenario())
+
+
+def test_rejected_call_takes_no_rate_limit_token():
+    class Limiter:
+        taken = 0
+
+        def acquire_sync(self):
+            self.taken += 1
+
+    limiter = Limiter()
+    breaker = CircuitBreaker("test", max_timeout=5, failure_threshold=1)
+    with pytest.raises(TimeoutError):
+        breaker.call(_fail, limiter)
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda timeout: Response(), limiter)
+    assert limiter.taken == 1
+
+
+def test_outage_serves_stale_without_calling_the_upstream(fake_upstream, monkeypatch):
+    from services import http_client, travel_time
+
+    breaker = CircuitBreaker("tomtom", max_timeout=5, failure_threshold=3, reset_timeout=60)
+    monkeypatch.setattr(travel_time, "tomtom_breaker", breaker)
+    monkeypatch.setattr(travel_time, "_revalidator", Revalidator(breaker))
+    monkeypatch.setattr(travel_time, "tomtom_limiter", None)
+
+    async def scenario():
+        _, source = await travel_time.get_travel_time_result_async("18.52,73.85", "18.60,73.90", use_cache=False)
+        assert source == "live"
+        await http_client.get_client().put("/__faults", json={"status": 503})
+        sources = [
+            (await travel_time.get_travel_time_result_async("18.52,73.85", "18.60,73.90", use_cache=False))[1]
+            for _ in range(6)
+        ]
+        assert sources == ["stale"] * 6
+        assert breaker.state == "open"
+        # One good call, three failures to open the circuit, then nothing
+        assert (await fake_upstream())["by_provider"]["tomtom"] == 4
+
+    asyncio.run(scenario())
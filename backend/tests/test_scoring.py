@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from services import scoring
+from services.scoring import CostModel, get_model, register_model, score, score_batch, weather_severity
+
+
+def test_legacy_is_perishability_times_travel_minutes():
+    assert get_model().name == "legacy"
+    assert score(4, 600) == pytest.approx(40.0)
+    # Weather, heat and distance do not change the legacy score
+    assert score(4, 600, 1.0, 45.0, 50_000, model="legacy") == pytest.approx(40.0)
+
+
+def test_weather_model_scales_by_severity():
+    weight = scoring.WEATHER_SEVERITY_WEIGHT
+    assert score(4, 600, weather_severity("thunderstorm"), model="weather") == pytest.approx(40 * (1 + weight))
+    assert score(4, 600, weather_severity("clear sky"), model="weather") == pytest.approx(40.0)
+
+
+def test_cold_chain_adds_heat_and_distance():
+    model = get_model("cold_chain")
+    minutes = 10 + model.distance_weight * 20
+    heat = 1 + model.heat_weight * (35 - model.heat_threshold_c)
+    weather = 1 + model.weather_weight * 0.6
+    assert score(4, 600, 0.6, 35.0, 20_000, model="cold_chain") == pytest.approx(4 * minutes * weather * heat)
+    # Below the threshold there is no heat factor
+    assert score(4, 600, 0.0, 20.0, 0, model="cold_chain") == pytest.approx(40.0)
+
+
+def test_unknown_inputs_leave_their_factor_at_one():
+    assert score(4, 600, None, None, None, model="cold_chain") == pytest.approx(40.0)
+    scores = score_batch([4, 4], [600, 600], [np.nan, 1.0], [None, None], model="weather")
+    assert scores[0] == pytest.approx(40.0)
+    assert scores[1] == pytest.approx(40 * (1 + scoring.WEATHER_SEVERITY_WEIGHT))
+
+
+def test_batch_matches_single_scores():
+    rng = np.random.default_rng(0)
+    n = 1000
+    perishability = rng.integers(1, 11, n)
+    travel = rng.uniform(60, 7200, n)
+    severity = rng.uniform(0, 1, n)
+    temperature = rng.uniform(10, 45, n)
+    distance = rng.uniform(0, 100_000, n)
+    for name in ("legacy", "weather", "cold_chain"):
+        batch = score_batch(perishability, travel, severity, temperature, distance, model=name)
+        assert batch.shape == (n,)
+        for i in range(0, n, 97):
+            single = score(int(perishability[i]), travel[i], severity[i], temperature[i], distance[i], model=name)
+            assert batch[i] == pytest.approx(single)
+
+
+def test_severity_takes_the_worst_matching_word():
+    assert weather_severity("light rain and thunderstorm") == 1.0
+    assert weather_severity("overcast clouds") == 0.1
+    assert weather_severity(None) == 0.0
+    assert list(scoring.weather_severity_batch(["snow", "mist", "snow"])) == [0.9, 0.3, 0.9]
+
+
+def test_unknown_model_is_a_value_error():
+    with pytest.raises(ValueError):
+        get_model("no-such-model")
+
+
+def test_registered_models_are_available_by_name(monkeypatch):
+    monkeypatch.setattr(scoring, "MODELS", dict(scoring.MODELS))
+
+    class Flat(CostModel):
+        def cost(self, perishability, travel_min, severity, temperature_c, distance_km):
+            return perishability * 0 + 1.0
+
+    register_model(Flat("flat"))
+    assert score(4, 600, model="flat") == 1.0
+
+
+def test_model_params_override_the_default_weights(monkeypatch):
+    monkeypatch.setattr(scoring, "SCORING_MODEL", "weather")
+    monkeypatch.setattr(scoring, "SCORING_MODEL_PARAMS", '{"weather_weight": 2.0}')
+    monkeypatch.setattr(scoring, "_default", None)
+    assert get_model().weather_weight == 2.0
+    assert score(1, 60, 0.5) == pytest.approx(2.0)
+    # Asking for the default model by name gets the overrides too
+    assert get_model("weather").weather_weight == 2.0
+    # The registered model itself is left alone
+    assert scoring.MODELS["weather"].weather_weight == scoring.WEATHER_SEVERITY_WEIGHT
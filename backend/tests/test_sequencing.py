@@ -0,0 +1,78 @@
+import itertools
+import random
+
+import pytest
+
+from services.sequencing import _Instance, solve_sequence
+
+
+def _random_matrix(n, seed):
+    """(n+1)x(n+1) travel times between random points, depot first"""
+    rng = random.Random(seed)
+    points = [(rng.random() * 3600, rng.random() * 3600) for _ in range(n + 1)]
+    return [[abs(ax - bx) + abs(ay - by) for bx, by in points] for ax, ay in points]
+
+
+def test_no_drops():
+    result = solve_sequence([[0]], [])
+    assert result.order == [] and result.objective == 0.0
+
+
+def test_drops_on_a_line_are_visited_outwards():
+    matrix = [[abs(a - b) * 60 for b in range(6)] for a in range(6)]
+    result = solve_sequence(matrix, [5] * 5)
+    assert result.order == [1, 2, 3, 4, 5]
+    assert result.arrivals == [60, 120, 180, 240, 300]
+    assert result.total_travel_time == 300
+
+
+def test_perishable_drop_is_pulled_forward():
+    # Depot to A 100 s, to B 110 s, A to B 100 s
+    matrix = [[0, 100, 110], [100, 0, 100], [110, 100, 0]]
+    assert solve_sequence(matrix, [0, 0]).order == [1, 2]
+    assert solve_sequence(matrix, [0, 10]).order == [2, 1]
+
+
+def test_time_windows():
+    matrix = [[0, 100, 100], [100, 0, 100], [100, 100, 0]]
+    result = solve_sequence(matrix, [0, 0], window_end=[None, 100])
+    assert result.order == [2, 1]
+    assert result.lateness == [0.0, 0.0]
+    # Arriving before a window opens waits for it
+    result = solve_sequence(matrix, [0, 0], window_start=[500, None], window_end=[None, 150])
+    assert result.order == [2, 1]
+    assert result.arrivals == [100, 500]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_route_visits_every_drop_once_and_never_gets_worse(seed):
+    rng = random.Random(seed)
+    n = 40
+    perishability = [rng.randint(1, 10) for _ in range(n)]
+    result = solve_sequence(_random_matrix(n, seed), perishability, time_budget=5)
+    assert sorted(result.order) == list(range(1, n + 1))
+    assert result.objective <= result.construction_objective
+    assert result.arrivals == sorted(result.arrivals)
+    assert not result.timed_out
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_small_routes_are_close_to_optimal(seed):
+    rng = random.Random(seed)
+    n = 6
+    matrix = _random_matrix(n, seed)
+    perishability = [rng.randint(1, 10) for _ in range(n)]
+    weights = [1.0] + [1.0 + 0.5 * p for p in perishability]
+    inst = _Instance(matrix, weights, [0.0] * (n + 1), [float("inf")] * (n + 1))
+    best = min(inst.cost(list(route)) for route in itertools.permutations(range(1, n + 1)))
+    result = solve_sequence(matrix, perishability)
+    assert result.objective == pytest.approx(inst.cost(result.order))
+    assert result.objective <= best * 1.05
+
+
+def test_time_budget_stops_the_search():
+    n = 300
+    result = solve_sequence(_random_matrix(n, 7), [5] * n, time_budget=0.05)
+    assert sorted(result.order) == list(range(1, n + 1))
+    assert result.timed_out
+    assert result.elapsed_ms < 1000
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.singleflight import SingleFlight
+
+
+def test_leader_cancelled_follower_still_gets_result():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        leader = asyncio.ensure_future(flights.do("k", lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", lookup))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == 42
+        assert leader.cancelled()
+        assert len(calls) == 1
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_call_cancelled_once_nobody_waits():
+    async def scenario():
+        flights = SingleFlight("test")
+        finished = []
+
+        async def lookup():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+            return 42
+
+        callers = [asyncio.ensure_future(flights.do("k", lookup)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.sleep(0.1)
+        assert not finished
+        assert flights.stats()["in_flight"] == 0
+        # The next caller starts a fresh call
+        assert await flights.do("k", lookup) == 42
+
+    asyncio.run(scenario())
+
+
+def test_exception_shared_with_followers():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def lookup():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        results = await asyncio.gather(*(flights.do("k", lookup) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert flights.stats()["errors"] == 1
+
+    asyncio.run(scenario())
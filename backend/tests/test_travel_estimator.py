@@ -0,0 +1,33 @@
+import itertools
+
+import pytest
+
+from services.travel_estimator import _MIN_CELL_DEG, TravelTimeEstimator, _cell, _pair_id
+
+
+@pytest.mark.parametrize("cell_deg", [0.001, 0.005, 0, -0.01, float("nan")])
+def test_cells_too_fine_for_the_pair_id_are_rejected(cell_deg):
+    with pytest.raises(ValueError, match="TRAVEL_ESTIMATOR_CELL_DEG"):
+        TravelTimeEstimator(cell_deg=cell_deg)
+
+
+@pytest.mark.parametrize("cell_deg", [_MIN_CELL_DEG, 0.01, 1.0])
+def test_pair_ids_stay_distinct_out_to_the_poles_and_antimeridian(cell_deg):
+    points = [(lat, lng) for lat in (-90, -45.5, 0, 90) for lng in (-180, -0.001, 0, 180)]
+    cells = {(_cell(lat, cell_deg), _cell(lng, cell_deg)) for lat, lng in points}
+    ids = {_pair_id(*o, *d) for o, d in itertools.product(cells, repeat=2)}
+    assert len(ids) == len(cells) ** 2
+    assert all(0 <= pair_id < 2**63 for pair_id in ids)
+
+
+def test_estimates_from_history():
+    estimator = TravelTimeEstimator(cell_deg=0.01, min_samples=3)
+    # Ten trips between the same two cells, all on Monday 9:00
+    n = 10
+    estimator.build([19.071] * n, [72.881] * n, [19.101] * n, [72.901] * n, [900 + i for i in range(n)], [9] * n)
+    estimate = estimator.estimate(19.072, 72.882, 19.102, 72.902)
+    assert estimate is not None and 800 < estimate.travel_time_sec < 1000
+    # Coordinates off the globe never reach the pair ids
+    assert estimator.estimate(190.72, 72.882, 19.102, 72.902) is None
+    estimator.build([191.0], [72.881], [19.101], [72.901], [900], [9])
+    assert len(estimator) == 0
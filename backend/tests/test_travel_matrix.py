@@ -0,0 +1,113 @@
+import asyncio
+import random
+
+import pytest
+
+from fake_upstream import fake_travel_time
+from services import travel_matrix
+from services.rate_limit import MemoryBucketStore, ProviderLimiter
+from services.resilience import CircuitBreaker
+from services.travel_matrix import _chunks, get_travel_time_matrix_async
+
+
+@pytest.mark.parametrize("n_origins,n_destinations,max_cells", [
+    (1, 1, 200), (30, 30, 200), (7, 450, 200), (450, 7, 200), (13, 17, 10), (5, 5, 1),
+])
+def test_chunks_cover_every_cell_once_within_the_cell_limit(n_origins, n_destinations, max_cells):
+    seen = set()
+    for origin_range, dest_range in _chunks(n_origins, n_destinations, max_cells):
+        assert 0 < len(origin_range) * len(dest_range) <= max_cells
+        cells = {(i, j) for i in origin_range for j in dest_range}
+        assert not cells & seen
+        seen |= cells
+    assert len(seen) == n_origins * n_destinations
+
+
+def _points(n, seed=0):
+    rng = random.Random(seed)
+    return [(19 + rng.random() / 10, 72.8 + rng.random() / 10) for _ in range(n)]
+
+
+@pytest.fixture
+def tomtom(monkeypatch):
+    """A fresh breaker and limiter for the matrix calls, so tests do not share state"""
+    breaker = CircuitBreaker("tomtom", max_timeout=5, failure_threshold=3, reset_timeout=60)
+    limiter = ProviderLimiter("tomtom", rate=5, burst=5, daily_quota=0, store=MemoryBucketStore())
+    monkeypatch.setattr(travel_matrix, "tomtom_breaker", breaker)
+    monkeypatch.setattr(travel_matrix, "tomtom_limiter", limiter)
+    return breaker, limiter
+
+
+def test_matrix_is_fetched_in_blocks(fake_upstream, tomtom):
+    points = _points(30)
+
+    async def scenario():
+        matrix = await get_travel_time_matrix_async(points)
+        blocks = len(list(_chunks(30, 30, travel_matrix.TOMTOM_MATRIX_MAX_CELLS)))
+        assert (await fake_upstream())["by_provider"]["tomtom"] == blocks
+        assert matrix.summary() == {
+            "cells": 900, "blocks": blocks, "tomtom_cells": 900, "estimated_cells": {}, "tomtom_skipped": None,
+        }
+        assert matrix.missing_count() == 0
+        for i, j in [(0, 0), (0, 1), (1, 0), (29, 17)]:
+            expected = 0 if i == j else fake_travel_time(*points[i], *points[j])
+            assert matrix.get(i, j) == expected
+
+    asyncio.run(scenario())
+
+
+def test_rectangular_matrix(fake_upstream, tomtom):
+    origins, destinations = _points(3, seed=1), _points(90, seed=2)
+
+    async def scenario():
+        matrix = await get_travel_time_matrix_async(origins, destinations, max_cells=50)
+        assert (matrix.n_origins, matrix.n_destinations) == (3, 90)
+        assert matrix.summary()["tomtom_cells"] == 270
+        assert matrix.row(2)[89] == fake_travel_time(*origins[2], *destinations[89])
+
+    asyncio.run(scenario())
+
+
+def test_matrix_beyond_the_rate_limit_is_estimated_without_calls(fake_upstream, tomtom):
+    points = _points(60)
+
+    async def scenario():
+        matrix = await get_travel_time_matrix_async(points)
+        assert (await fake_upstream())["by_provider"]["tomtom"] == 0
+        summary = matrix.summary()
+        blocks = len(list(_chunks(60, 60, travel_matrix.TOMTOM_MATRIX_MAX_CELLS)))
+        assert summary["tomtom_skipped"] == f"rate_limit: {blocks} blocks needed, 15 calls available"
+        assert summary["tomtom_cells"] == 0
+        assert sum(summary["estimated_cells"].values()) == 60 * 60 - 60
+        assert matrix.missing_count() == 60 * 60 - 60  # still flagged as not from TomTom
+        assert all(matrix.get(i, j) > 0 for i in range(60) for j in range(60) if i != j)
+
+    asyncio.run(scenario())
+
+
+def test_open_circuit_skips_tomtom(fake_upstream, tomtom):
+    breaker, _ = tomtom
+    for _ in range(3):
+        breaker.record_failure()
+
+    async def scenario():
+        matrix = await get_travel_time_matrix_async(_points(5))
+        assert matrix.summary()["tomtom_skipped"] == "circuit_open"
+        assert (await fake_upstream())["by_provider"]["tomtom"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_blocks_are_estimated(fake_upstream, tomtom):
+    from services import http_client
+
+    async def scenario():
+        await http_client.get_client().put("/__faults", json={"status": 503})
+        matrix = await get_travel_time_matrix_async(_points(20), max_cells=100)
+        summary = matrix.summary()
+        assert summary["blocks"] == 4
+        assert summary["tomtom_skipped"] is None
+        assert summary["tomtom_cells"] == 0
+        assert sum(summary["estimated_cells"].values()) == 20 * 20 - 20
+
+    asyncio.run(scenario())
@@ -0,0 +1,17 @@
+import asyncio
+
+import pytest
+
+from services import travel_time
+
+
+@pytest.mark.parametrize("start,end", [("not,a point", "19.0,72.8"), ("19.0,72.8", ""), ("19.0", "19.1,72.9")])
+def test_unparseable_coordinates_fall_back_without_calling_tomtom(fake_upstream, start, end):
+    async def scenario():
+        assert await travel_time.get_travel_time_result_async(start, end) == (travel_time.FALLBACK_TRAVEL_TIME, "fallback")
+        assert travel_time.get_travel_time_result(start, end, use_cache=False) == (
+            travel_time.FALLBACK_TRAVEL_TIME, "fallback",
+        )
+        assert (await fake_upstream())["requests"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+from dotenv import load_dotenv
+from db import get_connection
+from services.http_client import close_client
+from services.prefetch import (
+    PREFETCH_CONCURRENCY,
+    PREFETCH_LOOKAHEAD_MIN,
+    PREFETCH_MAX_CELLS,
+    PREFETCH_MAX_ROUTES,
+    PREFETCH_MIN_TRIPS,
+    PREFETCH_OPENWEATHER_BUDGET,
+    PREFETCH_WINDOW_DAYS,
+    mine_patterns,
+    warm_caches,
+)
+
+load_dotenv()
+
+async def _warm(patterns, args):
+    try:
+        return await warm_caches(patterns, args.tomtom_budget, args.openweather_budget, args.concurrency)
+    finally:
+        await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List the hottest delivery corridors and start cells for the coming hours and warm the shared "
+                    "weather cache for them. Travel times are cached per process and would be thrown away when this "
+                    "command exits, so TomTom is not called unless --tomtom-budget is given "
+                    "(set PREFETCH_INTERVAL to warm travel times inside the app)"
+    )
+    parser.add_argument("--lookahead-min", type=int, default=PREFETCH_LOOKAHEAD_MIN)
+    parser.add_argument("--window-days", type=int, default=PREFETCH_WINDOW_DAYS)
+    parser.add_argument("--min-trips", type=int, default=PREFETCH_MIN_TRIPS)
+    parser.add_argument("--max-routes", type=int, default=PREFETCH_MAX_ROUTES)
+    parser.add_argument("--max-cells", type=int, default=PREFETCH_MAX_CELLS)
+    parser.add_argument("--tomtom-budget", type=int, default=0, help="TomTom calls at most (default 0: see above)")
+    parser.add_argument("--openweather-budget", type=int, default=PREFETCH_OPENWEATHER_BUDGET, help="OpenWeather calls at most")
+    parser.add_argument("--concurrency", type=int, default=PREFETCH_CONCURRENCY)
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be warmed")
+    parser.add_argument("--top", type=int, default=10, help="corridors and cells to print")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        patterns = mine_patterns(
+            conn, lookahead_min=args.lookahead_min, window_days=args.window_days, min_trips=args.min_trips,
+            max_routes=args.max_routes, max_cells=args.max_cells,
+        )
+    except Exception as e:
+        print(f"❌ Mining delivery history failed: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+
+    print(f"✓ {len(patterns['routes'])} corridor(s) and {len(patterns['cells'])} start cell(s) for hours {patterns['hours']}")
+    for route in patterns["routes"][:args.top]:
+        print(f"  {route['start']} -> {route['end']}: {route['trips']} trips")
+    for cell in patterns["cells"][:args.top]:
+        print(f"  {cell['lat']},{cell['lng']} ({cell['city']}): {cell['trips']} trips")
+    if args.dry_run:
+        return
+    report = asyncio.run(_warm(patterns, args))
+    print(f"✓ Warmed with {report['upstream_calls']['tomtom']} TomTom and {report['upstream_calls']['openweather']} OpenWeather calls")
+    print(json.dumps({"routes": report["routes"], "weather": report["weather"]}, indent=2))
+
+if __name__ == "__main__":
+    main()
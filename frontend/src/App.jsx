@@ -1,6 +1,10 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import MapSelector from "./MapSelector";
+import RouteResult from "./components/RouteResult";
+import { streamOptimize } from "./api";
+
+const BACKEND_URL = "https://routemonk-backend.onrender.com";
 
 // Helper function to format time to IST
 const formatToIST = (utcDateString) => {
@@ -25,14 +29,16 @@ function App() {
   const [end, setEnd] = useState(null);
   const [perishability, setPerishability] = useState(5);
   const [vehicle, setVehicle] = useState("truck");
-  const [result, setResult] = useState(null);
+  const [results, setResults] = useState(null);
+  const [streaming, setStreaming] = useState(false);
+  const abortRef = useRef(null);
   const [history, setHistory] = useState([]);
   const [routeSummary, setRouteSummary] = useState(null);
 
   // Fetch delivery history on load
   useEffect(() => {
     axios
-      .get("https://routemonk-backend.onrender.com/history/")
+      .get(`${BACKEND_URL}/history/`)
       .then((res) => {
         console.log("History response:", res.data);
         setHistory(res.data.history || []);
@@ -49,53 +55,67 @@ function App() {
       return;
     }
 
+    // Send JSON body data - NO CITY REQUIRED, just coordinates and perishability
+    const requestData = {
+      perishability: Number(perishability),
+      start: `${start.lat},${start.lng}`,
+      end: `${end.lat},${end.lng}`
+      // No more manual city input!
+    };
+
+    console.log("Sending request data:", requestData);
+
+    // Results are shown as they stream in; Cancel aborts the request and the backend stops its lookups
+    const controller = new AbortController();
+    abortRef.current = controller;
+    setResults([]);
+    setStreaming(true);
+
     try {
-      // Send JSON body data - NO CITY REQUIRED, just coordinates and perishability
-      const requestData = {
-        perishability: Number(perishability),
-        start: `${start.lat},${start.lng}`,
-        end: `${end.lat},${end.lng}`
-        // No more manual city input!
-      };
-
-      console.log("Sending request data:", requestData);
-
-      const res = await axios.post(
-        "https://routemonk-backend.onrender.com/optimize/",
-        requestData,
-        {
-          headers: {
-            'Content-Type': 'application/json',
+      await streamOptimize(
+        [requestData],
+        (event) => {
+          if (event.event === "result") {
+            console.log("Optimization result:", event);
+            setResults((prev) => [...prev, event]);
           }
-        }
+        },
+        controller.signal,
+        BACKEND_URL
       );
-      
-      console.log("Optimization result:", res.data);
-      setResult(res.data);
 
       // refresh history
-      const histRes = await axios.get(
-        "https://routemonk-backend.onrender.com/history/"
-      );
+      const histRes = await axios.get(`${BACKEND_URL}/history/`);
       console.log("Updated history:", histRes.data);
       setHistory(histRes.data.history || []);
       
     } catch (err) {
+      if (err.name === "AbortError") {
+        console.log("Optimization cancelled");
+        return;
+      }
       console.error("Full error:", err);
-      console.error("Error response:", err.response?.data);
-      
-      if (err.response?.status === 422) {
+
+      if (err.status === 422) {
         alert("Invalid input data. Please check your map selections.");
-      } else if (err.response?.status === 500) {
+      } else if (err.status === 500) {
         alert("Server error. Please try again later.");
-      } else if (err.code === 'ERR_NETWORK') {
+      } else if (err instanceof TypeError) {
+        // fetch rejects with a TypeError when the server can't be reached
         alert("Cannot connect to backend server.");
       } else {
-        alert(`Request failed: ${err.response?.status || 'Unknown'} - ${err.message}`);
+        alert(`Request failed: ${err.status || 'Unknown'} - ${err.message}`);
       }
+    } finally {
+      abortRef.current = null;
+      setStreaming(false);
     }
   };
 
+  const handleCancel = () => {
+    abortRef.current?.abort();
+  };
+
   return (
     <div className="container mx-auto p-4">
       <h1 className="text-3xl font-bold text-center mb-6">🚚 RouteMonk</h1>
@@ -152,21 +172,16 @@ function App() {
         <button
           type="submit"
           className="bg-blue-500 text-white p-2 rounded w-full hover:bg-blue-600"
-          disabled={!start || !end}
+          disabled={!start || !end || streaming}
         >
-          Optimize Route
+          {streaming ? "Optimizing…" : "Optimize Route"}
         </button>
       </form>
 
       {/* Optimization Result */}
-      {result && (
-        <div className="bg-green-100 p-4 rounded mb-4">
-          <h3 className="font-bold mb-2">✅ Optimized Result</h3>
-          <p><strong>Location:</strong> {result.city}</p>
-          <p><strong>Travel Time:</strong> {Math.round(result.travel_time_sec / 60)} min</p>
-          <p><strong>Weather:</strong> {result.weather || 'Unknown'}</p>
-          {result.temperature && <p><strong>Temperature:</strong> {result.temperature}°C</p>}
-          <p><strong>Final Score:</strong> {result.final_score?.toFixed?.(2) || result.final_score}</p>
+      {results && (
+        <div className="mb-4">
+          <RouteResult results={results} total={1} streaming={streaming} onCancel={handleCancel} />
         </div>
       )}
 
@@ -188,14 +203,8 @@ function App() {
               </thead>
               <tbody>
                 {history.map((h, index) => {
-                  // Database columns: [id, city, perishability, travel_time_sec, weather, final_score, created_at]
-                  const id = h[0];
-                  const location = h[1]; 
-                  const perishability = h[2];
-                  const travel_time_sec = h[3];
-                  const weather = h[4];
-                  const final_score = h[5];
-                  const created_at = h[6];
+                  // Rows are objects keyed by column name (one page, newest first)
+                  const { id, city: location, travel_time_sec, weather, final_score, created_at } = h;
                   
                   return (
                     <tr key={index} className="hover:bg-gray-100">
@@ -5,5 +5,33 @@ const API = axios.create({
   baseURL: "http://127.0.0.1:8000",
 });
 
-export const optimizeRoute = (data) => API.post("/optimize", data);
-export const getHistory = () => API.get("/history");
\ No newline at end of file
+export const getHistory = () => API.get("/history");
+
+// Streams /optimize/stream results: onEvent is called with each NDJSON event
+// ({event: "start" | "result" | "done", ...}) as it arrives. Abort the signal
+// to cancel; the backend then stops the lookups still in flight. Failed
+// requests throw an Error with the HTTP `status`.
+export const streamOptimize = async (items, onEvent, signal, baseURL = API.defaults.baseURL) => {
+  const res = await fetch(`${baseURL}/optimize/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "application/x-ndjson" },
+    body: JSON.stringify({ items }),
+    signal,
+  });
+  if (!res.ok) {
+    const error = new Error(`Request failed: ${res.status}`);
+    error.status = res.status;
+    throw error;
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop();
+    lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)));
+  }
+};
@@ -1,14 +1,57 @@
 import React from "react";
 
-function RouteResult({ result }) {
+// `results` are /optimize/stream "result" events, rendered as they arrive
+// while `streaming` is true; `total` is the number of items requested and
+// `onCancel` aborts the stream.
+function RouteResult({ results, total, streaming, onCancel }) {
+  const sorted = [...results].sort((a, b) => a.index - b.index);
   return (
     <div className="bg-green-100 p-4 rounded shadow">
-      <h3 className="font-semibold text-lg mb-2">Optimized Result</h3>
-      <p>⏱ Travel Time: {result.travel_time_sec} sec</p>
-      <p>☁️ Weather: {result.weather}</p>
-      <p>📊 Score: {result.final_score}</p>
+      <div className="flex justify-between items-center mb-2">
+        <h3 className="font-semibold text-lg">
+          Optimized Results ({results.length}{total ? ` / ${total}` : ""})
+        </h3>
+        {streaming && onCancel && (
+          <button onClick={onCancel} className="bg-red-500 hover:bg-red-600 text-white py-1 px-3 rounded">
+            Cancel
+          </button>
+        )}
+      </div>
+      <table className="table-auto w-full border-collapse border">
+        <thead>
+          <tr className="bg-gray-200">
+            <th className="border p-2">#</th>
+            <th className="border p-2">📍 Location</th>
+            <th className="border p-2">⏱ Travel Time</th>
+            <th className="border p-2">☁️ Weather</th>
+            <th className="border p-2">🌡 Temperature</th>
+            <th className="border p-2">📊 Score</th>
+            <th className="border p-2">Saved</th>
+          </tr>
+        </thead>
+        <tbody>
+          {sorted.map((r) => (
+            <tr key={r.index} className="text-center">
+              <td className="border p-2">{r.index + 1}</td>
+              {r.error && r.final_score === undefined ? (
+                <td className="border p-2 text-red-600" colSpan={6}>{r.error}</td>
+              ) : (
+                <>
+                  <td className="border p-2">{r.city}</td>
+                  <td className="border p-2">{Math.round(r.travel_time_sec / 60)} min</td>
+                  <td className="border p-2">{r.weather || "Unknown"}</td>
+                  <td className="border p-2">{r.temperature != null ? `${r.temperature}°C` : "–"}</td>
+                  <td className="border p-2">{typeof r.final_score === "number" ? r.final_score.toFixed(2) : r.final_score}</td>
+                  <td className="border p-2">{r.db_status}</td>
+                </>
+              )}
+            </tr>
+          ))}
+        </tbody>
+      </table>
+      {streaming && <p className="text-gray-600 mt-2">Waiting for the remaining results…</p>}
     </div>
   );
 }
 
-export default RouteResult;
\ No newline at end of file
+export default RouteResult;